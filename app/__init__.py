@@ -6,9 +6,12 @@ from flask_login import LoginManager
 from datetime import datetime, timedelta
 import sqlalchemy as sa
 from flask_socketio import SocketIO 
+from app.log import configure_logging
 
 app = Flask(__name__)
 app.config.from_object(Config)
+configure_logging(app)
+
 socketio = SocketIO(app, cors_allowed_origins="*")
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
@@ -16,4 +19,8 @@ login = LoginManager(app)
 login.login_view = 'entername'
 login.login_message = "Nhập tên trước khi vào bạn nhé!"
 
-from app import routes, models, socket_events
+from app import routes, models, socket_events, commands
+
+from app.metrics import instrument_app, instrument_socketio
+instrument_app(app)
+instrument_socketio(socketio)
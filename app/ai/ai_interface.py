@@ -1,7 +1,10 @@
+import logging
 import random
 from abc import ABC, abstractmethod
 from app.game_logic.base_logic import GameLogic
 from app.game_logic.place_ships_strat import ShipPlacementStrategy
+from app.ai.telemetry import ai_telemetry, encode_heatmap
+from app.log import game_logger
 from app import socketio
 
 
@@ -32,30 +35,55 @@ class BaseAI(ShipPlacementStrategy, AIInterface, ABC):
     Base class cho tất cả AI.
     """
 
-    def __init__(self, game, name=None):
-        super().__init__(game)
-        self.game = game
+    def __init__(self, game, name=None, store=None, emitter=socketio.emit):
+        """
+        store: kho trạng thái trận (mặc định là kho gắn với DB)
+        emitter: hàm gửi sự kiện kiểu socketio.emit, None thì không gửi log
+        """
+        super().__init__(game, store)   # self.game là LiveGame trong kho trận đấu
         self.name = name or (game.ai.name if game.ai else "AI bot")
+        self.emitter = emitter
+        # Log riêng của AI theo module của lớp AI (VD LOG_LEVELS="app.ai.prob_ai=DEBUG")
+        self.ai_log = game_logger(logging.getLogger(type(self).__module__), self.game.id)
         
-    def log_action(self, message: str, **kwargs):
+    @property
+    def telemetry_enabled(self):
+        """Có client đang xem log của AI trong trận này không (xem telemetry.py)"""
+        return self.emitter is not None and ai_telemetry.has_subscribers(self.game.id)
+
+    def log_action(self, message: str, heatmap=None, board=None, **kwargs):
         """
-        Gửi log hành động của AI tới client qua socket.
+        Gửi log hành động của AI tới các client đang xem log (room "<game_id>:ai").
+        Không ai xem thì không làm gì.
 
         Args:
             message (str): Nội dung log
-            **kwargs: Dữ liệu mở rộng tuỳ loại AI (VD: matrix, heatmap, hướng bắn, v.v.)
+            heatmap: phổ xác suất 10x10 (numpy), gửi dạng uint8/base64 và bị giới hạn tần suất
+            board: bảng đối thủ tương ứng với heatmap (để đánh dấu ô đã bắn)
+            **kwargs: Dữ liệu mở rộng tuỳ loại AI (VD: hướng bắn, v.v.)
         """
+        if not self.telemetry_enabled:
+            return
         data = {
             "ai_name": self.name,
             "game_id": self.game.id,
             "message": message
         }
+        if heatmap is not None and board is not None and ai_telemetry.allow_heatmap(self.game.id):
+            data["heatmap"] = encode_heatmap(heatmap, board)
 
         # Thêm dữ liệu mở rộng nếu có
         for key, value in kwargs.items():
             data[key] = value
 
-        socketio.emit("ai_log_update", data, to=str(self.game.id))
+        self.emitter("ai_log_update", data, to=ai_telemetry.room(self.game.id))
+
+    def prepare(self, target_name: str):
+        """
+        Gọi 1 lần khi tạo AI cho trận, để tính trước dữ liệu dùng suốt trận.
+        Mặc định không làm gì.
+        """
+        pass
 
     @abstractmethod
     def place_ships(self):
@@ -1,137 +1,162 @@
-import random
 import numpy as np
-import sqlalchemy as sa
-from app import db
-from app.models import Player
 from app.ai.ai_interface import BaseAI
+from app.game_logic.board import (
+    CELLS, EMPTY, HIT, MISS, SUNK, NEIGHBORS, cell_coords, cell_index, iter_cells, mask_to_array,
+)
+from app.game_logic.placements import fleet_density
+
+# Hệ số nhân cho các ô kề với ô trượt / ô trúng / ô của tàu đã chìm
+MISS_FACTOR = 0.8
+HIT_FACTOR = 1.5
+SUNK_FACTOR = 0.8
+
+
+class ProbState:
+    """
+    Phổ xác suất của 1 bảng đối thủ, giữ suốt trận.
+
+    Mỗi ô lưu số lần bị nhân MISS_FACTOR/SUNK_FACTOR (miss_count) và HIT_FACTOR (hit_count)
+    nên giá trị ô = init * 0.8 ** miss_count * 1.5 ** hit_count.
+    Khi ô đổi trạng thái (bắn mới, trúng -> chìm, undo, redo) chỉ cần bỏ phần đóng góp
+    của trạng thái cũ, cộng phần của trạng thái mới rồi tính lại các ô bị ảnh hưởng.
+    Dùng số đếm nguyên nên undo trả về đúng giá trị cũ, không bị sai số dồn.
+    """
+
+    def __init__(self, init_matrix):
+        self.base = init_matrix.ravel().astype(float)
+        self.values = self.base.copy()
+        self.miss_count = np.zeros(CELLS, dtype=int)
+        self.hit_count = np.zeros(CELLS, dtype=int)
+        # Các mask trúng/trượt/chìm đã áp dụng vào phổ
+        self.seen = {HIT: 0, MISS: 0, SUNK: 0}
+
+    def state_of(self, masks, i):
+        bit = 1 << i
+        for state in (HIT, MISS, SUNK):
+            if masks[state] & bit:
+                return state
+        return EMPTY
+
+    def sync(self, board, ship_cells):
+        """
+        Áp dụng các ô đổi trạng thái so với lần trước.
+        ship_cells(i): chỉ số các ô của tàu chứa ô i (dùng khi tàu chìm).
+        Trả về số ô đã đổi.
+        """
+        changed = 0
+        for state in self.seen:
+            changed |= self.seen[state] ^ board.masks[state]
+        if not changed:
+            return 0
+
+        touched = set()
+        cells = list(iter_cells(changed))
+        for i in cells:
+            touched |= self._apply(i, self.state_of(self.seen, i), -1, ship_cells)
+        self.seen = {state: board.masks[state] for state in self.seen}
+        for i in cells:
+            touched |= self._apply(i, self.state_of(self.seen, i), 1, ship_cells)
+
+        for i in touched | set(cells):
+            self.values[i] = self._value(i)
+        return len(cells)
+
+    def _apply(self, i, state, sign, ship_cells):
+        """Thêm (sign=1) hoặc bỏ (sign=-1) phần đóng góp của ô i ở trạng thái state"""
+        touched = set()
+        if state == MISS:
+            for n in iter_cells(NEIGHBORS[i]):
+                self.miss_count[n] += sign
+                touched.add(n)
+        elif state == HIT:
+            for n in iter_cells(NEIGHBORS[i]):
+                self.hit_count[n] += sign
+                touched.add(n)
+        elif state == SUNK:
+            # Mỗi ô chìm giảm xác suất quanh toàn bộ con tàu
+            for p in ship_cells(i):
+                for n in iter_cells(NEIGHBORS[p]):
+                    self.miss_count[n] += sign
+                    touched.add(n)
+        return touched
+
+    def _value(self, i):
+        state = self.state_of(self.seen, i)
+        if state == MISS:
+            return -1
+        if state in (HIT, SUNK):
+            return 0
+        # MISS_FACTOR và SUNK_FACTOR bằng nhau nên dùng chung 1 bộ đếm
+        return self.base[i] * MISS_FACTOR ** self.miss_count[i] * HIT_FACTOR ** self.hit_count[i]
+
+    def matrix(self):
+        return self.values.reshape(10, 10).copy()
+
 
 class DemoProbAI(BaseAI):
     """
-    AI dùng phổ xác xuất để quyết định phát bắn
+    AI dùng phổ xác xuất để quyết định phát bắn.
+    Phổ được giữ theo từng đối thủ suốt trận (instance AI được giữ theo trận, xem factory.py)
+    và chỉ cập nhật các ô thay đổi sau mỗi nước đi.
     """
-    def __init__(self, game, name=None):
-        super().__init__(game, name)
-        self.init_matrix = self.init_prob_matrix() 
+    def __init__(self, game, name=None, **kwargs):
+        super().__init__(game, name, **kwargs)
+        self.init_matrix = self.init_prob_matrix()
+        self.states = {}
+
 
-    
     def place_ships(self):
         #Đặt tàu ngẫu nhiên
         self.auto_place_ships(self.name)
-        
+
     def make_shot(self, attacker_name, target_name):
         #Lấy bảng thông tin của đối thủ
         board = self.get_board(target_name)
         if not board:
             self.log_action(f"Không tìm thấy bảng của {target_name}")
             return {"result": "invalid", "x": -1, "y": -1}
-        
-        prob_matrix = self.calc_prob_matrix(board)
-        # possible_moves = [(x, y) for x in range(10) for y in range(10)
-        #                   if board[x][y] not in (2, 3, 4)]
-        # x, y = random.choice(possible_moves)
-        
-        #Tìm ô có xác xuất cao nhất trong phổ xác xuất
-        best_val = -1e9
-        best_x = best_y = -1
-        for x in range(10):
-            for y in range(10):
-                if board[x][y] in (2, 3, 4):
-                    continue
-                if prob_matrix[x][y] > best_val:
-                    best_val = prob_matrix[x][y]
-                    best_x, best_y = x, y
-
-        x, y = best_x, best_y 
-        self.log_action(f"Chọn ô ({x},{y}) có xác suất {best_val:.2f}")
-        
+
+        prob_matrix = self.calc_prob_matrix(board, target_name)
+
+        #Tìm ô có xác xuất cao nhất trong phổ xác xuất (bằng nhau thì lấy ô đầu tiên theo hàng)
+        values = prob_matrix.ravel().copy()
+        values[mask_to_array(board.shot_mask, bool).ravel()] = -np.inf
+        x, y = cell_coords(int(values.argmax()))
+        best_val = values.max()
+        self.log_action(f"Chọn ô ({x},{y}) có xác suất {best_val:.2f}", heatmap=prob_matrix, board=board)
+
         #Tạo phát bắn
         result_data = self.shoot(attacker_name, target_name, x, y)
         result_data.update({"x": x, "y": y})
-        print(f"[DEBUG] {self.name} bắn vào ({x}, {y}) của {target_name}")
-        db.session.commit()
-        
-        board = self.get_board(target_name)
-        prob_matrix = self.calc_prob_matrix(board)
-        self.log_action("Cập nhật prob_matrix", prob_matrix = prob_matrix.tolist())
-        
+        self.ai_log.debug("%s bắn vào (%d, %d) của %s", self.name, x, y, target_name)
+
+        # Phổ sau phát bắn được cập nhật (và gửi cho client) ở đầu lượt sau
         return result_data
 
-        
-               
+
+
     def init_prob_matrix(self):
         """
         Tạo ma trận phổ xác xuất ban đầu
         Ma trận này sẽ được tính bằng cách kiểm tra khả năng đặt tàu vào mỗi ô
         Cụ thể hơn là nếu có thể đặt tàu Carrier(5) theo chiều dọc vào ô (1,0)
         thì các ô (1,0), (2,0), (3,0), (4,0), (5,0) sẽ được cộng thêm 1
+        (lấy từ bảng vị trí tính sẵn trong placements.py)
         """
-        prob_matrix = np.zeros((10, 10), dtype=float)
-        for lenght in self.ships.values():
-            for orientation in ["H", "V"]:
-                for x in range(10):
-                    for y in range(10):
-                        valid = True
-                        cells = []
-                        
-                        for i in range(lenght):
-                            nx = x + (i if orientation == "V" else 0)
-                            ny = y + (i if orientation == "H" else 0)
-                            if not self.in_bounds(nx, ny):
-                                valid = False
-                                break
-                            cells.append((nx, ny))
-                        if valid:
-                            for (nx, ny) in cells:
-                                prob_matrix[nx][ny] += 1
-                            
-        return prob_matrix
-    
-    def calc_prob_matrix(self, board):
-        prob_matrix = np.copy(self.init_matrix)
-        for x in range(10):
-            for y in range(10):
-                if board[x][y] == 3:
-                    prob_matrix = self.miss_update(prob_matrix, x, y)
-                elif board[x][y] == 2:
-                    prob_matrix = self.hit_update(prob_matrix, x, y)
-                elif board[x][y] == 4:
-                    prob_matrix = self.sunk_update(prob_matrix, self.game.player.playername, x, y)
-        return prob_matrix
-                
-                        
-    def miss_update(self, prob_matrix, x, y,):
-        # Giảm nhẹ xác suất vùng lân cận
-        m = prob_matrix
-        m[x][y] = -1
-        for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-            nx, ny = x + dx, y + dy
-            if self.in_bounds(nx, ny):
-                m[nx][ny] = np.round(m[nx][ny] * 0.8, 1)
-                    
-        return m
-                                        
-    def hit_update(self, prob_matrix, x, y):
-        # Tăng xác suất cho các ô lân cận
-        m = prob_matrix
-        m[x][y] = 0
-        for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-            nx, ny = x + dx, y + dy
-            if self.in_bounds(nx, ny):
-                m[nx][ny] = np.round(m[nx][ny] * 1.5, 1)
-                
-        return m
-    
-    def sunk_update(self, prob_matrix, target_name, x, y):
-        prob_matrix[x][y] = 0
-        getShip = self._get_ship_component(target_name, x, y)
-        ship_name, comps = getShip
-        for x, y in comps:
-            for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-                nx, ny = x + dx, y + dy
-                if self.in_bounds(nx, ny) and (x, y) not in comps:
-                    prob_matrix[nx][ny] = np.round(prob_matrix[nx][ny] * 0.8, 1)
-        
-        return prob_matrix
-
-
-  
+        return fleet_density(self.ships)
+
+    def calc_prob_matrix(self, board, target_name=None):
+        """Đưa phổ của đối thủ về khớp với bảng hiện tại (kể cả sau undo/redo) rồi trả về bản sao"""
+        target_name = target_name or self.game.player.playername
+        state = self.states.get(target_name)
+        if state is None:
+            state = self.states[target_name] = ProbState(self.init_matrix)
+
+        def ship_cells(i):
+            comp = self._get_ship_component(target_name, *cell_coords(i))
+            return [cell_index(x, y) for x, y in comp[1]] if comp else [i]
+
+        changed = state.sync(board, ship_cells)
+        if changed:
+            self.ai_log.debug("%s: cập nhật phổ cho %d ô", self.name, changed)
+        return state.matrix()
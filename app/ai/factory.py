@@ -1,23 +1,54 @@
+from collections import OrderedDict
+from app import app
 from app.ai.ai_interface import BaseAI
 from app.ai.test_ai import TestAI
 from app.ai.random_ai import RandomAI
 from app.ai.demo_prob_ai import DemoProbAI
 from app.ai.prob_ai import ProbAI
+from app.ai.monte_carlo_ai import MonteCarloAI
 
 
 
+def get_ai_class(ai_name):
+    """Tìm lớp AI theo tên (trùng với tên class)"""
+    cls = globals().get(ai_name)
+    if cls is None:
+        raise ValueError(f"Không tìm thấy lớp AI có tên: {ai_name}")
+    if not issubclass(cls, BaseAI):
+        raise TypeError(f"{ai_name} không kế thừa BaseAI!")
+    return cls
+
+
+# Instance AI theo game_id, giữ suốt trận (sắp theo LRU, giới hạn AI_CACHE_MAX_GAMES)
+_instances = OrderedDict()
+
+
 def get_ai_instance(game):
     """
-    Tạo instance AI dựa theo game.ai.name (trùng với tên class)
+    Lấy instance AI của trận, chưa có thì tạo dựa theo game.ai.name (trùng với tên class).
+    Lúc tạo AI chuẩn bị dữ liệu 1 lần cho cả trận (VD: phổ xác suất của đối thủ),
+    các lượt sau dùng lại nên thời gian mỗi lượt không phụ thuộc vào lịch sử đấu.
     """
     ai_name = getattr(game.ai, "name", None)
     if not ai_name:
         raise ValueError("game.ai.name chưa được thiết lập!")
 
-    cls = globals().get(ai_name)
-    if cls is None:
-        raise ValueError(f"Không tìm thấy lớp AI có tên: {ai_name}")
-    if not issubclass(cls, BaseAI):
-        raise TypeError(f"{ai_name} không kế thừa BaseAI!")
+    ai = _instances.get(game.id)
+    # Trận bị đẩy khỏi kho rồi nạp lại thì AI cũ đang giữ LiveGame cũ, phải tạo lại
+    if ai is not None and ai.game is ai.store.peek(game.id):
+        _instances.move_to_end(game.id)
+        return ai
+
+    ai = get_ai_class(ai_name)(game)
+    ai.prepare(ai.game.player.playername)
+    _instances[game.id] = ai
+
+    max_games = app.config.get("AI_CACHE_MAX_GAMES", 1000)
+    while len(_instances) > max_games:
+        _instances.popitem(last=False)
+    return ai
+
 
-    return cls(game)
+def drop_ai_instance(game_id):
+    """Bỏ instance AI của trận (trận kết thúc hoặc bị huỷ)"""
+    _instances.pop(int(game_id), None)
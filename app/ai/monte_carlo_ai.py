@@ -0,0 +1,154 @@
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+from app import app, socketio
+from app.ai.prob_ai import ProbAI
+from app.game_logic.board import SIZE, CELLS, FLEET, HIT, MISS, SUNK, mask_to_array
+from app.game_logic.placements import PLACEMENTS, PLACEMENT_WEIGHTS, PLACEMENT_LENGTHS
+
+# Số mẫu trong 1 phần việc (1 lần gọi sample_fleets)
+CHUNK_SIZE = 250
+# Số mẫu tính cùng lúc trong 1 phần việc, hạn chót được kiểm tra giữa các lô
+BATCH_SIZE = 50
+
+# Chỉ số các hàng trong PLACEMENTS theo độ dài tàu
+_ROWS_BY_LENGTH = {
+    length: numpy.flatnonzero(PLACEMENT_LENGTHS == length) for length in set(FLEET.values())
+}
+
+_pool = None
+_pool_workers = 0
+
+
+def sample_fleets(blocked, hits, lengths, n, seed, deadline=None):
+    """
+    Sinh n cách đặt các tàu còn lại (lengths) phù hợp với bảng, tính song song theo lô BATCH_SIZE mẫu.
+        blocked: mask các ô không thể có tàu còn sống (trượt, chìm)
+        hits: mask các ô trúng chưa chìm, mẫu hợp lệ phải phủ hết các ô này
+        deadline: thời điểm (time.time()) phải dừng, kiểm tra giữa các lô nên tiến trình
+            lấy mẫu cũng tự dừng khi AI đã hết giờ, không chiếm CPU sau lượt bắn
+    Mỗi tàu chọn đều ngẫu nhiên trong các vị trí còn đặt được, mẫu không phủ hết ô trúng bị loại.
+    Trả về (số mẫu hợp lệ có tàu ở từng ô - mảng 100 phần tử, số mẫu hợp lệ).
+    Là hàm cấp module để gửi được sang tiến trình khác.
+    """
+    rng = numpy.random.default_rng(seed)
+    blocked_cells = mask_to_array(blocked, bool).ravel()
+    hit_cells = mask_to_array(hits, numpy.float32).ravel()
+
+    counts = numpy.zeros(CELLS)
+    accepted = 0
+    for start in range(0, n, BATCH_SIZE):
+        if deadline is not None and time.time() >= deadline:
+            break
+        batch_counts, batch_accepted = _sample_batch(
+            rng, blocked_cells, hit_cells, lengths, min(BATCH_SIZE, n - start))
+        counts += batch_counts
+        accepted += batch_accepted
+    return counts, accepted
+
+
+def _sample_batch(rng, blocked_cells, hit_cells, lengths, n):
+    occupied = numpy.zeros((n, CELLS), dtype=numpy.float32)
+    failed = numpy.zeros(n, dtype=bool)
+
+    # Tàu dài đặt trước để ít mẫu bị kẹt
+    for length in sorted(lengths, reverse=True):
+        rows = _ROWS_BY_LENGTH[length]
+        allowed = ~(PLACEMENTS[rows] & blocked_cells).any(axis=1)
+        cells = PLACEMENT_WEIGHTS[rows[allowed]]
+        if len(cells) == 0:
+            return numpy.zeros(CELLS), 0
+
+        # Không đè tàu đã đặt trong cùng mẫu, chọn ngẫu nhiên cho cả n mẫu 1 lúc
+        free = (occupied @ cells.T) == 0
+        keys = rng.random(free.shape, dtype=numpy.float32)
+        keys[~free] = -1
+        choice = keys.argmax(axis=1)
+        failed |= ~free[numpy.arange(n), choice]
+        occupied += cells[choice]
+
+    valid = ~failed & ((occupied @ hit_cells) == hit_cells.sum())
+    return occupied[valid].sum(axis=0), int(valid.sum())
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+class MonteCarloAI(ProbAI):
+    """
+    AI lấy mẫu Monte Carlo: sinh nhiều cách đặt cả hạm đội còn lại phù hợp với bảng
+    (trúng, trượt, tàu đã chìm), đếm tần suất có tàu ở từng ô rồi bắn ô cao nhất.
+
+    Cấu hình:
+        MONTE_CARLO_SAMPLES: tổng số mẫu mỗi lượt
+        MONTE_CARLO_DEADLINE: thời gian tối đa mỗi lượt (giây), hết giờ thì dùng số mẫu đã có;
+            không áp dụng khi không có emitter (mô phỏng) để kết quả lặp lại được
+        MONTE_CARLO_WORKERS: số tiến trình lấy mẫu, 0 thì lấy mẫu ngay trong tiến trình này
+    Khi chờ kết quả, AI nhường vòng lặp sự kiện (socketio.sleep) nên không chặn Socket.IO.
+    Không có mẫu hợp lệ nào thì dùng phổ mật độ của ProbAI.
+    """
+
+    def calc_prob_matrix(self, board, target_name):
+        lengths = [FLEET[name] for name in self.alive_ships(target_name)]
+        if not lengths:
+            return super().calc_prob_matrix(board, target_name)
+
+        counts, accepted = self.sample(
+            board.masks[MISS] | board.masks[SUNK], board.masks[HIT], lengths
+        )
+        if accepted == 0:
+            self.ai_log.debug("%s: không có mẫu hợp lệ, dùng phổ mật độ", self.name)
+            return super().calc_prob_matrix(board, target_name)
+        return (counts / accepted).reshape(SIZE, SIZE)
+
+    def sample(self, blocked, hits, lengths):
+        samples = app.config["MONTE_CARLO_SAMPLES"]
+        # Không có socket (mô phỏng, benchmark) thì lấy đủ số mẫu, không có hạn chót,
+        # để cùng seed luôn cho cùng kết quả
+        budget = app.config["MONTE_CARLO_DEADLINE"] if self.emitter is not None else None
+        deadline = time.monotonic() + budget if budget is not None else float("inf")
+        # Hạn chót cho tiến trình lấy mẫu (đồng hồ thường để so được giữa các tiến trình)
+        stop_at = time.time() + budget if budget is not None else None
+        workers = app.config["MONTE_CARLO_WORKERS"]
+
+        # Seed lấy từ random để random.seed() cố định được cả trận mô phỏng
+        seed = random.getrandbits(32)
+        chunks = [
+            (blocked, hits, lengths, min(CHUNK_SIZE, samples - start), seed + i, stop_at)
+            for i, start in enumerate(range(0, samples, CHUNK_SIZE))
+        ]
+
+        counts = numpy.zeros(CELLS)
+        accepted = 0
+        if workers > 0:
+            pending = [_get_pool(workers).submit(sample_fleets, *chunk) for chunk in chunks]
+            while pending and time.monotonic() < deadline:
+                socketio.sleep(0.002)
+                for future in [f for f in pending if f.done()]:
+                    pending.remove(future)
+                    chunk_counts, chunk_accepted = future.result()
+                    counts += chunk_counts
+                    accepted += chunk_accepted
+            # Phần chưa chạy thì huỷ, phần đang chạy tự dừng ở lô kế tiếp (stop_at)
+            for future in pending:
+                future.cancel()
+        else:
+            for chunk in chunks:
+                chunk_counts, chunk_accepted = sample_fleets(*chunk)
+                counts += chunk_counts
+                accepted += chunk_accepted
+                if time.monotonic() >= deadline:
+                    break
+                socketio.sleep(0)
+
+        self.ai_log.debug("%s: %d mẫu hợp lệ", self.name, accepted)
+        return counts, accepted
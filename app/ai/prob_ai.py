@@ -1,35 +1,78 @@
 import numpy
-from app import db
-from app.models import Player
 from app.ai.ai_interface import BaseAI
+from app.game_logic.board import SIZE, FLEET, HIT, MISS, SUNK, cell_coords, mask_to_array
+from app.game_logic.placements import PLACEMENT_WEIGHTS, PLACEMENT_LENGTHS
+
+# Trọng số cho mỗi ô trúng (chưa chìm) mà 1 vị trí tàu đi qua.
+# Vị trí đi qua k ô trúng được nhân HIT_WEIGHT ** k nên AI sẽ bám theo tàu đang bị trúng.
+HIT_WEIGHT = 30.0
+
+
+def placement_density(board, alive_ships):
+    """
+    Phổ mật độ vị trí đặt tàu (mảng 100 phần tử) cho bảng đối thủ.
+        - Loại các vị trí đi qua ô trượt hoặc ô tàu đã chìm
+        - Vị trí đi qua ô trúng được nhân trọng số HIT_WEIGHT cho mỗi ô
+        - Mỗi độ dài được nhân số tàu chưa chìm có độ dài đó
+    Toàn bộ tính bằng vài phép nhân ma trận, không có vòng lặp Python theo ô.
+    """
+    multiplier = numpy.zeros(max(FLEET.values()) + 1, dtype=numpy.float32)
+    for name in alive_ships:
+        multiplier[FLEET[name]] += 1
+
+    blocked = mask_to_array(board.masks[MISS] | board.masks[SUNK], numpy.float32).ravel()
+    weight = multiplier[PLACEMENT_LENGTHS] * (PLACEMENT_WEIGHTS @ blocked == 0)
+
+    if board.masks[HIT]:
+        hits = mask_to_array(board.masks[HIT], numpy.float32).ravel()
+        weight = weight * numpy.power(HIT_WEIGHT, PLACEMENT_WEIGHTS @ hits)
+
+    return weight @ PLACEMENT_WEIGHTS
+
 
 class ProbAI(BaseAI):
     """
-    AI dùng phổ xác xuất để quyết định phát bắn
+    AI dùng phổ xác xuất để quyết định phát bắn.
+    Mỗi lượt đếm số cách đặt các tàu còn lại đi qua từng ô (placement density)
+    và bắn vào ô chưa bắn có mật độ cao nhất.
     """
-    
-    def __init__(self, game, name = None):
-        super().__init__(game, name)
-            
+
+    def __init__(self, game, name=None, **kwargs):
+        super().__init__(game, name, **kwargs)
+
     def place_ships(self):
-        """
-        """
-        self.auto_place_ships_strategy(self.name, strategy= "avoid mid and corner")
-    
-    def make_shot(self):
-        return
-    
-    def init_prob_matrix(self):
-        return 
-
-    def calc_prob_matrix(self, board):
-        return
-    
-    def miss_update(self, prob_matrix, x, y,):
-        return 
-    
-    def hit_update(self, prob_matrix, x, y):
-        return
-    
-    def sunk_update(self, prob_matrix, target_name, x, y):
-        return 
\ No newline at end of file
+        self.auto_place_ships_strategy(self.name, strategy="avoid mid and corner")
+
+    def make_shot(self, attacker_name, target_name):
+        board = self.get_board(target_name)
+        if not board:
+            self.log_action(f"Không tìm thấy bảng của {target_name}")
+            return {"result": "invalid", "x": -1, "y": -1}
+
+        prob_matrix = self.calc_prob_matrix(board, target_name)
+        x, y = self.choose_cell(prob_matrix, board)
+        self.log_action(
+            f"Chọn ô ({x},{y}) có mật độ {prob_matrix[x, y]:.0f}",
+            heatmap=prob_matrix, board=board,
+        )
+
+        result_data = self.shoot(attacker_name, target_name, x, y)
+        result_data.update({"x": x, "y": y})
+        self.ai_log.debug("%s bắn vào (%d, %d) của %s", self.name, x, y, target_name)
+        return result_data
+
+    def alive_ships(self, target_name):
+        """Các tàu đối thủ chưa chìm (tàu chìm được công bố nên AI được biết)"""
+        ship_data = self.game.ship_data.get(target_name) or {}
+        return [name for name in FLEET if not ship_data.get(name, {}).get("sunked")]
+
+    def calc_prob_matrix(self, board, target_name):
+        density = placement_density(board, self.alive_ships(target_name))
+        return density.reshape(SIZE, SIZE)
+
+    @staticmethod
+    def choose_cell(prob_matrix, board):
+        """Ô chưa bắn có giá trị cao nhất (bằng nhau thì lấy ô đầu tiên theo hàng)"""
+        values = prob_matrix.ravel().copy()
+        values[mask_to_array(board.shot_mask, bool).ravel()] = -1
+        return cell_coords(int(values.argmax()))
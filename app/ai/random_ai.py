@@ -3,6 +3,7 @@ import sqlalchemy as sa
 from app import db
 from app.models import Player
 from app.ai.ai_interface import BaseAI
+from app.game_logic.board import mask_to_array
 
 
 class RandomAI(BaseAI):
@@ -11,43 +12,45 @@ class RandomAI(BaseAI):
     """
 
     def place_ships(self):
-        print(f"[DEBUG] RandomAI.place_ships() -> bắt đầu đặt tàu cho {self.name}")
+        self.ai_log.debug("RandomAI.place_ships() -> bắt đầu đặt tàu cho %s", self.name)
         self.auto_place_ships(self.name)
 
-    def make_shot(self, attacker_name, target_name):
+    # (phổ chung, phổ của đối thủ) dùng cố định, None thì đọc từ DB mỗi lượt
+    priors = None
+
+    def prepare(self, target_name):
+        # Đọc phổ 1 lần lúc bắt đầu trận rồi giữ nguyên đến hết trận
+        self.priors = self.load_priors(target_name)
+
+    def load_priors(self, target_name):
+        """Đọc phổ xác suất đặt tàu chung và của đối thủ, chưa có dữ liệu thì coi như 0"""
         from app.game_logic.queries import overall_probability_matrix
         overall_prob = overall_probability_matrix()
 
         target = db.session.scalar(
             sa.select(Player).where(Player.playername == target_name)
         )
-        player_prob = target.ship_probability_matrix
+        player_prob = target.ship_probability_matrix if target else None
 
-        overall_prob_np = numpy.array(overall_prob, dtype=float)
-        player_prob_np = numpy.array(player_prob, dtype=float)
+        overall_prob_np = numpy.array(overall_prob if overall_prob is not None else numpy.zeros((10, 10)), dtype=float)
+        player_prob_np = numpy.array(player_prob if player_prob is not None else numpy.zeros((10, 10)), dtype=float)
+        return overall_prob_np, player_prob_np
+
+    def make_shot(self, attacker_name, target_name):
+        overall_prob_np, player_prob_np = self.priors or self.load_priors(target_name)
         strategic_mat = overall_prob_np * 0.7 + player_prob_np * 0.3
 
         board = self.get_board(target_name)
         if not board:
-            print(f"[ERROR] Không tìm thấy bảng của {target_name}")
+            self.ai_log.error("Không tìm thấy bảng của %s", target_name)
             return {"result": "invalid", "x": -1, "y": -1}
 
-        best_val = -1e9
-        best_x = best_y = -1
-        for x in range(10):
-            for y in range(10):
-                if board[x][y] in (2, 3, 4):
-                    strategic_mat[x][y] = -1e9
-                    continue
-                if strategic_mat[x][y] > best_val:
-                    best_val = strategic_mat[x][y]
-                    best_x, best_y = x, y
-
-        x, y = best_x, best_y
-        print(f"[DEBUG] {self.name} bắn vào ({x}, {y}) của {target_name}")
+        # Bỏ các ô đã bắn rồi chọn ô có giá trị lớn nhất
+        strategic_mat[mask_to_array(board.shot_mask, dtype=bool)] = -1e9
+        x, y = (int(v) for v in numpy.unravel_index(numpy.argmax(strategic_mat), strategic_mat.shape))
+        self.ai_log.debug("%s bắn vào (%d, %d) của %s", self.name, x, y, target_name)
 
         result_data = self.shoot(attacker_name, target_name, x, y)
         result_data.update({"x": x, "y": y})
-        db.session.commit()
 
         return result_data
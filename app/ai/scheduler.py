@@ -0,0 +1,123 @@
+# scheduler.py
+"""
+Lên lịch lượt bắn của AI ngay trên server.
+
+Khi đến lượt AI (process_shot_result, resume, ...), server tự đặt lịch bắn sau
+AI_TURN_DELAY giây thay vì chờ trình duyệt gửi lại "ai_make_shot". Mọi trận dùng chung
+1 heap hẹn giờ và 1 background task của Socket.IO, chờ bằng socketio.sleep nên
+không giữ worker nào trong lúc chờ, và trận vẫn chạy tiếp khi tab bị đóng. Mỗi lượt
+đến hạn chạy trong background task riêng nên 1 lượt chậm (VD MonteCarloAI chờ lấy mẫu)
+không giữ chân lượt của các trận khác.
+
+Mỗi trận có tối đa 1 lượt đang chờ. Huỷ (pause, undo, kết thúc, huỷ trận) chỉ cần
+bỏ trận khỏi _pending, phần tử cũ trong heap sẽ bị bỏ qua khi đến hạn.
+"""
+import heapq
+import itertools
+import logging
+import time
+
+from app import app, db, socketio
+from app.game_logic.live_store import live_store
+from app.metrics import observe_ai_think
+
+log = logging.getLogger(__name__)
+
+
+class AITurnScheduler:
+
+    def __init__(self):
+        self._heap = []               # (thời điểm đến hạn, seq, game_id)
+        self._pending = {}            # game_id -> seq của lượt đang chờ
+        self._running = set()         # game_id đang có lượt chạy
+        self._seq = itertools.count()
+        self._started = False
+
+    def schedule(self, game_id, delay=None):
+        """Đặt lịch cho AI bắn sau delay giây (thay cho lượt đang chờ nếu có)"""
+        if delay is None:
+            delay = app.config.get("AI_TURN_DELAY", 0.25)
+        game_id = int(game_id)
+        seq = next(self._seq)
+        self._pending[game_id] = seq
+        heapq.heappush(self._heap, (time.monotonic() + delay, seq, game_id))
+        self._start()
+
+    def cancel(self, game_id):
+        """Huỷ lượt đang chờ của trận (nếu có)"""
+        self._pending.pop(int(game_id), None)
+
+    def is_scheduled(self, game_id):
+        return int(game_id) in self._pending
+
+    def run_due(self, now=None):
+        """Bắt đầu các lượt đã đến hạn (mỗi lượt 1 background task), trả về số lượt đã bắt đầu"""
+        now = time.monotonic() if now is None else now
+        started = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, game_id = heapq.heappop(self._heap)
+            if self._pending.get(game_id) != seq:
+                continue    # đã bị huỷ hoặc bị thay bằng lịch mới
+            if game_id in self._running:
+                # Lượt trước của trận chưa xong, để tick sau thử lại
+                self.schedule(game_id, delay=max(app.config.get("AI_SCHEDULER_TICK", 0.05), 0.01))
+                continue
+            del self._pending[game_id]
+            self._running.add(game_id)
+            socketio.start_background_task(self._play_task, game_id)
+            started += 1
+        return started
+
+    def _play_task(self, game_id):
+        try:
+            # process_shot_result dùng url_for nên cần request context,
+            # context riêng cũng cho task 1 db.session riêng
+            with app.test_request_context():
+                try:
+                    self._play(game_id)
+                finally:
+                    db.session.remove()
+        except Exception:
+            log.exception("AI bắn lỗi", extra={"game_id": game_id})
+        finally:
+            self._running.discard(game_id)
+
+    def _play(self, game_id):
+        from app.ai.factory import get_ai_instance
+        from app.socket_helpers import process_shot_result
+
+        game = live_store.get(game_id)
+        if not game or not game.ai:
+            return
+        # Trạng thái có thể đã đổi trong lúc chờ
+        if game.status != "battle" or game.current_turn != game.ai.name:
+            return
+
+        ai = get_ai_instance(game)
+        log.debug("AI %s bắt đầu bắn", ai.name, extra={"game_id": game_id})
+        start = time.perf_counter()
+        result_data = ai.make_shot(
+            attacker_name=game.ai.name,
+            target_name=game.player.playername
+        )
+        observe_ai_think(type(ai).__name__, time.perf_counter() - start)
+        process_shot_result(game, result_data, game.ai.name, game.player.playername)
+
+    def _start(self):
+        if self._started:
+            return
+        self._started = True
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        tick = app.config.get("AI_SCHEDULER_TICK", 0.05)
+        while True:
+            wait = tick
+            if self._heap:
+                wait = min(tick, max(0.0, self._heap[0][0] - time.monotonic()))
+            socketio.sleep(wait)
+            if self._heap and self._heap[0][0] <= time.monotonic():
+                self.run_due()
+
+
+ai_scheduler = AITurnScheduler()
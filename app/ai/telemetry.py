@@ -0,0 +1,89 @@
+# telemetry.py
+"""
+Log hoạt động của AI (ai_log_update) chỉ gửi cho client đang mở bảng "Hoạt động của AI".
+
+Client đăng ký bằng sự kiện "subscribe_ai_log" và được đưa vào room riêng của trận
+("<game_id>:ai"). Khi trận không có ai đăng ký thì AI bỏ qua toàn bộ phần log,
+kể cả việc mã hoá phổ xác suất.
+
+Phổ xác suất được lượng tử hoá thành 100 byte (uint8) rồi mã hoá base64:
+    0       ô đã bắn trượt
+    1       ô đã bắn trúng / chìm
+    2..255  ô chưa bắn, chia đều từ min đến max của các ô chưa bắn
+và chỉ gửi tối đa 1 phổ mỗi AI_TELEMETRY_INTERVAL giây cho mỗi trận.
+"""
+import base64
+import time
+
+import numpy
+from app import app
+from app.game_logic.board import CELLS, HIT, MISS, SUNK, mask_to_array
+
+
+def encode_heatmap(matrix, board):
+    """Phổ 10x10 + bảng đối thủ -> {"data": base64 100 byte, "min", "max"}"""
+    values = numpy.asarray(matrix, dtype=float).ravel()
+    missed = mask_to_array(board.masks[MISS], bool).ravel()
+    hit = mask_to_array(board.masks[HIT] | board.masks[SUNK], bool).ravel()
+    open_cells = ~(missed | hit)
+
+    codes = numpy.zeros(CELLS, dtype=numpy.uint8)
+    codes[hit] = 1
+    low = high = 0.0
+    if open_cells.any():
+        low = float(values[open_cells].min())
+        high = float(values[open_cells].max())
+        scale = 253 / (high - low) if high > low else 0.0
+        codes[open_cells] = 2 + numpy.rint((values[open_cells] - low) * scale).astype(numpy.uint8)
+
+    return {
+        "data": base64.b64encode(codes.tobytes()).decode("ascii"),
+        "min": low,
+        "max": high,
+    }
+
+
+class AITelemetry:
+
+    def __init__(self):
+        self._subscribers = {}     # game_id -> set các sid đang xem
+        self._last_heatmap = {}    # game_id -> thời điểm gửi phổ gần nhất
+
+    @staticmethod
+    def room(game_id):
+        return f"{int(game_id)}:ai"
+
+    def subscribe(self, game_id, sid):
+        self._subscribers.setdefault(int(game_id), set()).add(sid)
+
+    def unsubscribe(self, game_id, sid):
+        game_id = int(game_id)
+        sids = self._subscribers.get(game_id)
+        if sids is None:
+            return
+        sids.discard(sid)
+        if not sids:
+            del self._subscribers[game_id]
+            self._last_heatmap.pop(game_id, None)
+
+    def drop_sid(self, sid):
+        """Client ngắt kết nối: bỏ khỏi mọi trận đang xem"""
+        for game_id in [g for g, sids in self._subscribers.items() if sid in sids]:
+            self.unsubscribe(game_id, sid)
+
+    def has_subscribers(self, game_id):
+        return int(game_id) in self._subscribers
+
+    def allow_heatmap(self, game_id):
+        """True nếu đã qua AI_TELEMETRY_INTERVAL kể từ phổ gần nhất của trận"""
+        game_id = int(game_id)
+        now = time.monotonic()
+        interval = app.config.get("AI_TELEMETRY_INTERVAL", 0.2)
+        last = self._last_heatmap.get(game_id)
+        if last is not None and now - last < interval:
+            return False
+        self._last_heatmap[game_id] = now
+        return True
+
+
+ai_telemetry = AITelemetry()
@@ -1,6 +1,7 @@
 import random
 from app import db
 from app.ai.ai_interface import BaseAI
+from app.game_logic.board import FULL_MASK, cell_coords, cells_of
 
 
 class TestAI(BaseAI):
@@ -9,26 +10,24 @@ class TestAI(BaseAI):
     """
 
     def place_ships(self):
-        print(f"[DEBUG] TestAI.place_ships() -> bắt đầu đặt tàu cho {self.name}")
+        self.ai_log.debug("TestAI.place_ships() -> bắt đầu đặt tàu cho %s", self.name)
         self.auto_place_ships(self.name)
 
     def make_shot(self, attacker_name, target_name):
         board = self.get_board(target_name)
         if not board:
-            print(f"[ERROR] Không tìm thấy bảng của {target_name}")
+            self.ai_log.error("Không tìm thấy bảng của %s", target_name)
             return {"result": "invalid", "x": -1, "y": -1}
 
-        possible_moves = [(x, y) for x in range(10) for y in range(10)
-                          if board[x][y] not in (2, 3, 4)]
+        possible_moves = cells_of(FULL_MASK & ~board.shot_mask)
         if not possible_moves:
-            print("[DEBUG] AI không còn ô nào để bắn.")
+            self.ai_log.debug("AI không còn ô nào để bắn")
             return {"result": "invalid", "x": -1, "y": -1}
 
-        x, y = random.choice(possible_moves)
-        print(f"[DEBUG] {self.name} bắn vào ({x}, {y}) của {target_name}")
+        x, y = cell_coords(random.choice(possible_moves))
+        self.ai_log.debug("%s bắn vào (%d, %d) của %s", self.name, x, y, target_name)
 
         result_data = self.shoot(attacker_name, target_name, x, y)
         result_data.update({"x": x, "y": y})
-        db.session.commit()
 
         return result_data
@@ -0,0 +1,133 @@
+# commands.py
+# Các lệnh quản trị chạy bằng `flask <tên lệnh>`
+import json
+import click
+import sqlalchemy as sa
+from app import app, db
+from app.models import Game
+from app.game_logic.board import Board, pack_ship_data
+
+
+@app.cli.command("convert-boards")
+def convert_boards():
+    """Chuyển grid_data/ship_data dạng JSON cũ trong ShipPlacement sang BLOB bitboard."""
+    rows = db.session.execute(
+        sa.text("SELECT id, grid_data, ship_data FROM ship_placement")
+    ).all()
+
+    converted = 0
+    for row_id, grid_data, ship_data in rows:
+        values = {}
+        # Dữ liệu cũ là chuỗi JSON, dữ liệu mới đã là bytes
+        if isinstance(grid_data, str):
+            values["grid_data"] = Board.from_list(json.loads(grid_data)).to_bytes()
+        if isinstance(ship_data, str):
+            values["ship_data"] = pack_ship_data(json.loads(ship_data or "{}"))
+        if not values:
+            continue
+
+        sets = ", ".join(f"{col} = :{col}" for col in values)
+        db.session.execute(
+            sa.text(f"UPDATE ship_placement SET {sets} WHERE id = :id"),
+            {"id": row_id, **values}
+        )
+        converted += 1
+
+    db.session.commit()
+    click.echo(f"Đã chuyển {converted}/{len(rows)} bản ghi ShipPlacement sang bitboard.")
+
+
+@app.cli.command("simulate")
+@click.argument("ai_name")
+@click.option("--vs", "opponent", default=None, help="Tên lớp AI đối thủ")
+@click.option("--strategy", default=None, help="Chiến lược đặt tàu của hạm đội bị bắn")
+@click.option("--games", default=100, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+def simulate(ai_name, opponent, strategy, games, seed):
+    """Chạy mô phỏng AI trong RAM (không dùng DB), VD: flask simulate DemoProbAI --vs TestAI"""
+    from app.game_logic.simulation import run_games
+
+    if opponent is None and strategy is None:
+        strategy = "random"
+    summary = run_games(ai_name, opponent, strategy if opponent is None else None,
+                        games=games, seed=seed)
+    click.echo(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups():
+    """Tính lại các số liệu tổng hợp (phổ đặt tàu, thống kê tổng quan, thống kê AI) từ lịch sử trận đấu."""
+    from app.game_logic import rollups
+
+    players = rollups.rebuild_player_heatmaps()
+    ais = rollups.rebuild_stats()
+    db.session.commit()
+    rollups.finished_committed()
+    click.echo(f"Đã dựng lại phổ đặt tàu cho {players} người chơi, phổ chung và thống kê của {ais} AI.")
+
+
+@app.cli.command("audit-games")
+@click.option("--limit", default=None, type=int, help="Chỉ kiểm tra N trận gần nhất")
+def audit_games(limit):
+    """Dựng lại các trận đã kết thúc từ hạm đội + lịch sử nước đi, báo các trận lệch người thắng/số phát bắn."""
+    from app.game_logic import history
+    from app.game_logic.live_store import live_store
+
+    query = sa.select(Game.id).where(Game.status == "finished").order_by(Game.id.desc())
+    if limit:
+        query = query.limit(limit)
+    game_ids = db.session.scalars(query).all()
+
+    mismatched = 0
+    for game_id in game_ids:
+        state = live_store.read(game_id)
+        applied = [m for m in state.moves if not m.is_reverted]
+        player_name = state.player.playername
+        expected = {
+            "winner": history.winner_of(state.boards, applied),
+            "player_shots": sum(1 for m in applied if m.attacker_name == player_name),
+            "opponent_shots": sum(1 for m in applied if m.attacker_name != player_name),
+        }
+        actual = {field: getattr(state, field) for field in expected}
+        actual["winner"] = actual["winner"] or None     # trận chưa có người thắng lưu ""
+        if actual != expected:
+            mismatched += 1
+            click.echo(f"Game {game_id}: lưu {actual}, dựng lại {expected}")
+        db.session.expunge_all()
+    click.echo(f"Đã kiểm tra {len(game_ids)} trận, {mismatched} trận lệch.")
+
+
+def _open_replay(path, mode):
+    """File replay, tên kết thúc bằng .gz thì nén gzip"""
+    import gzip
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+
+@app.cli.command("export-replays")
+@click.argument("path")
+@click.option("--since-id", default=0, show_default=True, help="Chỉ xuất các trận có id lớn hơn")
+@click.option("--batch-size", default=500, show_default=True)
+def export_replays(path, since_id, batch_size):
+    """Xuất các trận đã kết thúc ra file replay nhị phân (xem app/game_logic/replay.py), VD: flask export-replays games.bsr.gz"""
+    from app.game_logic import replay
+
+    with _open_replay(path, "wb") as stream:
+        written, skipped = replay.export_games(stream, batch_size=batch_size, since_id=since_id)
+    click.echo(f"Đã xuất {written} trận vào {path} (bỏ qua {skipped} trận thiếu dữ liệu).")
+
+
+@app.cli.command("import-replays")
+@click.argument("path")
+@click.option("--batch-size", default=500, show_default=True)
+def import_replays(path, batch_size):
+    """Nạp các trận từ file replay rồi dựng lại số liệu tổng hợp"""
+    from app.game_logic import replay, rollups
+
+    with _open_replay(path, "rb") as stream:
+        imported = replay.import_games(stream, batch_size=batch_size)
+    rollups.rebuild_player_heatmaps()
+    rollups.rebuild_stats()
+    db.session.commit()
+    rollups.finished_committed()
+    click.echo(f"Đã nạp {imported} trận từ {path}.")
+
@@ -1,25 +1,30 @@
-import json
-from app import db
-from app.models import ShipPlacement, Player, GameMove
-import sqlalchemy as sa
+from app.game_logic.board import (
+    Board, ShipIndex, FLEET, EMPTY, SHIP, HIT, MISS, SUNK,
+    cell_bit,
+)
+from app.game_logic.placements import placement_mask
+from app.game_logic.live_store import live_store, LiveMove
+from app.game_logic import history
+from app.log import game_logger
+import logging
 import random
 
+log = logging.getLogger(__name__)
+
 class GameLogic:
     """
     Lớp xử lý toàn bộ logic của trò chơi Battleship.
     """
 
-    def __init__(self, game):
-        self.game = game
+    def __init__(self, game, store=None):
+        # Làm việc trên trạng thái trong RAM (LiveGame), không truy vấn DB mỗi lượt.
+        # store mặc định là kho gắn với DB, mô phỏng không cần DB thì truyền MemoryStore
+        self.store = store or live_store
+        self.game = self.store.get(game)
+        self.log = game_logger(log, self.game.id)
 
         # Định nghĩa độ dài tàu
-        self.ships = {
-            "Carrier": 5,
-            "Battleship": 4,
-            "Cruiser": 3,
-            "Submarine": 3,
-            "Destroyer": 2,
-        }
+        self.ships = dict(FLEET)
 
         # Lưu vị trí từng tàu (cho cả 2 bên)
         # { "player": { "Carrier": [(x1,y1), (x2,y2)...], ... }, "opponent": {...} }
@@ -31,66 +36,33 @@ class GameLogic:
     # --------------------------- Qlí bảng ---------------------------
 
     def init_board(self, owner_name, size=10):
-        """Tạo ma trận trống cho người chơi, nếu chưa có thì khởi tạo."""
-        empty_board = [[0 for _ in range(size)] for _ in range(size)]
-
-        # Kiểm tra xem đã có record cho người chơi này trong game chưa
-        placement = db.session.scalar(
-            db.select(ShipPlacement)
-            .where(ShipPlacement.game_id == self.game.id)
-            .where(ShipPlacement.owner == owner_name)
-        )
-
-        if placement:
-            # Nếu đã tồn tại thì chỉ cập nhật lại grid_data (reset bảng)
-            placement.grid_data = json.dumps(empty_board)
-            if placement.ship_data is None:
-                placement.ship_data = json.dumps({})
-        else:
-            # Nếu chưa có thì tạo mới
-            placement = ShipPlacement(
-                game_id=self.game.id,
-                owner=owner_name,
-                grid_data=json.dumps(empty_board),
-                ship_data=json.dumps({})  # đảm bảo không bị None
-            )
-            db.session.add(placement)
-
-        db.session.commit()
-        print(f"[DEBUG] init_board() -> Đảm bảo chỉ có 1 ShipPlacement cho {owner_name}")
+        """Tạo bảng trống cho người chơi, nếu chưa có thì khởi tạo."""
+        empty_board = Board()
+
+        # Mỗi người chơi chỉ có 1 bảng trong trận, có rồi thì reset lại
+        self.game.boards[owner_name] = empty_board
+        self.game.ship_data.setdefault(owner_name, {})
+        self.game.ship_index.pop(owner_name, None)
+        self.store.mark_dirty(self.game, owner_name)
+        # Bảng bị dựng lại: client phải lấy snapshot thay vì delta,
+        # snapshot cũ (kể cả đã ghi xuống DB) không còn đúng với hạm đội mới
+        self.game.reset_deltas()
+        history.drop_snapshots_after(self.game, 0)
+        self.store.mark_dirty(self.game)
+
+        self.log.debug("init_board() -> bảng trống cho %s", owner_name)
         return empty_board
 
 
     def get_board(self, owner_name):
-        """Lấy ma trận từ database"""
-        placement = db.session.scalar(
-            db.select(ShipPlacement)
-            .where(ShipPlacement.game_id == self.game.id)
-            .where(ShipPlacement.owner == owner_name)
-        )
-        if not placement:
-            return None
-        return json.loads(placement.grid_data)
+        """Lấy bảng (Board) của người chơi trong kho trận đấu"""
+        return self.game.boards.get(owner_name)
 
     def save_board(self, owner_name, board):
-        """Cập nhật ma trận của người chơi"""
-        placement = db.session.scalar(
-            db.select(ShipPlacement)
-            .where(ShipPlacement.game_id == self.game.id)
-            .where(ShipPlacement.owner == owner_name)
-        )
-
-        if placement:
-            placement.grid_data = json.dumps(board)
-        else:
-            placement = ShipPlacement(
-                game_id=self.game.id,
-                owner=owner_name,
-                grid_data=json.dumps(board),
-            )
-            db.session.add(placement)
-
-        db.session.commit()
+        """Cập nhật bảng của người chơi"""
+        self.game.boards[owner_name] = board
+        self.game.ship_data.setdefault(owner_name, {})
+        self.store.mark_dirty(self.game, owner_name)
 
     # --------------------------- CORE LOGIC ---------------------------
 
@@ -104,24 +76,7 @@ class GameLogic:
             - Không đè tàu khác
             - Không chạm tàu khác (kể cả chéo)  // tạm thời bỏ 
         """
-        for i in range(length):
-            nx = x + (i if orientation == "V" else 0)
-            ny = y + (i if orientation == "H" else 0)
-            
-            if not self.in_bounds(nx, ny):
-                return False
-            
-            if board[nx][ny] != 0:
-                return False
-            
-            # for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            #     adjx, adjy = nx + dx, ny + dy
-            #     if not (0 <= adjx < len(board) and 0 <= adjy < len(board[0])):
-            #         continue
-            #     if board[adjx][adjy] == 1:
-            #         return False
-                
-        return True
+        return board.can_place_mask(placement_mask(x, y, length, orientation))
 
     def place_ship(self, board, x, y, length, orientation, ship_name, owner):
         """Đặt tàu lên bảng và lưu vị trí"""
@@ -135,49 +90,27 @@ class GameLogic:
             return None
 
         # Đặt tàu
+        old_masks = list(board.masks)
         positions = []
         for i in range(length):
             nx = x + (i if orientation == "V" else 0)
             ny = y + (i if orientation == "H" else 0)
-            board[nx][ny] = 1
-            positions.append((nx, ny))
+            positions.append([nx, ny])
+        board.set_mask(placement_mask(x, y, length, orientation), SHIP)
 
         self.ship_positions[owner][ship_name] = positions
-        # Lưu vào ShipPlacement.ship_data
-        placement = db.session.scalar(
-            db.select(ShipPlacement)
-            .where(ShipPlacement.game_id == self.game.id)
-            .where(ShipPlacement.owner == owner)
-        )
-        if placement:
-            data = json.loads(placement.ship_data or "{}")
-            data[ship_name] = {
-                "positions": positions,
-                "sunked": False
-            }
-            placement.ship_data = json.dumps(data)
-            placement.grid_data = json.dumps(board)
-        else:
-            placement = ShipPlacement(
-                game_id=self.game.id,
-                owner=owner,
-                grid_data=json.dumps(board),
-                ship_data=json.dumps({
-                    ship_name: {"positions": positions, "sunked": False} 
-                }),
-            )
-            db.session.add(placement)
-
-        db.session.commit()
-        print(f"[DEBUG] Cập nhật ship_data cho owner={owner}")
-        try:
-            current_data = json.loads(placement.ship_data or "{}")
-            for name, info in current_data.items():
-                pos = info.get("positions", [])
-                sunk = info.get("sunked", False)
-                print(f"  └─ {name}: {len(pos)} ô, sunked={sunk}, positions={pos}")
-        except Exception as e:
-            print(f"[DEBUG] Lỗi khi in ship_data của {owner}: {e}")
+        # Lưu vào ship_data (ghi xuống ShipPlacement.ship_data khi flush)
+        data = self.game.ship_data.setdefault(owner, {})
+        data[ship_name] = {
+            "positions": positions,
+            "sunked": False
+        }
+        self.game.boards[owner] = board
+        self.game.ship_index.pop(owner, None)
+        self.store.mark_dirty(self.game, owner)
+        self._record_delta(owner, old_masks)
+
+        self.log.debug("%s đặt %s tại %s", owner, ship_name, positions)
         return board
     
     def auto_place_ships(self, owner_name): 
@@ -192,56 +125,58 @@ class GameLogic:
                     board = self.place_ship(board, x, y, length, orientation, ship_name, owner_name) 				
                     placed = True 
         self.save_board(owner_name, board) 
-        print(f"[DEBUG] auto_place_ships() -> Đặt bảng xong rùi đó {owner_name}")
+        self.log.debug("auto_place_ships() -> đặt bảng xong cho %s", owner_name)
         return board
 
     # --------------------------- SHOOTING LOGIC ---------------------------
 
-    def shoot(self, attacker_name, target_name, x, y):
+    def shoot(self, attacker_name, target_name, x, y, expected_version=None):
         """
         Xử lý phát bắn giữa 2 người (attacker → target)
+        expected_version: version client đang thấy, trận đã đổi thì raise StaleVersion
         Trả về: {"result": "hit/miss/sunk/already_hit/out_of_bounds", "winner": optional_name}
         """
-        print(f"[DEBUG] {attacker_name} bắn ({x},{y}) vào {target_name}")
+        self.game.check_version(expected_version)
+        self.log.debug("%s bắn (%d,%d) vào %s", attacker_name, x, y, target_name)
 
         board = self.get_board(target_name)
         if not board:
-            print(f"[DEBUG] Không tìm thấy bảng của {target_name}")
+            self.log.warning("Không tìm thấy bảng của %s", target_name)
             return {"result": "invalid", "winner": None}
 
         # Nếu người chơi bắn phát mới, các nước đi đã được undo để chờ redo sẽ bị xóa
-        db.session.execute(
-            sa.delete(GameMove)
-            .where(GameMove.game_id == self.game.id, GameMove.is_reverted == True)
-        )
+        # (các nước đã undo luôn nằm ở cuối danh sách)
+        if self.game.moves and self.game.moves[-1].is_reverted:
+            reverted = [m for m in self.game.moves if m.is_reverted]
+            self.game.moves = [m for m in self.game.moves if not m.is_reverted]
+            self.game.deleted_moves.extend(reverted)
+            history.drop_snapshots_after(self.game, len(self.game.moves))
 
         # Kiểm tra toạ độ hợp lệ
         if not self.in_bounds(x, y):
-            print(f"[DEBUG] Toạ độ ({x},{y}) ngoài phạm vi bảng!")
+            self.log.debug("Toạ độ (%d,%d) ngoài phạm vi bảng", x, y)
             return {"result": "out_of_bounds", "winner": None}
 
-        cell = board[x][y]
-        print(f"[DEBUG] Trạng thái ô ({x},{y}) trước khi bắn: {cell}")
+        old_masks = list(board.masks)
+        cell = board.get(x, y)
         ship_name = None
         result = None
         prev_cell = cell    #Lưu trạng thái cũ để undo
 
         # --- Xử lý các trường hợp ---
-        if cell == 0:
-            board[x][y] = 3
+        if cell == EMPTY:
+            board.set(x, y, MISS)
             result = "miss"
-            print(f"[DEBUG] Bắn trượt ({x},{y})")
 
-        elif cell == 1:
-            board[x][y] = 2
-            print(f"[DEBUG] Bắn trúng tàu tại ({x},{y})")
+        elif cell == SHIP:
+            index = self._ship_index(target_name)   # dựng trước khi sửa bảng
+            board.set(x, y, HIT)
             ship_name, comp = self._get_ship_component(target_name, x, y)
-            print(f"[DEBUG] Component tàu {ship_name} gồm {len(comp)} ô: {comp}")
             
-            if comp and self._is_component_sunk(comp, board):
+            if index.hit(ship_name):
                 self._mark_component_sunk(comp, board)
                 result = "sunk"
-                print(f"[DEBUG] Toàn bộ tàu đã chìm! Đánh dấu ô: {comp}")
+                self.log.debug("%s của %s chìm: %s", ship_name, target_name, comp)
                 
                 sunked_ship = ship_name
                 if sunked_ship:
@@ -249,30 +184,23 @@ class GameLogic:
 
             else:
                 result = "hit"
-                print(f"[DEBUG] Tàu chưa chìm hoàn toàn.")
 
-        elif cell in (2, 3, 4):
+        elif cell in (HIT, MISS, SUNK):
             result = "already_hit"
-            print(f"[DEBUG] Ô ({x},{y}) đã bị bắn trước đó.")
 
         # --- Lưu lại thay đổi ---
-        self.save_board(target_name, board)
-        print(f"[DEBUG] Đã lưu trạng thái mới của bảng {target_name}")
+        # Bảng được sửa tại chỗ trong LiveGame, DB chỉ nhận thêm 1 GameMove (xem history.py)
 
         # --- Cập nhật thống kê ---
         if attacker_name == getattr(self.game.player, "playername", None):
             self.game.player_shots += 1
-            print(f"[DEBUG] +1 lượt bắn cho player {attacker_name}")
         elif attacker_name == getattr(self.game.opponent, "playername", None):
             self.game.opponent_shots += 1
-            print(f"[DEBUG] +1 lượt bắn cho opponent {attacker_name}")
         elif attacker_name == getattr(self.game.ai, "name", None):
             self.game.opponent_shots += 1
-            print(f"[DEBUG] +1 lượt bắn cho opponent {attacker_name}")
 
         #Tạo bản ghi undo/redo
-        game_move = GameMove(
-            game_id=self.game.id,
+        game_move = LiveMove(
             attacker_name = attacker_name,
             target_name = target_name,
             x = x,
@@ -283,35 +211,18 @@ class GameLogic:
             sunk_ship_name = ship_name if result == "sunk" else None,
             is_reverted = False
         )
-        
-        db.session.add(game_move)
-        db.session.commit()
+        self.game.moves.append(game_move)
+        self.store.mark_dirty(self.game)
+        history.take_snapshot(self.game)
+        delta = self._record_delta(target_name, old_masks)
 
         # --- Kiểm tra thắng cuộc ---
-        if self._all_ships_sunk(board):
-            print(f"[DEBUG] {target_name} không còn tàu nào → {attacker_name} thắng trận!")
+        if result == "sunk" and self._ship_index(target_name).all_sunk():
+            self.log.info("%s không còn tàu nào → %s thắng trận", target_name, attacker_name)
+            # Thắng/thua của Player được cập nhật khi kho ghi trận xuống DB
             self.game.status = "finished"
             self.game.winner = attacker_name
             
-            player_win = db.session.scalar(
-                sa.select(Player).where(Player.playername == attacker_name)
-            )
-            player_lose = db.session.scalar(
-                sa.select(Player).where(Player.playername == target_name)
-            )
-            
-            if player_win:
-                player_win.wins = (player_win.wins or 0) + 1
-            else:
-                print(f"[ERROR] Không tìm thấy người thắng '{attacker_name}' trong bảng Player!")
-
-            if player_lose:
-                player_lose.losses = (player_lose.losses or 0) + 1
-            else:
-                print(f"[ERROR] Không tìm thấy người thua '{attacker_name}' trong bảng Player!")
-            db.session.commit()
-            print(f"[DEBUG]  Đã commit cập nhật kết quả thắng/thua vào DB.")
-            
             return {
                 "result": result, 
                 "winner": attacker_name, 
@@ -319,10 +230,11 @@ class GameLogic:
                 "ship_name": ship_name, 
                 "comp": comp,
                 "x": x,
-                "y": y
+                "y": y,
+                "delta": delta
             }
 
-        print(f"[DEBUG] Kết quả phát bắn: {result}")
+        self.log.debug("Kết quả phát bắn (%d,%d): %s (ô trước đó %s)", x, y, result, prev_cell)
         if result == 'sunk':
             return {
                 "result": result,
@@ -331,155 +243,136 @@ class GameLogic:
                 "ship_name": ship_name,
                 "comp": comp,
                 "x": x,
-                "y": y
+                "y": y,
+                "delta": delta
             }
         else: 
             return {
                 "result": result, 
                 "winner": None,
                 "x": x,
-                "y": y
+                "y": y,
+                "delta": delta
             }
 
 
+    @staticmethod
+    def next_turn(result, attacker_name, target_name):
+        """Bắn trượt thì mất lượt, còn lại được bắn tiếp"""
+        if result in ("miss", "out_of_bounds"):
+            return target_name
+        return attacker_name
+
     # --------------------------- Xử lí undo/redo ---------------------------
 
-    def undo_last_move(self):
-        print(f"\n[DEBUG] --- BẮT ĐẦU UNDO (Game ID: {self.game.id}) ---")
-        
-        last_move = db.session.scalar(
-            sa.select(GameMove)
-            .where(GameMove.game_id == self.game.id,
-                GameMove.is_reverted == False)
-            .order_by(GameMove.id.desc())
-            .limit(1)
+    def undo_last_move(self, expected_version=None):
+        self.game.check_version(expected_version)
+        last_move = next(
+            (m for m in reversed(self.game.moves) if not m.is_reverted), None
         )
         
         if not last_move:
-            print("[DEBUG] Không tìm thấy nước đi nào hợp lệ để undo (hoặc đã undo hết).")
+            self.log.debug("Undo: không còn nước đi nào để undo")
             return None
 
-        print(f"[DEBUG] Tìm thấy Last Move: ID={last_move.id}, Attacker={last_move.attacker_name}, Target={last_move.target_name}, Kết quả cũ={last_move.result}")
+        self.log.debug("Undo nước %s: %s bắn (%d,%d) vào %s, kết quả cũ %s", last_move.id,
+                       last_move.attacker_name, last_move.x, last_move.y, last_move.target_name, last_move.result)
 
         board = self.get_board(last_move.target_name)
-        
+        old_masks = list(board.masks)
         
         # xử lí tàu chìm 
         if last_move.result == "sunk" and last_move.sunk_ship_name:
-            print(f"[DEBUG] Phát hiện tàu chìm cần khôi phục: {last_move.sunk_ship_name}")
-            
-            placement = db.session.scalar(
-                sa.select(ShipPlacement)
-                .where(ShipPlacement.game_id == self.game.id,
-                        ShipPlacement.owner == last_move.target_name)
-            )
+            ship_data = self.game.ship_data.get(last_move.target_name)
             
-            if placement and placement.ship_data:
-                ship_data = json.loads(placement.ship_data)
-                
+            if ship_data:
                 if last_move.sunk_ship_name in ship_data:    
-                    print(f"[DEBUG] Đã tìm thấy dữ liệu tàu {last_move.sunk_ship_name} trong ShipPlacement.")
-                    
                     ship_data[last_move.sunk_ship_name]["sunked"] = False
-                    placement.ship_data = json.dumps(ship_data)
                     
                     # Khôi phục các ô tàu chìm
                     positions = ship_data[last_move.sunk_ship_name]["positions"]
-                    count_restored = 0
-                    for px, py in positions:
-                        if board[px][py] == 4:
-                            board[px][py] = 2
-                            count_restored += 1
-                    print(f"[DEBUG] Đã khôi phục {count_restored} ô thân tàu từ trạng thái 4 về 2.")
+                    sunk_cells = self._component_mask(positions) & board.masks[SUNK]
+                    board.set_mask(sunk_cells, HIT)
+                    self.log.debug("Khôi phục %s: %d ô từ chìm về trúng",
+                                   last_move.sunk_ship_name, sunk_cells.bit_count())
                 else:
-                    print(f"[DEBUG] CẢNH BÁO: Không thấy tàu {last_move.sunk_ship_name} trong ship_data!")
+                    self.log.warning("Undo: không thấy tàu %s trong ship_data", last_move.sunk_ship_name)
             else:
-                print("[DEBUG] CẢNH BÁO: Không tìm thấy placement hoặc ship_data trống.")
+                self.log.warning("Undo: ship_data của %s trống", last_move.target_name)
+
+        # Ô bị bắn trúng được trả lại thành tàu -> tăng lại bộ đếm
+        if last_move.prev_cell == SHIP:
+            index = self._ship_index(last_move.target_name)
+            index.unhit(index.ship_at(last_move.x, last_move.y))
 
         # Trả lại ô cũ 
-        current_val = board[last_move.x][last_move.y]
-        board[last_move.x][last_move.y] = last_move.prev_cell
-        print(f"[DEBUG] Revert ô ({last_move.x}, {last_move.y}): {current_val} -> {last_move.prev_cell}")
+        board.set(last_move.x, last_move.y, last_move.prev_cell)
         
         last_move.is_reverted = True
+        last_move.dirty = True
 
-        # Trả lượt
+        # Trả lượt, người thắng (nếu có) luôn là người đi nước cuối nên cũng bị bỏ
         self.game.current_turn = last_move.attacker_name
-        print(f"[DEBUG] Trả lượt chơi lại cho: {self.game.current_turn}")
+        if self.game.winner:
+            self.game.winner = ""
 
         # Xử lí thống kê
         if last_move.attacker_name == getattr(self.game.player, "playername", None):
             self.game.player_shots = max(0, self.game.player_shots - 1)
-            print(f"[DEBUG] Giảm shot player còn: {self.game.player_shots}")
         else:
             self.game.opponent_shots = max(0, self.game.opponent_shots - 1)
-            print(f"[DEBUG] Giảm shot opponent còn: {self.game.opponent_shots}")
         
-        self.save_board(last_move.target_name, board)
-        print(f"[DEBUG] Đã lưu board {last_move.target_name}")
-
-        try:
-            db.session.commit()
-            print("[DEBUG] Commit DB thành công. Undo hoàn tất.\n")
-        except Exception as e:
-            print(f"[DEBUG] LỖI khi commit: {e}")
-            db.session.rollback()
+        self.store.mark_dirty(self.game)
+        delta = self._record_delta(last_move.target_name, old_masks)
 
         return {
             "attacker": last_move.attacker_name, 
             "target": last_move.target_name,
-            "board": board
+            "delta": delta
         }
     
-    def redo_last_move(self):
+    def redo_last_move(self, expected_version=None):
         #redo nước đi gần nhất
-        next_move = db.session.scalar(
-            sa.select(GameMove)
-            .where(GameMove.game_id == self.game.id,
-                   GameMove.is_reverted == True)
-            .order_by(GameMove.id.asc())
-            .limit(1)
-        )
+        self.game.check_version(expected_version)
+        next_move = next((m for m in self.game.moves if m.is_reverted), None)
         if not next_move:
             return None
 
         board = self.get_board(next_move.target_name)
+        old_masks = list(board.masks)
         comp = None
+        if next_move.prev_cell == SHIP:
+            index = self._ship_index(next_move.target_name)
+            index.hit(index.ship_at(next_move.x, next_move.y))
         
         if next_move.result == "miss":
-            board[next_move.x][next_move.y] = 3
+            board.set(next_move.x, next_move.y, MISS)
             self.game.current_turn = next_move.target_name
         elif next_move.result == "hit":
-            board[next_move.x][next_move.y] = 2
+            board.set(next_move.x, next_move.y, HIT)
             self.game.current_turn = next_move.attacker_name
         elif next_move.result == "already_hit":
             self.game.current_turn = next_move.attacker_name
         elif next_move.result == "sunk":
-            placement = db.session.scalar(
-                sa.select(ShipPlacement)
-                .where(ShipPlacement.game_id == self.game.id,
-                        ShipPlacement.owner == next_move.target_name)
-            )
-            if placement and placement.ship_data and next_move.sunk_ship_name:
-                ship_data = json.loads(placement.ship_data)
+            ship_data = self.game.ship_data.get(next_move.target_name)
+            if ship_data and next_move.sunk_ship_name:
                 ship_data[next_move.sunk_ship_name]["sunked"] = True
-                placement.ship_data = json.dumps(ship_data)
                 
                 positions = ship_data[next_move.sunk_ship_name]["positions"]
                 comp = positions
-                for px, py in positions:
-                    board[px][py] = 4            
+                board.set_mask(self._component_mask(positions), SUNK)
             self.game.current_turn = next_move.attacker_name
         
         next_move.is_reverted = False
+        next_move.dirty = True
         
         if next_move.attacker_name == getattr(self.game.player, "playername", None):
             self.game.player_shots += 1
         else:
             self.game.opponent_shots += 1 
             
-        self.save_board(next_move.target_name, board)
-        db.session.commit()
+        self.store.mark_dirty(self.game)
+        delta = self._record_delta(next_move.target_name, old_masks)
 
         # return để gọi process_shot_result
         return {
@@ -491,72 +384,126 @@ class GameLogic:
             "winner": self.game.winner if self.game.status == "finished" else None,
             "owner": next_move.target_name,
             "ship_name": next_move.sunk_ship_name,
-            "comp": comp
+            "comp": comp,
+            "delta": delta
         }
 
+    def move_count(self):
+        """Số nước đang được áp dụng (các nước đã undo luôn nằm ở cuối danh sách)"""
+        return sum(1 for m in self.game.moves if not m.is_reverted)
+
+    def jump_to_move(self, n, expected_version=None):
+        """
+        Đưa trận về trạng thái sau n nước đầu tiên (undo/redo nhiều bước 1 lần).
+        Bảng được dựng từ snapshot gần nhất + phát lại các nước trong RAM,
+        trả về {"moves", "previous", "deltas"} hoặc None nếu không có gì thay đổi.
+        """
+        self.game.check_version(expected_version)
+        moves = self.game.moves
+        n = max(0, min(int(n), len(moves)))
+        current = self.move_count()
+        if n == current:
+            return None
+        self.log.debug("jump_to_move() -> nước %d -> %d", current, n)
+
+        deltas = []
+        for owner in {m.target_name for m in moves}:
+            board = self.game.boards.get(owner)
+            if board is None:
+                continue
+            old_masks = list(board.masks)
+            board.masks = history.board_at(self.game, owner, n).masks
+            if history.sunk_flags(board, self.game.ship_data.get(owner, {})) or old_masks != board.masks:
+                self.game.ship_index.pop(owner, None)
+                deltas.append(self._record_delta(owner, old_masks))
+
+        # Cờ undo và số phát bắn của các nước đổi trạng thái
+        for i, move in enumerate(moves):
+            reverted = i >= n
+            if move.is_reverted == reverted:
+                continue
+            move.is_reverted = reverted
+            move.dirty = True
+            step = -1 if reverted else 1
+            if move.attacker_name == getattr(self.game.player, "playername", None):
+                self.game.player_shots = max(0, self.game.player_shots + step)
+            else:
+                self.game.opponent_shots = max(0, self.game.opponent_shots + step)
+
+        winner = history.winner_of(self.game.boards, moves[:n])
+        if winner or self.game.winner:
+            self.game.winner = winner or ""
+
+        # Lượt giống undo/redo từng bước: về người sẽ đi nước tiếp theo
+        if n < len(moves):
+            self.game.current_turn = moves[n].attacker_name
+        elif moves:
+            last = moves[-1]
+            self.game.current_turn = self.next_turn(last.result, last.attacker_name, last.target_name)
+        self.store.mark_dirty(self.game)
+
+        return {"moves": n, "previous": current, "deltas": deltas}
+
     # --------------------------- Không phải hàm chính ---------------------------
+
+    def _record_delta(self, owner, old_masks):
+        """Tăng version của trận, trả về delta các ô của owner đã đổi so với old_masks"""
+        delta = self.game.record_delta(owner, self.game.boards[owner].changed_cells(old_masks))
+        self.store.mark_dirty(self.game)
+        return delta
     
+    def _ship_index(self, owner):
+        """Bảng tra ô -> tàu của 1 bên, dựng 1 lần rồi giữ trong LiveGame"""
+        index = self.game.ship_index.get(owner)
+        if index is None:
+            index = ShipIndex(self.game.ship_data.get(owner, {}), self.game.boards[owner])
+            self.game.ship_index[owner] = index
+        return index
+
     def _get_ship_component(self, target_name, x, y):
-        placement = db.session.scalar(
-            db.select(ShipPlacement)
-            .where(ShipPlacement.game_id == self.game.id)
-            .where(ShipPlacement.owner == target_name)
-        )
-        if not placement:
-            print(f"[DEBUG] không tìm thấy bảng placement của {target_name}")
+        if target_name not in self.game.boards:
+            self.log.warning("Không tìm thấy bảng của %s", target_name)
             return None
-        if not placement.ship_data:
-            print(f"[DEBUG] không tìm thấy bảng ship_data của {target_name}")
+        if not self.game.ship_data.get(target_name):
+            self.log.warning("Không tìm thấy ship_data của %s", target_name)
             return None
         
-        data = json.loads(placement.ship_data)
-        for ship_name, info in data.items():
-            coords = info.get('positions', {})
-            if [x, y] in coords:
-                return ship_name, coords
-        return None
+        index = self._ship_index(target_name)
+        ship_name = index.ship_at(x, y)
+        if ship_name is None:
+            return None
+        return ship_name, index.ship_cells[ship_name]
+
+    def _component_mask(self, component):
+        """Danh sách toạ độ -> mask"""
+        mask = 0
+        for (x, y) in component:
+            mask |= cell_bit(x, y)
+        return mask
 
     def _is_component_sunk(self, component, board):
         """True nếu không có component chưa bị bắn"""
-        for (x,y) in component:
-            if board[x][y] == 1:
-                return False
-        return True
+        return not (self._component_mask(component) & board.masks[SHIP])
 
     def _is_ship_sunk(self, owner, ship_name, board):
         """Kiểm tra nếu toàn bộ tàu đã bị trúng"""
-        for (x, y) in self.ship_positions[owner][ship_name]:
-            if board[x][y] not in (2, 4):
-                return False
-        return True
+        mask = self._component_mask(self.ship_positions[owner][ship_name])
+        return (mask & (board.masks[HIT] | board.masks[SUNK])) == mask
 
     def _mark_component_sunk(self, component, board):
-        print(f"[DEBUG] Đánh dấu component đã chìm: {component}")
-        for (x,y) in component:
-            board[x][y] = 4
+        board.set_mask(self._component_mask(component), SUNK)
 
 
     def _all_ships_sunk(self, board):
         """Kiểm tra nếu toàn bộ tàu đã bị bắn chìm"""
-        for row in board:
-            for cell in row:
-                if cell == 1:  # vẫn còn phần tàu chưa bị bắn
-                    return False
-        return True
+        return board.all_ships_sunk()
     
     def _record_ship_sunk(self, owner_name, ship_name):
-        placement = db.session.scalar(
-            db.select(ShipPlacement)
-            .where(ShipPlacement.game_id == self.game.id)
-            .where(ShipPlacement.owner == owner_name)
-        )
-        if not placement or not placement.ship_data:
+        data = self.game.ship_data.get(owner_name)
+        if not data:
             return
 
-        data = json.loads(placement.ship_data)
+        # Cờ chìm chỉ giữ trong RAM, khi nạp lại được suy ra từ lịch sử nước đi
         if ship_name in data:
             data[ship_name]["sunked"] = True
-            placement.ship_data = json.dumps(data)
-            db.session.commit()
 
-        print(f"[DEBUG] Đánh dấu {ship_name} của {owner_name} là đã chìm")
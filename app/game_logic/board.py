@@ -0,0 +1,322 @@
+# board.py
+"""
+Biểu diễn bảng dạng bitboard.
+
+Mỗi trạng thái ô (tàu, trúng, trượt, chìm) là một số nguyên 100 bit,
+bit thứ i ứng với ô (i // 10, i % 10). Các trạng thái loại trừ nhau:
+một ô chỉ nằm trong tối đa 1 mask, ô không nằm trong mask nào là ô trống.
+
+Trong DB bảng được lưu thành BLOB 52 byte (4 mask x 13 byte),
+ship_data được lưu thành BLOB vài chục byte thay cho JSON.
+"""
+
+import numpy
+
+SIZE = 10
+CELLS = SIZE * SIZE
+
+# Giá trị ô, giữ nguyên như bản JSON cũ
+EMPTY, SHIP, HIT, MISS, SUNK = 0, 1, 2, 3, 4
+STATES = (SHIP, HIT, MISS, SUNK)
+
+FULL_MASK = (1 << CELLS) - 1
+_MASK_BYTES = (CELLS + 7) // 8
+
+# Thứ tự tàu cố định, dùng để mã hoá tên tàu thành 1 byte
+FLEET = {
+    "Carrier": 5,
+    "Battleship": 4,
+    "Cruiser": 3,
+    "Submarine": 3,
+    "Destroyer": 2,
+}
+SHIP_NAMES = tuple(FLEET)
+
+
+def cell_index(x, y):
+    return x * SIZE + y
+
+
+def cell_coords(index):
+    return divmod(index, SIZE)
+
+
+def cell_bit(x, y):
+    return 1 << (x * SIZE + y)
+
+
+def iter_cells(mask):
+    """Duyệt chỉ số các bit đang bật trong mask"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def cells_of(mask):
+    """Danh sách chỉ số các bit đang bật, tăng dần (nhanh hơn iter_cells khi mask dày)"""
+    bits = bin(mask)[:1:-1]
+    return [i for i, c in enumerate(bits) if c == "1"]
+
+
+def _build_neighbors():
+    neighbors = []
+    for i in range(CELLS):
+        x, y = cell_coords(i)
+        m = 0
+        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < SIZE and 0 <= ny < SIZE:
+                m |= cell_bit(nx, ny)
+        neighbors.append(m)
+    return tuple(neighbors)
+
+
+# NEIGHBORS[i]: mask các ô kề (trên/dưới/trái/phải) của ô i
+NEIGHBORS = _build_neighbors()
+
+
+def mask_to_array(mask, dtype=float):
+    """Mask -> numpy array 10x10 gồm 0/1"""
+    raw = numpy.frombuffer(mask.to_bytes(_MASK_BYTES, "little"), dtype=numpy.uint8)
+    bits = numpy.unpackbits(raw, bitorder="little")[:CELLS]
+    return bits.reshape(SIZE, SIZE).astype(dtype)
+
+
+def neighbor_mask(mask):
+    """Mask các ô kề với ít nhất 1 ô trong mask (không gồm chính mask)"""
+    result = 0
+    for i in iter_cells(mask):
+        result |= NEIGHBORS[i]
+    return result & ~mask
+
+
+def ship_mask(x, y, length, orientation):
+    """Mask các ô của tàu đặt tại (x, y), None nếu vượt biên"""
+    if orientation == "V":
+        if not (0 <= x and x + length <= SIZE and 0 <= y < SIZE):
+            return None
+        step = SIZE
+    else:
+        if not (0 <= x < SIZE and 0 <= y and y + length <= SIZE):
+            return None
+        step = 1
+    mask = 0
+    start = cell_index(x, y)
+    for i in range(length):
+        mask |= 1 << (start + i * step)
+    return mask
+
+
+class Board:
+    """
+    Bảng 10x10 dạng bitboard.
+    masks[state] là mask các ô đang ở trạng thái state (masks[0] không dùng).
+    """
+
+    __slots__ = ("masks",)
+
+    def __init__(self, masks=None):
+        self.masks = list(masks) if masks is not None else [0, 0, 0, 0, 0]
+
+    # --------------------------- Đọc / ghi ô ---------------------------
+
+    def get(self, x, y):
+        b = cell_bit(x, y)
+        for state in STATES:
+            if self.masks[state] & b:
+                return state
+        return EMPTY
+
+    def set(self, x, y, value):
+        b = cell_bit(x, y)
+        clear = ~b
+        masks = self.masks
+        for state in STATES:
+            masks[state] &= clear
+        if value != EMPTY:
+            masks[value] |= b
+
+    def set_mask(self, mask, value):
+        """Đặt toàn bộ các ô trong mask về trạng thái value"""
+        clear = ~mask
+        masks = self.masks
+        for state in STATES:
+            masks[state] &= clear
+        if value != EMPTY:
+            masks[value] |= mask
+
+    # --------------------------- Truy vấn nhanh ---------------------------
+
+    @property
+    def shot_mask(self):
+        """Các ô đã bị bắn (trúng, trượt hoặc chìm)"""
+        return self.masks[HIT] | self.masks[MISS] | self.masks[SUNK]
+
+    @property
+    def ship_cells_mask(self):
+        """Các ô có tàu (còn nguyên, trúng hoặc chìm)"""
+        return self.masks[SHIP] | self.masks[HIT] | self.masks[SUNK]
+
+    @property
+    def filled_mask(self):
+        """Các ô không trống"""
+        return self.shot_mask | self.masks[SHIP]
+
+    def is_shot(self, x, y):
+        return bool(self.shot_mask & cell_bit(x, y))
+
+    def all_ships_sunk(self):
+        """Không còn ô tàu nào chưa bị bắn"""
+        return self.masks[SHIP] == 0
+
+    def can_place_mask(self, mask):
+        return mask is not None and not (mask & self.filled_mask)
+
+    def touches_ship(self, mask):
+        """True nếu có ô tàu kề với mask"""
+        return bool(neighbor_mask(mask) & self.masks[SHIP])
+
+    def count(self, state):
+        return self.masks[state].bit_count()
+
+    def changed_cells(self, old_masks):
+        """Các ô khác với old_masks, dạng [[x, y, giá trị mới], ...] (delta gửi cho client)"""
+        changed = 0
+        for state in STATES:
+            changed |= old_masks[state] ^ self.masks[state]
+        cells = []
+        for i in iter_cells(changed):
+            x, y = cell_coords(i)
+            cells.append([x, y, self.get(x, y)])
+        return cells
+
+    # --------------------------- Chuyển đổi ---------------------------
+
+    def copy(self):
+        return Board(self.masks)
+
+    def to_bytes(self):
+        return b"".join(m.to_bytes(_MASK_BYTES, "little") for m in self.masks[1:])
+
+    @classmethod
+    def from_bytes(cls, data):
+        masks = [0]
+        for i in range(len(STATES)):
+            chunk = data[i * _MASK_BYTES:(i + 1) * _MASK_BYTES]
+            masks.append(int.from_bytes(chunk, "little"))
+        return cls(masks)
+
+    def to_list(self):
+        """Ma trận list-of-lists như bản JSON cũ (dùng cho template/client)"""
+        grid = [[EMPTY] * SIZE for _ in range(SIZE)]
+        for state in STATES:
+            for i in iter_cells(self.masks[state]):
+                x, y = cell_coords(i)
+                grid[x][y] = state
+        return grid
+
+    @classmethod
+    def from_list(cls, grid):
+        board = cls()
+        for x, row in enumerate(grid):
+            for y, value in enumerate(row):
+                if value != EMPTY:
+                    board.masks[value] |= cell_bit(x, y)
+        return board
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.masks == other.masks
+
+    def __repr__(self):
+        return "<Board " + " ".join(f"{s}:{self.count(s)}" for s in STATES) + ">"
+
+
+# --------------------------- ship_data ---------------------------
+
+def pack_ship_data(ship_data):
+    """
+    {name: {"positions": [[x, y], ...], "sunked": bool}} -> bytes
+    Mỗi tàu: [mã tên, cờ chìm, số ô, chỉ số từng ô...]
+    """
+    out = bytearray()
+    for name, info in ship_data.items():
+        positions = info.get("positions", [])
+        out.append(SHIP_NAMES.index(name))
+        out.append(1 if info.get("sunked") else 0)
+        out.append(len(positions))
+        out.extend(cell_index(x, y) for x, y in positions)
+    return bytes(out)
+
+
+def unpack_ship_data(data):
+    """bytes -> {name: {"positions": [[x, y], ...], "sunked": bool}}"""
+    ships = {}
+    if not data:
+        return ships
+    i = 0
+    while i < len(data):
+        name = SHIP_NAMES[data[i]]
+        sunked = bool(data[i + 1])
+        n = data[i + 2]
+        cells = data[i + 3:i + 3 + n]
+        ships[name] = {
+            "positions": [list(cell_coords(c)) for c in cells],
+            "sunked": sunked,
+        }
+        i += 3 + n
+    return ships
+
+
+# --------------------------- Bảng tra tàu ---------------------------
+
+class ShipIndex:
+    """
+    Bảng tra 1 bên trong trận, dựng 1 lần từ ship_data và bảng:
+        cell_ship[i]: tên tàu nằm ở ô i (None nếu không có)
+        remaining[name]: số ô của tàu chưa bị bắn
+        fleet_remaining: số tàu chưa chìm
+    Nhờ đó kiểm tra trúng/chìm/thắng là O(1).
+    """
+
+    __slots__ = ("cell_ship", "ship_cells", "ship_masks", "remaining", "fleet_remaining")
+
+    def __init__(self, ship_data, board):
+        self.cell_ship = [None] * CELLS
+        self.ship_cells = {}
+        self.ship_masks = {}
+        self.remaining = {}
+        self.fleet_remaining = 0
+
+        for name, info in ship_data.items():
+            positions = info.get("positions", [])
+            mask = 0
+            for x, y in positions:
+                i = cell_index(x, y)
+                self.cell_ship[i] = name
+                mask |= 1 << i
+            self.ship_cells[name] = positions
+            self.ship_masks[name] = mask
+            self.remaining[name] = (mask & board.masks[SHIP]).bit_count()
+            if self.remaining[name] > 0:
+                self.fleet_remaining += 1
+
+    def ship_at(self, x, y):
+        return self.cell_ship[cell_index(x, y)]
+
+    def hit(self, name):
+        """Ghi nhận 1 ô của tàu bị trúng, trả về True nếu tàu vừa chìm"""
+        self.remaining[name] -= 1
+        if self.remaining[name] == 0:
+            self.fleet_remaining -= 1
+            return True
+        return False
+
+    def unhit(self, name):
+        """Ngược lại với hit() (dùng khi undo)"""
+        if self.remaining[name] == 0:
+            self.fleet_remaining += 1
+        self.remaining[name] += 1
+
+    def all_sunk(self):
+        return self.fleet_remaining == 0
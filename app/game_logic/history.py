@@ -0,0 +1,138 @@
+# history.py
+"""
+Trạng thái trận được dựng lại (fold) từ hạm đội ban đầu + lịch sử GameMove.
+
+Nguồn dữ liệu gốc:
+    - ShipPlacement: hạm đội ban đầu của mỗi bên (chỉ ghi khi đặt tàu)
+    - GameMove: các nước đi, chỉ thêm vào (undo/redo chỉ đổi cờ is_reverted,
+      các nước undo bị bỏ khi có nước mới)
+Bảng sau k nước = hạm đội ban đầu + áp dụng lần lượt k nước. Cờ chìm của từng tàu
+và người thắng đều suy ra từ bảng nên không thể lệch với lịch sử.
+
+Để không phải phát lại từ đầu, sau mỗi MOVE_SNAPSHOT_INTERVAL nước các bảng được
+chụp lại (LiveGame.snapshots, ghi xuống bảng GameSnapshot). Nạp trận hoặc nhảy tới
+nước n chỉ cần lấy snapshot gần nhất <= n rồi phát lại phần còn lại.
+"""
+from app import app
+from app.game_logic.board import Board, HIT, MISS, SUNK, cell_bit
+
+
+def positions_mask(positions):
+    """Danh sách toạ độ -> mask"""
+    mask = 0
+    for x, y in positions:
+        mask |= cell_bit(x, y)
+    return mask
+
+
+def initial_board(board):
+    """Bảng trước phát bắn đầu tiên: mọi ô tàu về SHIP, bỏ các ô trượt"""
+    return Board([0, board.ship_cells_mask, 0, 0, 0])
+
+
+def apply_move(board, move, ship_data):
+    """Áp dụng kết quả 1 nước đi lên bảng của bên bị bắn"""
+    if move.result == "miss":
+        board.set(move.x, move.y, MISS)
+    elif move.result == "hit":
+        board.set(move.x, move.y, HIT)
+    elif move.result == "sunk":
+        ship = ship_data.get(move.sunk_ship_name)
+        if ship:
+            board.set_mask(positions_mask(ship["positions"]), SUNK)
+        else:
+            board.set(move.x, move.y, SUNK)
+
+
+def fold(fleets, ship_data, moves, snapshots=None):
+    """
+    Các bảng sau khi áp dụng lần lượt moves lên hạm đội ban đầu.
+        fleets: {owner: Board} hạm đội ban đầu (ô trúng/trượt nếu có sẽ bị bỏ qua)
+        ship_data: {owner: {ship_name: {"positions", ...}}}
+        snapshots: {k: {owner: masks}}, bắt đầu từ snapshot lớn nhất <= len(moves)
+    Không đọc/ghi DB, dùng cho nạp trận, nhảy nước, xem lại trận và kiểm tra.
+    """
+    n = len(moves)
+    start = max((k for k in (snapshots or {}) if k <= n), default=0)
+    if start:
+        boards = {owner: Board(masks) for owner, masks in snapshots[start].items()}
+    else:
+        boards = {owner: initial_board(board) for owner, board in fleets.items()}
+
+    for move in moves[start:]:
+        board = boards.get(move.target_name)
+        if board is not None:
+            apply_move(board, move, ship_data.get(move.target_name, {}))
+    return boards
+
+
+def board_at(game, owner, n):
+    """Bảng của owner sau n nước đầu tiên trong game.moves"""
+    return fold({owner: game.boards[owner]}, game.ship_data, game.moves[:n], game.snapshots)[owner]
+
+
+def winner_of(boards, moves):
+    """Người bắn nước cuối nếu nước đó làm 1 bên chìm hết tàu, ngược lại None"""
+    if not moves:
+        return None
+    last = moves[-1]
+    board = boards.get(last.target_name)
+    if board is not None and board.ship_cells_mask and board.all_ships_sunk():
+        return last.attacker_name
+    return None
+
+
+def sunk_flags(board, ship_data):
+    """Cập nhật cờ sunked của từng tàu theo bảng, trả về True nếu có cờ đổi"""
+    changed = False
+    for ship in ship_data.values():
+        mask = positions_mask(ship["positions"])
+        sunked = bool(mask) and (board.masks[SUNK] & mask) == mask
+        if ship.get("sunked") != sunked:
+            ship["sunked"] = sunked
+            changed = True
+    return changed
+
+
+# --------------------------- Snapshot ---------------------------
+
+def take_snapshot(game):
+    """Chụp bảng sau mỗi MOVE_SNAPSHOT_INTERVAL nước (gọi sau khi thêm 1 nước mới)"""
+    interval = app.config.get("MOVE_SNAPSHOT_INTERVAL", 10)
+    n = len(game.moves)
+    if interval and n % interval == 0:
+        game.snapshots[n] = {owner: tuple(board.masks) for owner, board in game.boards.items()}
+
+
+def drop_snapshots_after(game, n):
+    """Các nước sau n bị bỏ (bắn mới sau khi undo, đặt lại tàu): snapshot sau n không còn đúng"""
+    for k in [k for k in game.snapshots if k > n]:
+        del game.snapshots[k]
+    # Snapshot đã ghi xuống DB sẽ bị xoá ở lần ghi sau
+    if any(k > n for k in game.saved_snapshots):
+        game.snapshot_cutoff = n if game.snapshot_cutoff is None else min(game.snapshot_cutoff, n)
+
+
+def pack_snapshot(boards):
+    """{owner: masks} -> bytes, mỗi bên: [độ dài tên, tên utf-8, 52 byte bitboard]"""
+    out = bytearray()
+    for owner, masks in boards.items():
+        name = owner.encode("utf-8")
+        out.append(len(name))
+        out.extend(name)
+        out.extend(Board(masks).to_bytes())
+    return bytes(out)
+
+
+def unpack_snapshot(data):
+    """bytes -> {owner: masks}"""
+    boards = {}
+    size = len(Board().to_bytes())
+    i = 0
+    while i < len(data):
+        n = data[i]
+        owner = data[i + 1:i + 1 + n].decode("utf-8")
+        i += 1 + n
+        boards[owner] = tuple(Board.from_bytes(data[i:i + size]).masks)
+        i += size
+    return boards
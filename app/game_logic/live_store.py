@@ -0,0 +1,608 @@
+# live_store.py
+"""
+Kho trạng thái các trận đang diễn ra, giữ trong RAM của tiến trình.
+
+GameLogic đọc và sửa trực tiếp LiveGame (bảng, vị trí tàu, lượt, số phát bắn,
+lịch sử nước đi) nên mỗi phát bắn không cần truy vấn DB. Các thay đổi được
+ghi xuống DB theo lô bởi 1 background task (write-behind) và ghi ngay khi trận
+kết thúc. Trận bị bỏ dở sẽ bị đẩy khỏi kho theo LRU/TTL (có ghi xuống trước).
+Khi không có trong kho, trạng thái được dựng lại từ DB.
+
+Bảng trong DB không bị ghi đè sau mỗi phát bắn: ShipPlacement chỉ giữ hạm đội ban đầu,
+GameMove là lịch sử chỉ thêm vào, khi nạp trận các bảng được dựng lại từ snapshot gần
+nhất + các nước sau đó (xem history.py).
+
+Mỗi sự kiện (phát bắn, undo, ...) là 1 đơn vị công việc: khi tắt write-behind
+(LIVE_STORE_WRITE_BEHIND = False), persist() ghi trận trong đúng 1 transaction,
+1 commit. Với 1 phát bắn số câu lệnh SQL không vượt quá SHOT_STATEMENT_BUDGET:
+    UPDATE game                      (lượt, số phát bắn, trạng thái, version)
+    INSERT game_move                 (nước đi mới)
+    INSERT game_snapshot             (sau mỗi MOVE_SNAPSHOT_INTERVAL nước)
+    DELETE game_move, game_snapshot  (chỉ khi có nước đã undo chờ redo)
+    UPDATE player x2                 (chỉ khi trận kết thúc)
+Lần ghi cuối của trận còn chạy thêm các cập nhật số liệu tổng hợp trong
+rollups.py (tối đa rollups.FINISH_STATEMENT_BUDGET câu lệnh).
+Trên SQLite mỗi commit là 1 lần fsync nên đây là giới hạn chính về thông lượng.
+
+Lưu ý: kho nằm trong 1 tiến trình nên chỉ đúng khi chạy 1 worker
+(socketio.run với eventlet như hiện tại).
+
+Khoá lạc quan (optimistic concurrency) bằng cột Game.version:
+    - Trong RAM: sự kiện gửi kèm version client đang có, GameLogic từ chối
+      (StaleVersion) nếu trận đã đổi sau version đó, VD 2 phát bắn gửi dồn.
+    - Trong DB: UPDATE game chỉ ghi khi version trong DB vẫn là version lúc nạp
+      (WHERE version = saved_version). Dòng đã bị nơi khác ghi thì bản trong RAM
+      bị bỏ, lần truy cập sau nạp lại từ DB. Các handler sửa Game ngoài kho
+      (vào phòng, sẵn sàng) dùng compare_and_set().
+"""
+import logging
+import time
+from collections import OrderedDict, deque
+from types import SimpleNamespace
+
+import sqlalchemy as sa
+from app import app, db, socketio
+from app.models import Game, ShipPlacement, GameMove, GameSnapshot
+from app.game_logic.board import Board, pack_ship_data, unpack_ship_data
+from app.sql_stats import count_statements
+from app.game_logic import rollups, history
+
+log = logging.getLogger(__name__)
+
+
+# Các cột của Game do kho quản lý khi trận đã được nạp
+GAME_FIELDS = ("status", "current_turn", "winner", "player_shots", "opponent_shots", "version")
+
+# Số câu lệnh SQL tối đa khi ghi 1 phát bắn (xem docstring đầu file)
+SHOT_STATEMENT_BUDGET = 7
+
+
+class StaleVersion(Exception):
+    """Trận đã đổi sau version mà thao tác dựa vào"""
+
+    def __init__(self, game_id, expected, actual=None):
+        if actual is None:
+            message = f"Game {game_id}: dòng trong DB đã bị ghi sau version {expected}"
+        else:
+            message = f"Game {game_id}: version {expected} đã cũ (hiện tại {actual})"
+        super().__init__(message)
+        self.game_id = game_id
+        self.expected = expected
+        self.actual = actual
+
+
+# Số lần update_game đọc lại và thử lại khi dòng game bị ghi chen
+CAS_RETRIES = 3
+
+
+def compare_and_set(game_id, expected_version, **values):
+    """
+    UPDATE game SET values, version = version + 1 WHERE id = game_id AND version = expected_version
+    (chưa commit). Trả về False nếu dòng đã bị ghi sau khi đọc expected_version.
+    Gọi sau live_store.evict() để bản trong RAM không ghi đè lên.
+    """
+    result = db.session.execute(
+        sa.update(Game)
+        .where(Game.id == game_id, Game.version == expected_version)
+        .values(version=Game.version + 1, **values)
+    )
+    return result.rowcount == 1
+
+
+def update_game(game, check=None, retries=CAS_RETRIES, **values):
+    """
+    Đổi các cột của model Game bằng compare_and_set (chưa commit): ghi nốt bản trong RAM,
+    đọc lại dòng rồi thử lại khi bị ghi chen. check(game) kiểm tra lại điều kiện sau mỗi
+    lần đọc, sai thì không ghi và trả về False. Hết retries lần thì raise StaleVersion.
+    """
+    live_store.evict(game.id)
+    for _ in range(retries):
+        db.session.refresh(game)
+        if check is not None and not check(game):
+            return False
+        if compare_and_set(game.id, game.version, **values):
+            return True
+        db.session.rollback()
+    raise StaleVersion(game.id, game.version)
+
+
+class LiveMove:
+    """Bản sao trong RAM của 1 dòng GameMove"""
+
+    __slots__ = ("id", "attacker_name", "target_name", "x", "y", "result",
+                 "game_turn", "prev_cell", "sunk_ship_name", "is_reverted", "dirty")
+
+    def __init__(self, attacker_name, target_name, x, y, result, game_turn,
+                 prev_cell, sunk_ship_name=None, is_reverted=False, id=None):
+        self.id = id
+        self.attacker_name = attacker_name
+        self.target_name = target_name
+        self.x = x
+        self.y = y
+        self.result = result
+        self.game_turn = game_turn
+        self.prev_cell = prev_cell
+        self.sunk_ship_name = sunk_ship_name
+        self.is_reverted = is_reverted
+        self.dirty = False
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.attacker_name, row.target_name, row.x, row.y, row.result,
+                   row.game_turn, row.prev_cell, row.sunk_ship_name,
+                   row.is_reverted, id=row.id)
+
+    def to_values(self, game_id):
+        return {
+            "game_id": game_id,
+            "attacker_name": self.attacker_name,
+            "target_name": self.target_name,
+            "x": self.x,
+            "y": self.y,
+            "result": self.result,
+            "game_turn": self.game_turn,
+            "prev_cell": self.prev_cell,
+            "sunk_ship_name": self.sunk_ship_name,
+            "is_reverted": self.is_reverted,
+        }
+
+
+class LiveGame:
+    """
+    Trạng thái 1 trận trong RAM.
+    Có cùng các thuộc tính mà GameLogic/AI dùng trên model Game
+    (id, player, opponent, ai, current_turn, ...) nên dùng thay được cho Game.
+    """
+
+    def __init__(self, game):
+        self.id = game.id
+        self.player_id = game.player_id
+        self.opponent_id = game.opponent_id
+        self.ai_id = game.ai_id
+        self.player = SimpleNamespace(id=game.player.id, playername=game.player.playername)
+        self.opponent = (SimpleNamespace(id=game.opponent.id, playername=game.opponent.playername)
+                         if game.opponent else None)
+        self.ai = SimpleNamespace(id=game.ai.id, name=game.ai.name) if game.ai else None
+
+        for field in GAME_FIELDS:
+            setattr(self, field, getattr(game, field))
+        self.saved_version = game.version     # version của dòng game trong DB
+
+        self.boards = {}          # owner -> Board
+        self.ship_data = {}       # owner -> {ship_name: {"positions", "sunked"}}
+        self.placement_ids = {}   # owner -> ShipPlacement.id (đã có trong DB)
+        self.ship_index = {}      # owner -> ShipIndex, dựng lại khi ship_data đổi
+        self.moves = []           # LiveMove theo thứ tự id
+        self.deleted_moves = []   # LiveMove đã bỏ, chờ xoá trong DB
+        self.snapshots = {}       # số nước -> {owner: masks} (xem history.py)
+        self.saved_snapshots = set()   # các snapshot đã có trong DB
+        self.snapshot_cutoff = None    # xoá snapshot trong DB có move_count lớn hơn giá trị này
+        # Các delta gần nhất (version, owner, cells) để client kết nối lại bắt kịp,
+        # không ghi xuống DB: nạp lại từ DB thì client cũ sẽ nhận snapshot
+        self.deltas = deque(maxlen=app.config.get("SYNC_DELTA_LOG_SIZE", 256))
+
+        # Đánh dấu thay đổi chờ ghi xuống DB
+        self.game_dirty = False
+        self.dirty_owners = set()
+        self.result_recorded = game.status == "finished"
+        self.last_access = time.monotonic()
+
+    @property
+    def is_dirty(self):
+        return (self.game_dirty or bool(self.dirty_owners) or bool(self.deleted_moves)
+                or any(m.id is None or m.dirty for m in self.moves))
+
+    def mark_all_dirty(self):
+        self.game_dirty = True
+        self.dirty_owners.update(self.boards)
+        # Không biết snapshot nào đã vào DB: xoá hết rồi ghi lại
+        self.snapshot_cutoff = 0
+        self.saved_snapshots.clear()
+
+    # --------------------------- Version / delta ---------------------------
+
+    def check_version(self, expected):
+        """Bỏ qua nếu expected là None (không gửi kèm), lệch version thì raise StaleVersion"""
+        if expected is not None and int(expected) != self.version:
+            raise StaleVersion(self.id, int(expected), self.version)
+
+    def record_delta(self, owner, cells):
+        """Tăng version và ghi lại các ô vừa đổi của bảng owner ([[x, y, giá trị], ...])"""
+        self.version += 1
+        self.deltas.append((self.version, owner, cells))
+        return {"version": self.version, "owner": owner, "cells": cells}
+
+    def reset_deltas(self):
+        """Bảng bị dựng lại từ đầu: tăng version, client cũ hơn phải lấy snapshot"""
+        self.version += 1
+        self.deltas.clear()
+
+    def deltas_since(self, version):
+        """
+        Các delta sau version theo thứ tự, [] nếu client đã mới nhất.
+        None nếu log không còn đủ (client phải lấy snapshot).
+        """
+        if version == self.version:
+            return []
+        if version > self.version or not self.deltas or self.deltas[0][0] > version + 1:
+            return None
+        return [{"version": v, "owner": owner, "cells": cells}
+                for v, owner, cells in self.deltas if v > version]
+
+    def __repr__(self):
+        return f"<LiveGame {self.id} status={self.status} turn={self.current_turn}>"
+
+
+class LiveGameStore:
+    """
+    Kho LiveGame theo game_id, sắp theo LRU.
+
+    Cấu hình (app.config):
+        LIVE_STORE_WRITE_BEHIND: True thì ghi theo lô, False thì ghi sau mỗi sự kiện
+        LIVE_STORE_FLUSH_INTERVAL: chu kỳ ghi xuống DB (giây)
+        LIVE_STORE_MAX_GAMES: số trận tối đa giữ trong RAM
+        LIVE_STORE_TTL: trận không được truy cập quá lâu sẽ bị đẩy ra (giây)
+    """
+
+    def __init__(self):
+        self._games = OrderedDict()
+        self._flusher_started = False
+
+    # --------------------------- Truy cập ---------------------------
+
+    def get(self, game):
+        """
+        Lấy LiveGame từ game_id, model Game hoặc chính LiveGame.
+        Trả về None nếu trận không tồn tại.
+        """
+        if isinstance(game, LiveGame):
+            game_id = game.id
+        elif isinstance(game, Game):
+            game_id = game.id
+        else:
+            game_id = int(game)
+
+        live = self._games.get(game_id)
+        if live is None:
+            live = self._load(game if isinstance(game, Game) else game_id)
+            if live is None:
+                return None
+            self._games[game_id] = live
+            self._evict_overflow()
+            self._start_flusher()
+        else:
+            self._games.move_to_end(game_id)
+        live.last_access = time.monotonic()
+        return live
+
+    def peek(self, game_id):
+        """Lấy LiveGame nếu đang có trong kho, không nạp từ DB"""
+        return self._games.get(int(game_id))
+
+    def __len__(self):
+        return len(self._games)
+
+    def __iter__(self):
+        """Các LiveGame đang có trong kho (VD để đếm cho /metrics)"""
+        return iter(list(self._games.values()))
+
+    def mark_dirty(self, live, owner=None):
+        """Đánh dấu trận (hoặc bảng của owner) cần ghi xuống DB"""
+        if owner is None:
+            live.game_dirty = True
+        else:
+            live.dirty_owners.add(owner)
+
+    def persist(self, live):
+        """
+        Kết thúc 1 đơn vị công việc (1 sự kiện socket).
+        Ghi theo lô thì để background task lo, ngược lại ghi ngay trong 1 commit.
+        """
+        if app.config.get("LIVE_STORE_WRITE_BEHIND", True):
+            return
+        self.flush(live)
+
+    def finish(self, live):
+        """Trận kết thúc: ghi ngay xuống DB rồi bỏ khỏi kho"""
+        live.game_dirty = True
+        self.flush(live)
+        self._games.pop(live.id, None)
+
+    def clear(self):
+        """Bỏ mọi trận khỏi kho mà không ghi xuống DB (VD: giữa các test)"""
+        self._games.clear()
+
+    def evict(self, game_id):
+        """Ghi các thay đổi còn treo rồi bỏ trận khỏi kho (VD: huỷ trận, đối thủ rời)"""
+        live = self._games.pop(int(game_id), None)
+        if live is None:
+            return
+        try:
+            self.flush(live)
+        except StaleVersion:
+            pass    # dòng trong DB mới hơn, bỏ bản trong RAM
+        except Exception:
+            self._games[live.id] = live
+            raise
+
+    # --------------------------- Nạp từ DB ---------------------------
+
+    def read(self, game):
+        """Dựng trạng thái trận từ DB mà không đưa vào kho (VD: xem lại trận đã kết thúc)"""
+        return self._load(game)
+
+    def _load(self, game):
+        """Hạm đội ban đầu + snapshot gần nhất + các nước sau đó -> LiveGame"""
+        if not isinstance(game, Game):
+            game = db.session.get(Game, game)
+            if game is None:
+                return None
+
+        live = LiveGame(game)
+        fleets = {}
+        placements = db.session.scalars(
+            sa.select(ShipPlacement).where(ShipPlacement.game_id == game.id)
+        ).all()
+        for p in placements:
+            live.placement_ids[p.owner] = p.id
+            fleets[p.owner] = Board.from_bytes(p.grid_data)
+            live.ship_data[p.owner] = unpack_ship_data(p.ship_data)
+
+        moves = db.session.scalars(
+            sa.select(GameMove)
+            .where(GameMove.game_id == game.id)
+            .order_by(GameMove.id.asc())
+        ).all()
+        live.moves = [LiveMove.from_row(m) for m in moves]
+
+        snapshots = db.session.execute(
+            sa.select(GameSnapshot.move_count, GameSnapshot.data)
+            .where(GameSnapshot.game_id == game.id, GameSnapshot.move_count <= len(live.moves))
+        ).all()
+        live.snapshots = {k: history.unpack_snapshot(data) for k, data in snapshots}
+        live.saved_snapshots = set(live.snapshots)
+
+        # Các nước đã undo luôn nằm ở cuối danh sách
+        applied = live.moves[:sum(1 for m in live.moves if not m.is_reverted)]
+        live.boards = history.fold(fleets, live.ship_data, applied, live.snapshots)
+        for owner, board in live.boards.items():
+            history.sunk_flags(board, live.ship_data.setdefault(owner, {}))
+        return live
+
+    # --------------------------- Ghi xuống DB ---------------------------
+
+    def flush(self, live):
+        """Ghi 1 trận xuống DB trong 1 transaction"""
+        if not live.is_dirty and not self._needs_result(live):
+            return
+        shots = sum(1 for m in live.moves if m.id is None)
+        finishing = self._needs_result(live)
+        restore = self._save_point(live)
+        try:
+            with count_statements() as counter:
+                self._write(live)
+                db.session.commit()
+        except StaleVersion:
+            db.session.rollback()
+            self._discard(live)
+            raise
+        except Exception:
+            db.session.rollback()
+            restore()
+            raise
+        if finishing:
+            rollups.finished_committed()
+        if shots == 1:
+            budget = SHOT_STATEMENT_BUDGET
+            if finishing:
+                budget += rollups.FINISH_STATEMENT_BUDGET
+            self._check_budget(live, counter, budget)
+
+    def flush_all(self):
+        """Ghi tất cả các trận có thay đổi trong cùng 1 transaction"""
+        pending = [live for live in self._games.values()
+                   if live.is_dirty or self._needs_result(live)]
+        if not pending:
+            return 0
+        finishing = any(self._needs_result(live) for live in pending)
+        restores = [self._save_point(live) for live in pending]
+        try:
+            for live in pending:
+                try:
+                    self._write(live)
+                except StaleVersion as e:
+                    # UPDATE game là câu lệnh đầu tiên của trận nên chưa có gì khác bị ghi
+                    log.warning("%s, nạp lại từ DB", e, extra={"game_id": live.id})
+                    self._discard(live)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for restore in restores:
+                restore()
+            raise
+        if finishing:
+            rollups.finished_committed()
+        return len(pending)
+
+    def _save_point(self, live):
+        """
+        Chụp các trạng thái mà _write sửa trước khi commit (id của nước đi/hạm đội vừa
+        insert, cờ dirty, nước chờ xoá, cờ đã cộng kết quả). Commit lỗi thì gọi hàm trả về
+        để khôi phục và đánh dấu ghi lại toàn bộ ở lần sau.
+        """
+        moves = [(m, m.id, m.dirty) for m in live.moves]
+        placement_ids = dict(live.placement_ids)
+        deleted_moves = list(live.deleted_moves)
+        result_recorded = live.result_recorded
+        saved_version = live.saved_version
+
+        def restore():
+            for m, move_id, dirty in moves:
+                m.id, m.dirty = move_id, dirty
+            live.placement_ids = placement_ids
+            live.deleted_moves = deleted_moves + live.deleted_moves
+            live.result_recorded = result_recorded
+            live.saved_version = saved_version
+            live.mark_all_dirty()
+        return restore
+
+    def _check_budget(self, live, counter, budget=SHOT_STATEMENT_BUDGET):
+        """
+        1 phát bắn phải được ghi trong 1 commit và không quá budget câu lệnh.
+        Chỉ ghi log (đã commit rồi, không làm hỏng thao tác của người chơi),
+        giới hạn được kiểm tra bởi tests/test_statement_budget.py.
+        """
+        if counter.statements <= budget and counter.commits == 1:
+            return
+        log.warning("Ghi 1 phát bắn tốn %d câu lệnh, %d commit (giới hạn %d câu lệnh, 1 commit)",
+                    counter.statements, counter.commits, budget, extra={"game_id": live.id})
+
+    def _needs_result(self, live):
+        return live.status == "finished" and not live.result_recorded
+
+    def _write(self, live):
+        """Sinh các câu lệnh ghi cho 1 trận (chưa commit)"""
+        # Chụp lại dữ liệu và xoá cờ trước khi làm IO,
+        # thay đổi xảy ra trong lúc ghi sẽ được ghi ở lần sau
+        game_values = None
+        if live.game_dirty:
+            live.game_dirty = False
+            game_values = {field: getattr(live, field) for field in GAME_FIELDS}
+
+        # ShipPlacement chỉ giữ hạm đội ban đầu (chỉ đổi khi đặt tàu)
+        board_values = {}
+        for owner in list(live.dirty_owners):
+            live.dirty_owners.discard(owner)
+            board_values[owner] = (history.initial_board(live.boards[owner]).to_bytes(),
+                                   pack_ship_data(live.ship_data.get(owner, {})))
+
+        cutoff, live.snapshot_cutoff = live.snapshot_cutoff, None
+        if cutoff is not None:
+            live.saved_snapshots = {k for k in live.saved_snapshots if k <= cutoff}
+        new_snapshots = {k: history.pack_snapshot(boards) for k, boards in live.snapshots.items()
+                         if k not in live.saved_snapshots}
+        live.saved_snapshots.update(new_snapshots)
+
+        new_moves = [m for m in live.moves if m.id is None]
+        # Nước đổi cờ undo gom theo giá trị mới: nhảy nhiều nước vẫn chỉ tốn tối đa 2 câu lệnh
+        changed_moves = {True: [], False: []}
+        for m in live.moves:
+            if m.id is not None and m.dirty:
+                m.dirty = False
+                changed_moves[m.is_reverted].append(m.id)
+
+        if game_values:
+            # Compare-and-set: dòng game đã bị nơi khác ghi thì không ghi đè
+            result = db.session.execute(
+                sa.update(Game)
+                .where(Game.id == live.id, Game.version == live.saved_version)
+                .values(**game_values)
+            )
+            if result.rowcount != 1:
+                raise StaleVersion(live.id, live.saved_version)
+            live.saved_version = game_values["version"]
+
+        for owner, (grid_data, ship_data) in board_values.items():
+            placement_id = live.placement_ids.get(owner)
+            if placement_id is None:
+                result = db.session.execute(
+                    sa.insert(ShipPlacement).values(
+                        game_id=live.id, owner=owner,
+                        grid_data=grid_data, ship_data=ship_data)
+                )
+                live.placement_ids[owner] = result.inserted_primary_key[0]
+            else:
+                db.session.execute(
+                    sa.update(ShipPlacement)
+                    .where(ShipPlacement.id == placement_id)
+                    .values(grid_data=grid_data, ship_data=ship_data)
+                )
+
+        for m in new_moves:
+            result = db.session.execute(sa.insert(GameMove).values(**m.to_values(live.id)))
+            m.id = result.inserted_primary_key[0]
+
+        for is_reverted, move_ids in changed_moves.items():
+            if move_ids:
+                db.session.execute(
+                    sa.update(GameMove).where(GameMove.id.in_(move_ids))
+                    .values(is_reverted=is_reverted)
+                )
+
+        # Xoá sau khi insert để các nước vừa được gán id cũng bị xoá
+        deleted, live.deleted_moves = live.deleted_moves, []
+        deleted_ids = [m.id for m in deleted if m.id is not None]
+        if deleted_ids:
+            db.session.execute(sa.delete(GameMove).where(GameMove.id.in_(deleted_ids)))
+
+        if cutoff is not None:
+            db.session.execute(
+                sa.delete(GameSnapshot)
+                .where(GameSnapshot.game_id == live.id, GameSnapshot.move_count > cutoff)
+            )
+        for k, data in new_snapshots.items():
+            db.session.execute(
+                sa.insert(GameSnapshot).values(game_id=live.id, move_count=k, data=data)
+            )
+
+        if self._needs_result(live):
+            self._record_result(live)
+
+    def _record_result(self, live):
+        """Cập nhật thắng/thua và các số liệu tổng hợp của trận vừa kết thúc"""
+        live.result_recorded = True
+        rollups.record_finished_game(live)
+
+    # --------------------------- Dọn kho ---------------------------
+
+    def _discard(self, live):
+        """Bỏ bản trong RAM đã cũ (không ghi), lần truy cập sau nạp lại từ DB"""
+        if self._games.get(live.id) is live:
+            del self._games[live.id]
+
+    def _evict_overflow(self):
+        max_games = app.config.get("LIVE_STORE_MAX_GAMES", 1000)
+        while len(self._games) > max_games:
+            live = next(iter(self._games.values()))
+            try:
+                self.flush(live)
+            except StaleVersion as e:
+                log.warning("%s, bỏ bản trong RAM", e, extra={"game_id": live.id})
+                continue    # flush đã bỏ trận khỏi kho
+            except Exception:
+                # Giữ trận (còn thay đổi chưa ghi) trong kho, lần ghi sau thử lại
+                log.exception("Không ghi được trận khi đẩy khỏi kho", extra={"game_id": live.id})
+                return
+            self._discard(live)
+
+    def evict_expired(self):
+        ttl = app.config.get("LIVE_STORE_TTL", 1800)
+        now = time.monotonic()
+        expired = [gid for gid, live in self._games.items() if now - live.last_access > ttl]
+        for game_id in expired:
+            self.evict(game_id)
+        return len(expired)
+
+    def _start_flusher(self):
+        if self._flusher_started:
+            return
+        interval = app.config.get("LIVE_STORE_FLUSH_INTERVAL", 2.0)
+        if not interval:
+            return
+        self._flusher_started = True
+        socketio.start_background_task(self._run_flusher, interval)
+
+    def _run_flusher(self, interval):
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    self.flush_all()
+                    self.evict_expired()
+                except Exception:
+                    log.exception("live_store flush lỗi")
+                finally:
+                    db.session.remove()
+
+
+live_store = LiveGameStore()
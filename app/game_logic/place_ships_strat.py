@@ -2,9 +2,18 @@
 import random
 from app import db
 from app.game_logic.base_logic import GameLogic   
+from app.game_logic.board import SHIP
+from app.game_logic.placements import placement_mask, placement_halo
  
 class ShipPlacementStrategy(GameLogic):
 
+    # Tên chiến lược (giá trị gửi từ game_setup.html) -> tên hàm đặt tàu
+    strat_map = {
+        "random": "strategy_random",
+        "avoid mid and corner": "strategy_avoid_mid_corner",
+        "avoid adjacent": "strategy_avoid_adjacent",
+    }
+
     def strategy_random(self, board, ship_name, length, owner):
         """Random"""
         placed = False
@@ -75,13 +84,7 @@ class ShipPlacementStrategy(GameLogic):
     def auto_place_ships_strategy(self, owner_name, strategy="random"):
         board = self.init_board(owner_name)
 
-        strat_map = {
-            "random": self.strategy_random,
-            "avoid mid and corner": self.strategy_avoid_mid_corner,
-            "avoid adjacent": self.strategy_avoid_adjacent
-        }
-
-        strat_func = strat_map.get(strategy, self.strategy_random)
+        strat_func = getattr(self, self.strat_map.get(strategy, "strategy_random"))
 
         for ship_name, length in self.ships.items():
             board = strat_func(board, ship_name, length, owner_name)
@@ -92,7 +95,6 @@ class ShipPlacementStrategy(GameLogic):
     def can_place_avoid_mid_corner(self, board, x, y, length, orientation):
         """Kiểm tra vị trí có thể đặt tàu tránh giữa và rìa"""
         invalid = {0, 4, 5, 9}
-        size = len(board)
 
 
         if orientation == "V":
@@ -113,21 +115,6 @@ class ShipPlacementStrategy(GameLogic):
 
     def can_place_avoid_adjacent(self, board, x, y, length, orientation):
         """Check có thể đặt tàu mà không sát tàu khác"""
-        for i in range(length):
-            nx = x + (i if orientation == "V" else 0)
-            ny = y + (i if orientation == "H" else 0)
-            
-            if not self.in_bounds(nx, ny):
-                return False
-            
-            if board[nx][ny] != 0:
-                return False
-            
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                adjx, adjy = nx + dx, ny + dy
-                if not (0 <= adjx < len(board) and 0 <= adjy < len(board[0])):
-                    continue
-                if board[adjx][adjy] == 1:
-                    return False
-                
-        return True
\ No newline at end of file
+        if not board.can_place_mask(placement_mask(x, y, length, orientation)):
+            return False
+        return not (placement_halo(x, y, length, orientation) & board.masks[SHIP])
\ No newline at end of file
@@ -0,0 +1,124 @@
+# placements.py
+"""
+Bảng tra vị trí đặt tàu, tính 1 lần cho cả tiến trình.
+
+    PLACEMENT_KEYS[k]      : (x, y, độ dài, hướng) của vị trí thứ k
+    PLACEMENTS             : ma trận bool (số vị trí x 100), hàng k là các ô của vị trí k
+    PLACEMENT_WEIGHTS      : PLACEMENTS dạng float32 để nhân ma trận
+    PLACEMENT_LENGTHS      : độ dài tàu của từng hàng
+    placement_mask(...)    : mask của vị trí (None nếu vượt biên), thay cho ship_mask()
+    placement_halo(...)    : mask các ô kề với vị trí (không gồm chính nó)
+    BASE_DENSITY[length]   : số vị trí đi qua từng ô trên bảng trống (mảng 10x10)
+    fleet_density(ships)   : tổng BASE_DENSITY của cả hạm đội
+
+Nếu đặt PLACEMENT_CACHE trong config (VD placements.npy), PLACEMENTS và PLACEMENT_WEIGHTS
+được lưu ra 2 file .npy cạnh đó ở lần chạy đầu (placements.bool.<khoá>.npy,
+placements.f32.<khoá>.npy) và những lần sau được mở bằng memory-map, các tiến trình dùng
+chung trang nhớ thay vì mỗi tiến trình giữ 1 bản. Khoá tính từ danh sách vị trí và
+CACHE_FORMAT nên file cũ (khác hạm đội, khác cách dựng) tự bị bỏ qua.
+"""
+import hashlib
+import logging
+import os
+import numpy
+from app import app
+from app.game_logic.board import SIZE, CELLS, FLEET, mask_to_array, neighbor_mask, ship_mask
+
+log = logging.getLogger(__name__)
+
+ORIENTATIONS = ("H", "V")
+# Tăng khi đổi cách dựng ma trận để bỏ các file cache cũ
+CACHE_FORMAT = 1
+LENGTHS = tuple(sorted(set(FLEET.values())))
+
+
+def _enumerate():
+    """Liệt kê mọi vị trí hợp lệ trên bảng trống theo thứ tự cố định"""
+    keys, masks = [], []
+    for length in LENGTHS:
+        for orientation in ORIENTATIONS:
+            for x in range(SIZE):
+                for y in range(SIZE):
+                    mask = ship_mask(x, y, length, orientation)
+                    if mask is not None:
+                        keys.append((x, y, length, orientation))
+                        masks.append(mask)
+    return keys, masks
+
+
+def _build_matrix(masks):
+    return numpy.array([mask_to_array(m, bool).ravel() for m in masks])
+
+
+def _cache_path(path, name, keys):
+    """placements.npy -> placements.<name>.<khoá nội dung>.npy"""
+    digest = hashlib.sha1(repr((CACHE_FORMAT, keys)).encode()).hexdigest()[:12]
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}.{digest}{ext or '.npy'}"
+
+
+def _load_matrix(build, path, shape, dtype):
+    """
+    Mở ma trận từ file cache bằng memory-map. Chưa có (hoặc hỏng) thì dựng bằng build(),
+    ghi ra file tạm rồi đổi tên (tiến trình khác không đọc phải file ghi dở) và mở lại.
+    """
+    if not path:
+        return build()
+    if os.path.exists(path):
+        try:
+            matrix = numpy.load(path, mmap_mode="r")
+            if matrix.shape == shape and matrix.dtype == dtype:
+                return matrix
+            log.warning("Cache bảng vị trí %s sai kích thước/kiểu, tính lại", path)
+        except (OSError, ValueError) as e:
+            log.warning("Không đọc được cache bảng vị trí %s: %s", path, e)
+
+    matrix = build()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            numpy.save(f, matrix)
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning("Không ghi được cache bảng vị trí %s: %s", path, e)
+        return matrix
+    return numpy.load(path, mmap_mode="r")
+
+
+PLACEMENT_KEYS, _MASKS = _enumerate()
+_MASK_BY_KEY = dict(zip(PLACEMENT_KEYS, _MASKS))
+_HALO_BY_KEY = {key: neighbor_mask(mask) for key, mask in _MASK_BY_KEY.items()}
+
+_CACHE = app.config.get("PLACEMENT_CACHE")
+_SHAPE = (len(_MASKS), CELLS)
+PLACEMENTS = _load_matrix(
+    lambda: _build_matrix(_MASKS),
+    _CACHE and _cache_path(_CACHE, "bool", PLACEMENT_KEYS), _SHAPE, numpy.dtype(bool))
+PLACEMENT_WEIGHTS = _load_matrix(
+    lambda: PLACEMENTS.astype(numpy.float32),
+    _CACHE and _cache_path(_CACHE, "f32", PLACEMENT_KEYS), _SHAPE, numpy.dtype(numpy.float32))
+PLACEMENT_LENGTHS = numpy.array([key[2] for key in PLACEMENT_KEYS])
+
+BASE_DENSITY = {
+    length: PLACEMENT_WEIGHTS[PLACEMENT_LENGTHS == length].sum(axis=0).reshape(SIZE, SIZE)
+    for length in LENGTHS
+}
+# Hạm đội mặc định, tính sẵn vì dùng ở mỗi lần khởi tạo AI
+_FLEET_DENSITY = sum(BASE_DENSITY[length] for length in FLEET.values()).astype(float)
+
+
+def placement_mask(x, y, length, orientation):
+    """Mask các ô của tàu đặt tại (x, y), None nếu vượt biên"""
+    return _MASK_BY_KEY.get((x, y, length, orientation))
+
+
+def placement_halo(x, y, length, orientation):
+    """Mask các ô kề với tàu đặt tại (x, y), None nếu vượt biên"""
+    return _HALO_BY_KEY.get((x, y, length, orientation))
+
+
+def fleet_density(ships=None):
+    """Số vị trí đặt tàu đi qua từng ô trên bảng trống, cộng cho cả hạm đội (bản sao)"""
+    if ships is None or ships == FLEET:
+        return _FLEET_DENSITY.copy()
+    return sum(BASE_DENSITY[length] for length in ships.values()).astype(float)
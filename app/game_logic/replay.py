@@ -0,0 +1,296 @@
+# replay.py
+"""
+Định dạng replay nhị phân: mỗi trận vài trăm byte, đọc/ghi tuần tự (streaming).
+
+File:
+    b"BSRP" + 1 byte phiên bản, sau đó là các bản ghi nối tiếp nhau
+Bản ghi (số nguyên little-endian):
+    u16   độ dài phần thân
+    u32   id trận trong DB gốc
+    u32   thời điểm (epoch giây)
+    u8    cờ: bit 0 = bên thứ 2 là AI
+    2 bên (chủ phòng trước), mỗi bên:
+        u8 độ dài tên, tên utf-8
+        u8 độ dài hạm đội, hạm đội (pack_ship_data)
+    u8    bên thắng (0, 1, 255 = không có)
+    u16   số nước đi, mỗi nước 2 byte:
+        byte 0: chỉ số ô (x * 10 + y)
+        byte 1: bit 0-1 kết quả (RESULTS), bit 2 bên bắn, bit 3-5 tàu chìm (SHIP_NAMES + 1, 0 = không)
+
+Chỉ ghi các nước đang được áp dụng (bỏ nước đã undo). Trạng thái trước mỗi nước
+(prev_cell) được tính lại khi đọc bằng cách phát lại lên hạm đội (xem history.py).
+"""
+import struct
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from app import db
+from app.models import Game, Player, AI, ShipPlacement, GameMove
+from app.game_logic.board import (
+    Board, SHIP_NAMES, cell_coords, cell_index, pack_ship_data, unpack_ship_data,
+)
+from app.game_logic.live_store import LiveMove
+from app.game_logic import history
+
+MAGIC = b"BSRP"
+FORMAT_VERSION = 1
+RESULTS = ("miss", "hit", "sunk", "already_hit")
+NO_WINNER = 0xFF
+
+_HEADER = struct.Struct("<IIB")
+_LENGTH = struct.Struct("<H")
+
+
+def write_header(stream):
+    stream.write(MAGIC + bytes([FORMAT_VERSION]))
+
+
+def read_header(stream):
+    header = stream.read(len(MAGIC) + 1)
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError("Không phải file replay")
+    if header[len(MAGIC)] != FORMAT_VERSION:
+        raise ValueError(f"Không hỗ trợ phiên bản replay {header[len(MAGIC)]}")
+
+
+def encode_game(game_id, timestamp, sides, winner, moves):
+    """
+    sides: [(tên, là AI, ship_data), (tên, là AI, ship_data)], chủ phòng trước
+    winner: tên người thắng (hoặc None)
+    moves: các nước đã áp dụng theo thứ tự (có attacker_name, x, y, result, sunk_ship_name)
+    """
+    names = [name for name, _, _ in sides]
+    out = bytearray(_HEADER.pack(game_id, int(timestamp), 1 if sides[1][1] else 0))
+    for name, _, ship_data in sides:
+        name = name.encode("utf-8")
+        fleet = pack_ship_data({ship: {"positions": info["positions"], "sunked": False}
+                                for ship, info in ship_data.items()})
+        out.append(len(name))
+        out.extend(name)
+        out.append(len(fleet))
+        out.extend(fleet)
+    out.append(names.index(winner) if winner in names else NO_WINNER)
+
+    encoded = bytearray()
+    count = 0
+    for move in moves:
+        if move.result not in RESULTS:
+            continue
+        ship = SHIP_NAMES.index(move.sunk_ship_name) + 1 if move.sunk_ship_name else 0
+        encoded.append(cell_index(move.x, move.y))
+        encoded.append(RESULTS.index(move.result)
+                       | (names.index(move.attacker_name) << 2)
+                       | (ship << 3))
+        count += 1
+    out.extend(_LENGTH.pack(count))
+    out.extend(encoded)
+    return bytes(out)
+
+
+def decode_game(body):
+    """bytes -> SimpleNamespace(game_id, timestamp, sides, winner, moves: [LiveMove], boards cuối trận)"""
+    game_id, timestamp, flags = _HEADER.unpack_from(body)
+    i = _HEADER.size
+    sides = []
+    for side in range(2):
+        n = body[i]
+        name = body[i + 1:i + 1 + n].decode("utf-8")
+        i += 1 + n
+        n = body[i]
+        ship_data = unpack_ship_data(body[i + 1:i + 1 + n])
+        i += 1 + n
+        sides.append((name, side == 1 and bool(flags & 1), ship_data))
+    names = [name for name, _, _ in sides]
+    winner = names[body[i]] if body[i] != NO_WINNER else None
+    (count,) = _LENGTH.unpack_from(body, i + 1)
+    i += 1 + _LENGTH.size
+
+    # Phát lại lên hạm đội để có trạng thái ô trước mỗi nước
+    boards = {name: Board([0, history.positions_mask(
+                  p for info in ship_data.values() for p in info["positions"]), 0, 0, 0])
+              for name, _, ship_data in sides}
+    moves = []
+    for k in range(count):
+        cell, bits = body[i + 2 * k], body[i + 2 * k + 1]
+        x, y = cell_coords(cell)
+        attacker = (bits >> 2) & 1
+        ship = bits >> 3
+        move = LiveMove(
+            attacker_name=names[attacker],
+            target_name=names[1 - attacker],
+            x=x, y=y,
+            result=RESULTS[bits & 3],
+            game_turn=names[attacker],
+            prev_cell=boards[names[1 - attacker]].get(x, y),
+            sunk_ship_name=SHIP_NAMES[ship - 1] if ship else None,
+        )
+        history.apply_move(boards[move.target_name], move, sides[1 - attacker][2])
+        moves.append(move)
+
+    return SimpleNamespace(game_id=game_id, timestamp=timestamp, sides=sides,
+                           winner=winner, moves=moves, boards=boards)
+
+
+def write_record(stream, body):
+    stream.write(_LENGTH.pack(len(body)))
+    stream.write(body)
+
+
+def iter_records(stream):
+    """Đọc lần lượt từng trận (đã kiểm tra header), không nạp cả file vào RAM"""
+    read_header(stream)
+    while True:
+        prefix = stream.read(_LENGTH.size)
+        if not prefix:
+            return
+        if len(prefix) < _LENGTH.size:
+            raise ValueError("File replay bị cắt cụt")
+        (length,) = _LENGTH.unpack(prefix)
+        body = stream.read(length)
+        if len(body) < length:
+            raise ValueError("File replay bị cắt cụt")
+        yield decode_game(body)
+
+
+# --------------------------- Xuất / nhập DB ---------------------------
+
+def export_games(stream, batch_size=500, since_id=0):
+    """
+    Ghi các trận đã kết thúc (id > since_id) ra stream.
+    Đọc theo lô batch_size trận bằng keyset trên Game.id, mỗi lô 3 câu truy vấn
+    nên bộ nhớ không tăng theo số trận. Trả về (số trận đã ghi, số trận bỏ qua).
+    """
+    Opponent = so.aliased(Player)
+    written = skipped = 0
+    last_id = since_id
+    write_header(stream)
+    while True:
+        games = db.session.execute(
+            sa.select(Game.id, Game.timestamp, Game.winner,
+                      Player.playername, Opponent.playername, AI.name)
+            .join(Player, Game.player_id == Player.id)
+            .outerjoin(Opponent, Game.opponent_id == Opponent.id)
+            .outerjoin(AI, Game.ai_id == AI.id)
+            .where(Game.status == "finished", Game.id > last_id)
+            .order_by(Game.id)
+            .limit(batch_size)
+        ).all()
+        if not games:
+            return written, skipped
+        ids = [g[0] for g in games]
+        last_id = ids[-1]
+
+        fleets = {}
+        for game_id, owner, ship_data in db.session.execute(
+            sa.select(ShipPlacement.game_id, ShipPlacement.owner, ShipPlacement.ship_data)
+            .where(ShipPlacement.game_id.in_(ids))
+        ):
+            fleets[(game_id, owner)] = unpack_ship_data(ship_data)
+
+        moves = {game_id: [] for game_id in ids}
+        for row in db.session.execute(
+            sa.select(GameMove.game_id, GameMove.attacker_name, GameMove.x, GameMove.y,
+                      GameMove.result, GameMove.sunk_ship_name)
+            .where(GameMove.game_id.in_(ids), GameMove.is_reverted.is_(False))
+            .order_by(GameMove.game_id, GameMove.id)
+        ):
+            moves[row.game_id].append(row)
+
+        for game_id, timestamp, winner, host, guest, ai_name in games:
+            second = ai_name or guest
+            sides = [(host, False, fleets.get((game_id, host), {})),
+                     (second, ai_name is not None, fleets.get((game_id, second), {}))]
+            try:
+                body = encode_game(game_id, _epoch(timestamp), sides, winner, moves[game_id])
+            except (ValueError, TypeError, AttributeError):
+                skipped += 1    # thiếu đối thủ hoặc nước đi của người không thuộc trận
+                continue
+            write_record(stream, body)
+            written += 1
+
+
+def import_games(stream, batch_size=500):
+    """
+    Nạp các trận trong file replay thành trận đã kết thúc (game mới, id mới).
+    Mỗi lô batch_size trận được ghi bằng vài câu INSERT nhiều dòng rồi commit.
+    Người chơi/AI chưa có sẽ được tạo. Trả về số trận đã nạp.
+    """
+    players, ais = {}, {}
+    batch = []
+    imported = 0
+    for replay in iter_records(stream):
+        batch.append(replay)
+        if len(batch) >= batch_size:
+            imported += _import_batch(batch, players, ais)
+            batch = []
+    if batch:
+        imported += _import_batch(batch, players, ais)
+    return imported
+
+
+def _import_batch(batch, players, ais):
+    for replay in batch:
+        for name, is_ai, _ in replay.sides:
+            if is_ai:
+                _resolve(AI, AI.name, name, ais)
+            else:
+                _resolve(Player, Player.playername, name, players)
+
+    game_rows = []
+    for replay in batch:
+        (host, _, _), (second, second_is_ai, _) = replay.sides
+        game_rows.append({
+            "timestamp": datetime.fromtimestamp(replay.timestamp, timezone.utc),
+            "winner": replay.winner or "",
+            "player_shots": sum(1 for m in replay.moves if m.attacker_name == host),
+            "opponent_shots": sum(1 for m in replay.moves if m.attacker_name != host),
+            "summary": f"Nhập từ replay (trận {replay.game_id})",
+            "status": "finished",
+            "current_turn": replay.winner,
+            "player_ready": True,
+            "opponent_ready": not second_is_ai,
+            "ai_ready": second_is_ai,
+            "player_id": players[host],
+            "opponent_id": None if second_is_ai else players[second],
+            "ai_id": ais[second] if second_is_ai else None,
+        })
+    game_ids = db.session.scalars(
+        sa.insert(Game).returning(Game.id, sort_by_parameter_order=True), game_rows
+    ).all()
+
+    placement_rows, move_rows = [], []
+    for game_id, replay in zip(game_ids, batch):
+        for name, _, ship_data in replay.sides:
+            placement_rows.append({
+                "game_id": game_id,
+                "owner": name,
+                "grid_data": history.initial_board(replay.boards[name]).to_bytes(),
+                "ship_data": pack_ship_data(ship_data),
+            })
+        move_rows.extend(m.to_values(game_id) for m in replay.moves)
+    db.session.execute(sa.insert(ShipPlacement), placement_rows)
+    if move_rows:
+        db.session.execute(sa.insert(GameMove), move_rows)
+    db.session.commit()
+    return len(batch)
+
+
+def _resolve(model, column, name, cache):
+    """id của dòng có column == name (tạo mới nếu chưa có), có cache"""
+    if name not in cache:
+        row_id = db.session.scalar(sa.select(model.id).where(column == name))
+        if row_id is None:
+            row_id = db.session.scalar(
+                sa.insert(model).values({column.key: name}).returning(model.id))
+        cache[name] = row_id
+    return cache[name]
+
+
+def _epoch(timestamp):
+    if timestamp is None:
+        return 0
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp())
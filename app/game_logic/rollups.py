@@ -0,0 +1,307 @@
+# rollups.py
+"""
+Số liệu tổng hợp được cập nhật khi 1 trận kết thúc.
+
+Được gọi từ LiveGameStore._record_result, chạy trong cùng transaction với lần ghi
+trận cuối cùng nên mỗi trận chỉ được cộng đúng 1 lần. Mỗi lần cập nhật là O(100)
+và không phụ thuộc số trận đã chơi, đọc ra là O(1).
+
+    Player.wins / losses / games_played
+    Player.placement_counts / placement_games : phổ đặt tàu của người chơi
+        placement_counts là BLOB 100 số uint32, ô i = số trận người chơi đặt tàu ở ô i
+    OverallHeatmap (1 dòng) : tổng phổ của các người chơi và số người chơi,
+        phổ chung = trung bình phổ của các người chơi (như cách tính cũ)
+    OverallStats (1 dòng) : số người chơi, số trận theo loại, tổng số phát bắn (trang chủ)
+    AI.wins / losses và GameStats (1 dòng mỗi AI) : số trận, số trận thắng, số phát bắn trung bình
+
+Sau khi transaction được commit, finished_committed() làm mới cache phổ chung trong RAM.
+
+Lịch sử cũ (trước khi có các cột này) được dựng lại bằng: flask rebuild-rollups
+"""
+import numpy
+import sqlalchemy as sa
+from app import db
+from app.models import Game, Player, ShipPlacement, OverallHeatmap, OverallStats, AI, GameStats
+from app.game_logic.board import CELLS, Board, mask_to_array
+
+# Số câu lệnh SQL thêm vào lần ghi cuối của trận (ngoài SHOT_STATEMENT_BUDGET)
+#   SELECT player                    (phổ hiện tại của 2 người chơi)
+#   SELECT overall_heatmap
+#   UPDATE/INSERT overall_heatmap
+#   UPDATE overall_stats             (+ INSERT ở trận đầu tiên)
+#   UPDATE ai, UPDATE game_stats     (chỉ trận với AI, + INSERT game_stats ở trận đầu tiên của AI)
+FINISH_STATEMENT_BUDGET = 8
+
+OVERALL_ID = 1
+
+_COUNTS_DTYPE = numpy.dtype("<u4")
+_SUM_DTYPE = numpy.dtype("<f8")
+
+
+def counts_from_bytes(blob):
+    """BLOB -> mảng 100 số đếm (chưa có dữ liệu thì toàn 0)"""
+    if not blob:
+        return numpy.zeros(CELLS, dtype=_COUNTS_DTYPE)
+    return numpy.frombuffer(blob, dtype=_COUNTS_DTYPE).copy()
+
+
+def counts_to_bytes(counts):
+    return counts.astype(_COUNTS_DTYPE).tobytes()
+
+
+def ship_cells(board):
+    """Các ô có tàu của bảng dưới dạng mảng 100 số 0/1"""
+    return mask_to_array(board.ship_cells_mask, _COUNTS_DTYPE).ravel()
+
+
+def _player_matrix(counts, games):
+    return counts / games if games else numpy.zeros(CELLS)
+
+
+def record_finished_game(live):
+    """Cộng kết quả và phổ đặt tàu của trận vừa kết thúc cho người chơi (AI không có trong bảng Player)"""
+    humans = [live.player] + ([live.opponent] if live.opponent else [])
+    current = {
+        row.id: (counts_from_bytes(row.placement_counts), row.placement_games or 0)
+        for row in db.session.execute(
+            sa.select(Player.id, Player.placement_counts, Player.placement_games)
+            .where(Player.id.in_([h.id for h in humans]))
+        )
+    }
+
+    # Phần thay đổi của tổng phổ chung
+    overall_delta = numpy.zeros(CELLS)
+    new_players = 0
+
+    for human in humans:
+        values = {}
+        column = Player.wins if live.winner == human.playername else Player.losses
+        values[column] = sa.func.coalesce(column, 0) + 1
+        values[Player.games_played] = sa.func.coalesce(Player.games_played, 0) + 1
+
+        board = live.boards.get(human.playername)
+        if board is not None:
+            counts, games = current.get(human.id, (counts_from_bytes(None), 0))
+            new_counts = counts + ship_cells(board)
+            values[Player.placement_counts] = counts_to_bytes(new_counts)
+            values[Player.placement_games] = games + 1
+
+            overall_delta += _player_matrix(new_counts, games + 1) - _player_matrix(counts, games)
+            if games == 0:
+                new_players += 1
+
+        db.session.execute(
+            sa.update(Player).where(Player.id == human.id).values(values)
+        )
+
+    if new_players or overall_delta.any():
+        _add_to_overall(overall_delta, new_players)
+
+    _record_stats(live)
+
+
+def _increment(model, where, increments, **insert_values):
+    """UPDATE cộng dồn các cột, chưa có dòng thì INSERT"""
+    result = db.session.execute(
+        sa.update(model).where(where).values({
+            getattr(model, column): sa.func.coalesce(getattr(model, column), 0) + value
+            for column, value in increments.items()
+        })
+    )
+    if result.rowcount == 0:
+        db.session.execute(sa.insert(model).values(**insert_values, **increments))
+
+
+def _record_stats(live):
+    """Cộng trận vừa kết thúc vào OverallStats, AI và GameStats"""
+    vs_ai = live.ai is not None
+    human_won = live.winner == live.player.playername
+    _increment(
+        OverallStats, OverallStats.id == OVERALL_ID,
+        {
+            "total_games": 1,
+            "human_vs_human": 0 if vs_ai else 1,
+            "human_vs_ai": 1 if vs_ai else 0,
+            "human_wins_vs_ai": 1 if vs_ai and human_won else 0,
+            "player_shots": live.player_shots,
+            "opponent_shots": live.opponent_shots,
+        },
+        id=OVERALL_ID,
+    )
+    if not vs_ai:
+        return
+
+    ai_won = live.winner == live.ai.name
+    column = AI.wins if ai_won else AI.losses
+    db.session.execute(
+        sa.update(AI).where(AI.id == live.ai.id)
+        .values({column: sa.func.coalesce(column, 0) + 1})
+    )
+
+    # AI luôn là bên opponent nên số phát bắn của AI là opponent_shots.
+    # Các biểu thức trong SET dùng giá trị cũ của dòng nên avg_shots được tính đúng.
+    games = sa.func.coalesce(GameStats.total_games, 0)
+    result = db.session.execute(
+        sa.update(GameStats).where(GameStats.algorithm_name == live.ai.name)
+        .values(
+            total_games=games + 1,
+            total_wins=sa.func.coalesce(GameStats.total_wins, 0) + (1 if ai_won else 0),
+            avg_shots=(sa.func.coalesce(GameStats.avg_shots, 0) * games + live.opponent_shots)
+                      / (games + 1),
+        )
+    )
+    if result.rowcount == 0:
+        db.session.execute(sa.insert(GameStats).values(
+            algorithm_name=live.ai.name, total_games=1,
+            total_wins=1 if ai_won else 0, avg_shots=float(live.opponent_shots)))
+
+
+def player_created():
+    """Gọi trong transaction tạo Player mới"""
+    _increment(OverallStats, OverallStats.id == OVERALL_ID, {"total_players": 1}, id=OVERALL_ID)
+
+
+def load_overall_stats():
+    """Dòng OverallStats (đọc theo khoá chính), None nếu chưa có"""
+    return db.session.get(OverallStats, OVERALL_ID)
+
+
+def _add_to_overall(delta, new_players):
+    row = db.session.execute(
+        sa.select(OverallHeatmap.matrix_sum, OverallHeatmap.players)
+        .where(OverallHeatmap.id == OVERALL_ID)
+    ).first()
+    if row is None:
+        db.session.execute(sa.insert(OverallHeatmap).values(
+            id=OVERALL_ID, matrix_sum=delta.astype(_SUM_DTYPE).tobytes(), players=new_players))
+        return
+    total = _sum_from_bytes(row.matrix_sum) + delta
+    db.session.execute(
+        sa.update(OverallHeatmap).where(OverallHeatmap.id == OVERALL_ID)
+        .values(matrix_sum=total.astype(_SUM_DTYPE).tobytes(), players=row.players + new_players)
+    )
+
+
+def _sum_from_bytes(blob):
+    if not blob:
+        return numpy.zeros(CELLS)
+    return numpy.frombuffer(blob, dtype=_SUM_DTYPE).copy()
+
+
+def load_overall_matrix():
+    """Phổ chung (list 10x10) đọc từ OverallHeatmap, None nếu chưa có dữ liệu. 1 câu truy vấn."""
+    row = db.session.execute(
+        sa.select(OverallHeatmap.matrix_sum, OverallHeatmap.players)
+        .where(OverallHeatmap.id == OVERALL_ID)
+    ).first()
+    if row is None or not row.players:
+        return None
+    return (_sum_from_bytes(row.matrix_sum) / row.players).reshape(10, 10).tolist()
+
+
+def finished_committed():
+    """Gọi sau khi commit transaction có trận vừa kết thúc: làm mới cache phổ chung"""
+    from app.game_logic.queries import invalidate_overall_probability_matrix
+    invalidate_overall_probability_matrix()
+
+
+def rebuild_player_heatmaps():
+    """Tính lại phổ đặt tàu của mọi người chơi và phổ chung từ các trận đã kết thúc (chưa commit)"""
+    totals = {}
+    rows = db.session.execute(
+        sa.select(Player.id, ShipPlacement.grid_data)
+        .join(ShipPlacement, ShipPlacement.owner == Player.playername)
+        .join(Game, Game.id == ShipPlacement.game_id)
+        .where(Game.status == "finished")
+        .execution_options(yield_per=500)
+    )
+    for player_id, grid_data in rows:
+        counts, games = totals.get(player_id, (numpy.zeros(CELLS, dtype=_COUNTS_DTYPE), 0))
+        totals[player_id] = (counts + ship_cells(Board.from_bytes(grid_data)), games + 1)
+
+    db.session.execute(sa.update(Player).values(placement_counts=None, placement_games=0))
+    overall = numpy.zeros(CELLS)
+    for player_id, (counts, games) in totals.items():
+        db.session.execute(
+            sa.update(Player).where(Player.id == player_id)
+            .values(placement_counts=counts_to_bytes(counts), placement_games=games)
+        )
+        overall += _player_matrix(counts, games)
+
+    # Dựng lại phổ chung từ đầu (cũng xoá sai số cộng dồn của số thực)
+    db.session.execute(sa.delete(OverallHeatmap))
+    db.session.execute(sa.insert(OverallHeatmap).values(
+        id=OVERALL_ID, matrix_sum=overall.astype(_SUM_DTYPE).tobytes(), players=len(totals)))
+    return len(totals)
+
+
+def _total(column):
+    return sa.func.coalesce(sa.func.sum(column), 0)
+
+
+def rebuild_stats():
+    """Tính lại thống kê người chơi, OverallStats, AI.wins/losses và GameStats từ bảng game (chưa commit)"""
+    finished = Game.status == "finished"
+    vs_ai = Game.ai_id.is_not(None)
+    count = sa.func.count(Game.id)
+
+    row = db.session.execute(
+        sa.select(
+            count,
+            _total(sa.case((vs_ai, 0), else_=1)),
+            _total(sa.case((vs_ai, 1), else_=0)),
+            _total(Game.player_shots),
+            _total(Game.opponent_shots),
+        ).where(finished)
+    ).one()
+    human_wins_vs_ai = db.session.scalar(
+        sa.select(count)
+        .join(Player, Game.player_id == Player.id)
+        .where(finished, vs_ai, Game.winner == Player.playername)
+    )
+
+    # Thắng/thua/số trận của người chơi: 1 câu truy vấn gom nhóm cho mỗi vai (chủ phòng/đối thủ)
+    db.session.execute(sa.update(Player).values(wins=0, losses=0, games_played=0))
+    for column in (Game.player_id, Game.opponent_id):
+        won = sa.case((Game.winner == Player.playername, 1), else_=0)
+        per_player = db.session.execute(
+            sa.select(Player.id, count, _total(won))
+            .join(Game, column == Player.id)
+            .where(finished)
+            .group_by(Player.id)
+        ).all()
+        for player_id, games, wins in per_player:
+            db.session.execute(
+                sa.update(Player).where(Player.id == player_id).values(
+                    wins=Player.wins + wins,
+                    losses=Player.losses + games - wins,
+                    games_played=Player.games_played + games,
+                )
+            )
+
+    db.session.execute(sa.delete(OverallStats))
+    db.session.execute(sa.insert(OverallStats).values(
+        id=OVERALL_ID,
+        total_players=db.session.scalar(sa.select(sa.func.count(Player.id))),
+        total_games=row[0], human_vs_human=row[1], human_vs_ai=row[2],
+        human_wins_vs_ai=human_wins_vs_ai, player_shots=row[3], opponent_shots=row[4],
+    ))
+
+    # Mỗi AI: 1 câu truy vấn gom nhóm cho tất cả AI
+    ai_won = sa.case((Game.winner == AI.name, 1), else_=0)
+    per_ai = db.session.execute(
+        sa.select(AI.id, AI.name, count, _total(ai_won), sa.func.avg(Game.opponent_shots))
+        .join(Game, Game.ai_id == AI.id)
+        .where(finished)
+        .group_by(AI.id, AI.name)
+    ).all()
+
+    db.session.execute(sa.update(AI).values(wins=0, losses=0))
+    db.session.execute(sa.delete(GameStats))
+    for ai_id, name, games, wins, avg_shots in per_ai:
+        db.session.execute(
+            sa.update(AI).where(AI.id == ai_id).values(wins=wins, losses=games - wins)
+        )
+        db.session.execute(sa.insert(GameStats).values(
+            algorithm_name=name, total_games=games, total_wins=wins, avg_shots=avg_shots or 0.0))
+    return len(per_ai)
@@ -0,0 +1,181 @@
+# simulation.py
+"""
+Chạy trận đấu hoàn toàn trong RAM, không cần DB, request context hay Socket.IO.
+
+Dùng lại luật trong base_logic.py và các lớp AI trong app/ai/ qua 2 điểm thay thế:
+    - store: MemoryStore thay cho kho gắn với DB (live_store)
+    - emitter=None: AI không gửi log qua socket
+Dùng để đánh giá AI và chiến lược đặt tàu với số lượng lớn trận, có seed để lặp lại.
+
+    run_games("DemoProbAI", "TestAI", games=1000, seed=0)
+    run_games("DemoProbAI", strategy="avoid adjacent", games=1000)
+"""
+import random
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+from app.game_logic.base_logic import GameLogic
+from app.game_logic.place_ships_strat import ShipPlacementStrategy
+from app.game_logic.live_store import LiveGame
+from app.log import quiet as quiet_logs
+
+# Giới hạn an toàn, 2 bên cộng lại không thể bắn quá 200 ô khác nhau
+MAX_SHOTS = 400
+FLEET_OWNER = "Fleet"
+
+
+class MemoryStore:
+    """
+    Kho trạng thái không có DB: LiveGame chỉ nằm trong RAM và không được ghi đi đâu.
+    Cùng giao diện với live_store mà GameLogic dùng.
+    """
+
+    def get(self, game):
+        return game
+
+    def peek(self, game_id):
+        return None
+
+    def mark_dirty(self, live, owner=None):
+        pass
+
+    def persist(self, live):
+        pass
+
+    def finish(self, live):
+        pass
+
+
+def new_game(game_id, first_name, second_name):
+    """Tạo LiveGame trống, first_name bắn trước"""
+    game = SimpleNamespace(
+        id=game_id,
+        player_id=None, opponent_id=None, ai_id=None,
+        player=SimpleNamespace(id=None, playername=first_name),
+        opponent=None,
+        ai=SimpleNamespace(id=None, name=second_name),
+        status="battle",
+        current_turn=first_name,
+        winner=None,
+        player_shots=0,
+        opponent_shots=0,
+        version=0,
+    )
+    return LiveGame(game)
+
+
+def _make_ai(ai_name, live, name, store, priors=None):
+    from app.ai.factory import get_ai_class
+
+    ai = get_ai_class(ai_name)(live, name=name, store=store, emitter=None)
+    # AI cần phổ từ lịch sử (RandomAI) thì dùng phổ truyền vào, mặc định là phổ đều
+    if hasattr(ai, "load_priors"):
+        ai.priors = priors or (_uniform(), _uniform())
+    return ai
+
+
+def _uniform():
+    import numpy
+    return numpy.ones((10, 10))
+
+
+def play_ai_vs_ai(first_ai, second_ai, seed=0, priors=None):
+    """
+    1 trận AI đấu AI. first_ai bắn trước.
+    Trả về {"seed", "winner", "shots": {tên: số phát}, "moves"}
+    """
+    random.seed(seed)
+    store = MemoryStore()
+    first_name, second_name = f"{first_ai}#1", f"{second_ai}#2"
+    live = new_game(seed, first_name, second_name)
+
+    first = _make_ai(first_ai, live, first_name, store, priors)
+    second = _make_ai(second_ai, live, second_name, store, priors)
+    first.place_ships()
+    second.place_ships()
+
+    shooters = {first_name: (first, second_name), second_name: (second, first_name)}
+    for _ in range(MAX_SHOTS):
+        attacker = live.current_turn
+        ai, target = shooters[attacker]
+        result = ai.make_shot(attacker, target)
+        if result is None or result["result"] == "invalid" or result.get("winner"):
+            break
+        live.current_turn = GameLogic.next_turn(result["result"], attacker, target)
+
+    return {
+        "seed": seed,
+        "winner": live.winner,
+        "shots": {first_name: live.player_shots, second_name: live.opponent_shots},
+        "moves": len(live.moves),
+    }
+
+
+def play_ai_vs_strategy(ai_name, strategy, seed=0, priors=None):
+    """
+    AI bắn vào hạm đội được đặt bằng 1 chiến lược trong ShipPlacementStrategy.
+    Trả về {"seed", "shots"}: số phát để bắn chìm toàn bộ hạm đội.
+    """
+    random.seed(seed)
+    store = MemoryStore()
+    live = new_game(seed, ai_name, FLEET_OWNER)
+
+    ShipPlacementStrategy(live, store).auto_place_ships_strategy(FLEET_OWNER, strategy)
+    ai = _make_ai(ai_name, live, ai_name, store, priors)
+
+    for _ in range(MAX_SHOTS):
+        result = ai.make_shot(ai_name, FLEET_OWNER)
+        if result is None or result["result"] == "invalid" or result.get("winner"):
+            break
+
+    return {"seed": seed, "shots": live.player_shots, "finished": live.status == "finished"}
+
+
+def run_games(first_ai, second_ai=None, strategy=None, games=100, seed=0, quiet=True):
+    """
+    Chạy nhiều trận có seed liên tiếp (seed, seed + 1, ...) và tổng hợp kết quả.
+    Truyền second_ai để đấu AI với AI, hoặc strategy để đấu với chiến lược đặt tàu.
+    """
+    if (second_ai is None) == (strategy is None):
+        raise ValueError("Cần truyền đúng 1 trong 2: second_ai hoặc strategy")
+
+    results = []
+    start = time.perf_counter()
+    # Tắt log INFO/DEBUG (mỗi phát bắn, mỗi trận của GameLogic và AI) trong lúc mô phỏng
+    with quiet_logs() if quiet else nullcontext():
+        for i in range(games):
+            if second_ai is not None:
+                results.append(play_ai_vs_ai(first_ai, second_ai, seed + i))
+            else:
+                results.append(play_ai_vs_strategy(first_ai, strategy, seed + i))
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        "games": games,
+        "seconds": round(elapsed, 3),
+        "games_per_second": round(games / elapsed, 1) if elapsed > 0 else None,
+    }
+    if second_ai is not None:
+        first_name, second_name = f"{first_ai}#1", f"{second_ai}#2"
+        first_wins = sum(1 for r in results if r["winner"] == first_name)
+        summary.update({
+            "first": first_ai,
+            "second": second_ai,
+            "first_win_rate": round(first_wins / games, 4) if games else 0.0,
+            "avg_shots_first": _avg(r["shots"][first_name] for r in results),
+            "avg_shots_second": _avg(r["shots"][second_name] for r in results),
+        })
+    else:
+        summary.update({
+            "ai": first_ai,
+            "strategy": strategy,
+            "avg_shots_to_win": _avg(r["shots"] for r in results),
+            "max_shots": max((r["shots"] for r in results), default=0),
+        })
+    return summary
+
+
+def _avg(values):
+    values = list(values)
+    return round(sum(values) / len(values), 2) if values else 0.0
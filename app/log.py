@@ -0,0 +1,69 @@
+# log.py
+"""
+Log của ứng dụng (thay cho print).
+
+Mỗi module lấy logger theo tên module (logging.getLogger(__name__)), mức log đặt được
+cho từng nhánh qua config:
+    LOG_LEVEL   mức chung của "app", mặc định INFO
+    LOG_LEVELS  mức riêng, VD "app.ai=DEBUG,app.game_logic.live_store=WARNING"
+
+Thông điệp truyền theo kiểu %-format (log.debug("bắn (%d,%d)", x, y)) nên chỉ được
+format khi mức đó đang bật. Việc tốn công hơn chỉ để in log (VD duyệt cả danh sách)
+phải bọc trong log.isEnabledFor(logging.DEBUG).
+
+Log của 1 trận đi qua game_logger(): mọi dòng mang game_id (correlation id) để lọc
+theo trận, VD "... app.game_logic.base_logic [game 12] alice bắn (3,4) vào TestAI".
+"""
+import logging
+from contextlib import contextmanager
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [game %(game_id)s] %(message)s"
+
+
+def game_logger(logger, game_id):
+    """Logger của 1 trận: gắn game_id vào mọi dòng log"""
+    return logging.LoggerAdapter(logger, {"game_id": game_id})
+
+
+class _DefaultGameId(logging.Filter):
+    """Dòng log không thuộc trận nào có game_id = "-" """
+
+    def filter(self, record):
+        if not hasattr(record, "game_id"):
+            record.game_id = "-"
+        return True
+
+
+def parse_levels(spec):
+    """ "app.ai=DEBUG,app.routes=WARNING" -> {"app.ai": "DEBUG", "app.routes": "WARNING"}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+@contextmanager
+def quiet(level=logging.INFO):
+    """Tắt các log từ mức level trở xuống trong khối with (VD mô phỏng hàng nghìn trận)"""
+    previous = logging.root.manager.disable
+    logging.disable(level)
+    try:
+        yield
+    finally:
+        logging.disable(previous)
+
+
+def configure_logging(app):
+    """Gắn handler cho logger "app" (cũng là app.logger của Flask) và đặt mức log"""
+    root = logging.getLogger("app")
+    if not any(getattr(h, "_app_handler", False) for h in root.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler.addFilter(_DefaultGameId())
+        handler._app_handler = True
+        root.addHandler(handler)
+    root.setLevel(app.config.get("LOG_LEVEL", "INFO").upper())
+    for name, level in parse_levels(app.config.get("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(level)
@@ -0,0 +1,232 @@
+# metrics.py
+"""
+Số liệu vận hành ở dạng Prometheus text (GET /metrics), tự viết nên không cần
+thư viện hay dịch vụ ngoài.
+
+    battleship_socketio_event_seconds{event}            thời gian xử lý mỗi sự kiện Socket.IO
+    battleship_socketio_event_sql_statements{event}     số câu lệnh SQL mỗi sự kiện
+    battleship_socketio_event_errors_total{event}       số sự kiện bị lỗi
+    battleship_http_request_seconds{route,method}       thời gian xử lý mỗi request
+    battleship_http_request_sql_statements{route,method}
+    battleship_http_request_errors_total{route,method}  exception hoặc status >= 500
+    battleship_ai_think_seconds{ai}                     thời gian 1 lượt của AI theo lớp AI
+    battleship_live_games{status}                       số trận trong kho RAM theo trạng thái
+    battleship_socketio_rooms, battleship_socketio_clients
+
+Mọi handler đã đăng ký bằng @socketio.on và mọi route được bọc bởi
+instrument_socketio() / instrument_app() (gọi 1 lần trong app/__init__.py).
+Số câu lệnh SQL đếm bằng sql_stats nên chỉ tính các câu lệnh của chính sự kiện đó.
+"""
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from functools import wraps
+
+from flask import g, request
+
+from app.sql_stats import start_counting, stop_counting
+
+# Mốc (giây) cho histogram thời gian, giống mặc định của các client Prometheus
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Mốc cho histogram số câu lệnh SQL
+SQL_BUCKETS = (0, 1, 2, 3, 5, 7, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}   # giá trị nhãn -> [số mẫu theo từng mốc (không cộng dồn)..., tổng, số mẫu]
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                labels = _label_text(self.labels, values, [("le", _number(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.series = {}
+
+    def inc(self, *label_values, amount=1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, values)} {_number(value)}")
+        return lines
+
+
+class Gauge:
+    """Giá trị đọc lúc scrape: collect() trả về {giá trị nhãn: số}"""
+
+    def __init__(self, name, help_text, collect, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for values, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_label_text(self.labels, values)} {_number(value)}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Toàn bộ số liệu theo định dạng text của Prometheus (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+event_seconds = registry.add(Histogram(
+    "battleship_socketio_event_seconds", "Thời gian xử lý sự kiện Socket.IO", ["event"]))
+event_sql = registry.add(Histogram(
+    "battleship_socketio_event_sql_statements", "Số câu lệnh SQL mỗi sự kiện Socket.IO",
+    ["event"], SQL_BUCKETS))
+event_errors = registry.add(Counter(
+    "battleship_socketio_event_errors_total", "Số sự kiện Socket.IO bị lỗi", ["event"]))
+request_seconds = registry.add(Histogram(
+    "battleship_http_request_seconds", "Thời gian xử lý request HTTP", ["route", "method"]))
+request_sql = registry.add(Histogram(
+    "battleship_http_request_sql_statements", "Số câu lệnh SQL mỗi request HTTP",
+    ["route", "method"], SQL_BUCKETS))
+request_errors = registry.add(Counter(
+    "battleship_http_request_errors_total", "Số request HTTP lỗi (exception hoặc status >= 500)",
+    ["route", "method"]))
+ai_think_seconds = registry.add(Histogram(
+    "battleship_ai_think_seconds", "Thời gian 1 lượt của AI (chọn ô + bắn)", ["ai"]))
+
+
+def _live_games():
+    from app.game_logic.live_store import live_store
+    return {(status,): count for status, count in _Tally(live.status for live in live_store).items()}
+
+
+def _rooms(socketio):
+    """{tên room: số sid} của namespace "/", bỏ room riêng của từng sid"""
+    rooms = socketio.server.manager.rooms.get("/", {})
+    clients = rooms.get(None, {})
+    return {room: len(sids) for room, sids in rooms.items() if room is not None and room not in clients}
+
+
+def _clients(socketio):
+    return len(socketio.server.manager.rooms.get("/", {}).get(None, {}))
+
+
+def observe_ai_think(ai_name, seconds):
+    ai_think_seconds.observe(seconds, ai_name)
+
+
+# --------------------------- Gắn vào Flask / Socket.IO ---------------------------
+
+def _timed_event(event, handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        counter = start_counting(keep_sql=False)
+        start = time.perf_counter()
+        try:
+            return handler(*args, **kwargs)
+        except Exception:
+            event_errors.inc(event)
+            raise
+        finally:
+            event_seconds.observe(time.perf_counter() - start, event)
+            event_sql.observe(stop_counting(counter).statements, event)
+    wrapper._metrics_wrapped = True
+    return wrapper
+
+
+def instrument_socketio(socketio):
+    """Bọc mọi handler đã đăng ký (gọi sau khi import socket_events)"""
+    for handlers in socketio.server.handlers.values():
+        for event, handler in list(handlers.items()):
+            if not getattr(handler, "_metrics_wrapped", False):
+                handlers[event] = _timed_event(event, handler)
+
+    registry.add(Gauge("battleship_live_games", "Số trận trong kho RAM theo trạng thái",
+                       _live_games, ["status"]))
+    registry.add(Gauge("battleship_socketio_rooms", "Số room Socket.IO (không tính room riêng của sid)",
+                       lambda: {(): len(_rooms(socketio))}))
+    registry.add(Gauge("battleship_socketio_clients", "Số client Socket.IO đang kết nối",
+                       lambda: {(): _clients(socketio)}))
+
+
+def instrument_app(app):
+    """Đo mọi route bằng before/after/teardown_request"""
+
+    @app.before_request
+    def _start_request_metrics():
+        g._metrics = (time.perf_counter(), start_counting(keep_sql=False))
+
+    @app.after_request
+    def _record_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _record_request_metrics(exc):
+        started = g.pop("_metrics", None)
+        if started is None:
+            return
+        start, counter = started
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        request_seconds.observe(time.perf_counter() - start, route, request.method)
+        request_sql.observe(stop_counting(counter).statements, route, request.method)
+        if exc is not None or g.pop("_metrics_status", 200) >= 500:
+            request_errors.inc(route, request.method)
@@ -3,10 +3,7 @@ from datetime import datetime, timezone
 import sqlalchemy as sa
 import sqlalchemy.orm as so
 from typing import Optional
-from app import db, login
 from flask_login import UserMixin
-import json
-import numpy
 
 class Player(UserMixin, db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
@@ -14,38 +11,48 @@ class Player(UserMixin, db.Model):
     password_hash: so.Mapped[Optional[str]] = so.mapped_column(sa.String(256), nullable=True)   #chưa dùng
 
 
-    # Thống kê
+    # Thống kê (cập nhật khi trận kết thúc, xem app/game_logic/rollups.py)
     wins: so.Mapped[int] = so.mapped_column(default=0)
     losses: so.Mapped[int] = so.mapped_column(default=0)
+    games_played: so.Mapped[int] = so.mapped_column(default=0, server_default="0")
+
+    # Phổ đặt tàu cộng dồn qua các trận đã kết thúc (xem app/game_logic/rollups.py)
+    placement_counts: so.Mapped[Optional[bytes]] = so.mapped_column(db.LargeBinary, nullable=True)
+    placement_games: so.Mapped[int] = so.mapped_column(default=0, server_default="0")
     
     @property
     def ship_probability_matrix(self):
-        from app.models import Game, ShipPlacement
-        
-        placements = db.session.scalars(
-            sa.select(ShipPlacement.grid_data)
-            .join(Game)
-            .where( (ShipPlacement.owner == self.playername) & (Game.status == 'finished') )
-        ).all()
-        
-        if not placements:
+        """Tỉ lệ số trận người chơi đặt tàu ở từng ô (ma trận 10x10), None nếu chưa có trận nào"""
+        from app.game_logic.rollups import counts_from_bytes
+
+        if not self.placement_games:
             return None
+        counts = counts_from_bytes(self.placement_counts)
+        return (counts / self.placement_games).reshape(10, 10).tolist()
+
+    @staticmethod
+    def matches_query(player_id, before=None, limit=20):
+        """
+        Truy vấn 1 trang trận của người chơi (chủ phòng hoặc đối thủ), mới nhất trước.
+        Mỗi vế lấy limit trận theo index (player_id, id) / (opponent_id, id) nên không phải
+        sắp xếp mọi trận của người chơi, chỉ sắp xếp lại tối đa 2 * limit id khi gộp.
+        """
+        from app.models import Game
 
-        maxtrix_sum = None
-        numOfGrid = len(placements)
-        
-        for grid_json in placements:
-            grid = json.loads(grid_json)
-            grid_np = numpy.array(grid, dtype=float)
-            # Chỉ giữ lại ô có tàu (1 hoặc 2), bỏ qua ô 0 và ô miss (3)
-            grid_np = numpy.where((grid_np == 1) | (grid_np == 2) | (grid_np == 4), 1.0, 0.0)
-            
-            if maxtrix_sum is None:
-                maxtrix_sum = grid_np
-            else: 
-                maxtrix_sum += grid_np
-                
-        return (maxtrix_sum / numOfGrid).tolist()
+        def newest(column):
+            query = sa.select(Game.id).where(column == player_id)
+            if before is not None:
+                query = query.where(Game.id < before)
+            return sa.select(query.order_by(Game.id.desc()).limit(limit).subquery().c.id)
+
+        ids = sa.union_all(newest(Game.player_id), newest(Game.opponent_id)).subquery()
+        return (
+            sa.select(Game)
+            .join(ids, Game.id == ids.c.id)
+            .options(so.joinedload(Game.player), so.joinedload(Game.opponent))
+            .order_by(ids.c.id.desc())
+            .limit(limit)
+        )
 
     @property
     def win_rate(self) -> float:
@@ -53,30 +60,21 @@ class Player(UserMixin, db.Model):
         if total > 0:
             return self.wins / total 
         else: return 0 
-        
-    @property
-    def games_played(self) -> int:
-        from app.models import Game  # tránh Game không được khởi tạo
-        count = db.session.scalar(
-            sa.select(sa.func.count(Game.id)).where(
-            ((Game.player_id == self.id) | (Game.opponent_id == self.id))
-            & (Game.status == 'finished')
-        )
-        )
-        return count or 0
     
-    #Các trận đã chơi của player
-    @property
-    def matches(self):
-        from app.models import Game, Player
+    #Các trận đã chơi của player, mới nhất trước, mỗi lần 1 trang
+    def matches(self, before=None, limit=20):
+        """
+        Phân trang theo khoá (keyset): before là game_id cuối cùng của trang trước.
+        Trả về (danh sách trận, game_id để lấy trang sau hoặc None nếu hết).
+        Thứ tự theo Game.id giảm dần (cũng là thứ tự tạo trận).
+        """
+        query = Player.matches_query(self.id, before, limit + 1)
+        games = db.session.scalars(query).all()
 
-        games = db.session.scalars(
-            sa.select(Game)
-            .where(
-                (Game.player_id == self.id) | (Game.opponent_id == self.id)
-            )
-            .order_by(Game.timestamp.desc())
-        ).all()
+        next_before = None
+        if len(games) > limit:
+            games = games[:limit]
+            next_before = games[-1].id
 
         # Dựng dữ liệu dạng dễ hiển thị cho template
         matches_data = []
@@ -95,7 +93,7 @@ class Player(UserMixin, db.Model):
                 "timestamp": g.timestamp
             })
 
-        return matches_data
+        return matches_data, next_before
 
     
     # Thống kê trận tham gia
@@ -157,12 +155,14 @@ class Game(db.Model):
     player_ready: so.Mapped[bool] = so.mapped_column(default=False)
     opponent_ready: so.Mapped[bool] = so.mapped_column(default=False)
     ai_ready: so.Mapped[bool] = so.mapped_column(default=False)
+    # Tăng sau mỗi thay đổi trên bảng, client dùng để đồng bộ theo delta
+    version: so.Mapped[int] = so.mapped_column(default=0, server_default="0")
 
 
 
     # Quan hệ ORM
     player_id: so.Mapped[int] = so.mapped_column(db.ForeignKey("player.id"))
-    ai_id: so.Mapped[Optional[int]] = so.mapped_column(db.ForeignKey("ai.id"), nullable=True)
+    ai_id: so.Mapped[Optional[int]] = so.mapped_column(db.ForeignKey("ai.id"), nullable=True, index=True)
     opponent_id: so.Mapped[Optional[int]] = so.mapped_column(db.ForeignKey("player.id"), nullable=True)
     
     player: so.Mapped["Player"] = so.relationship(
@@ -177,32 +177,66 @@ class Game(db.Model):
     )
 
 
+    # Các trận đã kết thúc theo thứ tự id (thống kê, audit-games, export-replays)
+    __table_args__ = (
+        sa.Index("ix_game_status_id", "status", "id"),
+        # Trang trận của người chơi (Player.matches_query)
+        sa.Index("ix_game_player_id_id", "player_id", "id"),
+        sa.Index("ix_game_opponent_id_id", "opponent_id", "id"),
+    )
+
     def __repr__(self):
         return f"<Game {self.id} winner={self.winner} status={self.status}>"    
 
-#Thống kê trận đấu (chung)
+#Thống kê trận đấu theo từng AI (algorithm_name = AI.name), cập nhật khi trận kết thúc
 class GameStats(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
-    algorithm_name: so.Mapped[str] = so.mapped_column(db.String(64))
+    algorithm_name: so.Mapped[str] = so.mapped_column(db.String(64), unique=True)
     total_games: so.Mapped[int] = so.mapped_column(default=0)
     total_wins: so.Mapped[int] = so.mapped_column(default=0)
     avg_shots: so.Mapped[float] = so.mapped_column(default=0.0)
 
     def win_rate(self):
         return self.total_wins / self.total_games if self.total_games > 0 else 0.0
+
+
+#Số liệu tổng quan (chỉ có 1 dòng, xem app/game_logic/rollups.py)
+class OverallStats(db.Model):
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    total_players: so.Mapped[int] = so.mapped_column(default=0)
+    total_games: so.Mapped[int] = so.mapped_column(default=0)      # trận đã kết thúc
+    human_vs_human: so.Mapped[int] = so.mapped_column(default=0)
+    human_vs_ai: so.Mapped[int] = so.mapped_column(default=0)
+    human_wins_vs_ai: so.Mapped[int] = so.mapped_column(default=0)
+    player_shots: so.Mapped[int] = so.mapped_column(default=0)     # tổng số phát bắn
+    opponent_shots: so.Mapped[int] = so.mapped_column(default=0)
+
+
+#Phổ đặt tàu chung của mọi người chơi (chỉ có 1 dòng, xem app/game_logic/rollups.py)
+class OverallHeatmap(db.Model):
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    # Tổng phổ (100 số float64) của các người chơi đã có ít nhất 1 trận
+    matrix_sum: so.Mapped[Optional[bytes]] = so.mapped_column(db.LargeBinary, nullable=True)
+    players: so.Mapped[int] = so.mapped_column(default=0)
     
 #Lưu tàu
 class ShipPlacement(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     game_id: so.Mapped[int] = so.mapped_column(db.ForeignKey("game.id"))
     owner: so.Mapped[str] = so.mapped_column(db.String(16))  
-    grid_data: so.Mapped[str] = so.mapped_column(db.Text)    
-    ship_data: so.Mapped[Optional[str]] = so.mapped_column(db.Text, nullable=True)
+    # Bitboard đã đóng gói (xem app/game_logic/board.py)
+    grid_data: so.Mapped[bytes] = so.mapped_column(db.LargeBinary)    
+    ship_data: so.Mapped[Optional[bytes]] = so.mapped_column(db.LargeBinary, nullable=True)
     shot_data: so.Mapped[Optional[str]] = so.mapped_column(db.Text, nullable=True)
     
     # Quan hệ đến game
     #backref là ánh xạ ngược từ Game->ShipPlacement qua game.ship_placements
     game: so.Mapped["Game"] = so.relationship(backref="ship_placements")   
+
+    # Mỗi bên chỉ có 1 hạm đội trong 1 trận, nạp trận tìm theo game_id
+    __table_args__ = (
+        sa.Index("ix_ship_placement_game_owner", "game_id", "owner", unique=True),
+    )
     
 
 #Bảng lưu lịch sử game đấu
@@ -222,4 +256,22 @@ class GameMove(db.Model):
     sunk_ship_name: so.Mapped[Optional[str]] = so.mapped_column(db.String(32), nullable=True)
     is_reverted: so.Mapped[bool] = so.mapped_column(default=False)
 
-    game: so.Mapped["Game"] = so.relationship(backref="moves")
\ No newline at end of file
+    game: so.Mapped["Game"] = so.relationship(backref="moves")
+
+    # Nạp trận / undo đọc các nước của 1 trận theo thứ tự id
+    __table_args__ = (
+        sa.Index("ix_game_move_game_id_id", "game_id", "id"),
+    )
+
+#Ảnh chụp các bảng sau move_count nước đầu tiên (xem app/game_logic/history.py)
+#Nạp trận = snapshot gần nhất + phát lại các nước sau đó
+class GameSnapshot(db.Model):
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    game_id: so.Mapped[int] = so.mapped_column(db.ForeignKey("game.id"))
+    move_count: so.Mapped[int] = so.mapped_column(sa.Integer)
+    data: so.Mapped[bytes] = so.mapped_column(db.LargeBinary)
+
+    # Snapshot gần nhất <= n của 1 trận
+    __table_args__ = (
+        sa.Index("ix_game_snapshot_game_move_count", "game_id", "move_count", unique=True),
+    )
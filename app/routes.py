@@ -1,14 +1,17 @@
 from app import app, db, socketio
 from flask_socketio import emit, join_room, leave_room
 from app.forms import EnterNameForm, NewGameForm, StartGameForm, CancelGameForm, JoinGame
-from flask import render_template, flash, redirect, url_for, request
+from flask import render_template, flash, redirect, url_for, request, Response
 from urllib.parse import urlsplit
-from app.models import Player, Game, ShipPlacement, AI
+from app.models import Player, Game, AI
 import sqlalchemy as sa
 from flask_login import current_user, login_user, logout_user, login_required
 import json
 from app.game_logic.base_logic import GameLogic
-from app.ai.factory import get_ai_instance
+from app.ai.factory import get_ai_instance, drop_ai_instance
+from app.ai.scheduler import ai_scheduler
+from app.game_logic.live_store import live_store, compare_and_set, update_game, StaleVersion
+from app.metrics import registry
 
 
 
@@ -33,8 +36,10 @@ def entername():
         )
         
         if player is None:
+            from app.game_logic.rollups import player_created
             player = Player(playername = form.playername.data)
             db.session.add(player)
+            player_created()
             db.session.commit()
             flash('Tạo người chơi mới tên {} thành công!'.format(form.playername.data))
         
@@ -58,8 +63,11 @@ def player(playername):
     player = db.first_or_404(
         sa.select(Player).where(Player.playername == playername)
     )
+    before = request.args.get('before', None, type=int)
+    matches, next_before = player.matches(before=before, limit=app.config['MATCHES_PER_PAGE'])
+    next_url = url_for('player', playername=playername, before=next_before) if next_before else None
     
-    return render_template('player.html', player = player)
+    return render_template('player.html', player = player, matches = matches, next_url = next_url)
     
 @app.route('/statistic/player/<playername>')
 @login_required
@@ -70,13 +78,18 @@ def player_statistic(playername):
 @app.route('/game_detail/<game_id>')
 def game_detail(game_id):
     game = db.first_or_404(sa.select(Game).where(Game.id == game_id))
+
+    # Trận còn trong kho thì ghi xuống DB trước khi đọc
+    live = live_store.peek(game.id)
+    if live:
+        try:
+            live_store.flush(live)
+        except StaleVersion:
+            live = None     # bản trong RAM đã cũ, đọc từ DB
+        db.session.refresh(game)
     
-    
-    # Lấy ma trận
-    placements = db.session.scalars(
-        sa.select(ShipPlacement)
-        .where(ShipPlacement.game_id == game.id)
-    ).all()
+    # Bảng được dựng lại từ hạm đội ban đầu + lịch sử nước đi (xem history.py)
+    state = live or live_store.read(game)
     
     player_grid = None
     opponent_grid = None
@@ -86,19 +99,19 @@ def game_detail(game_id):
     opponent_ships = {}
     
     
-    for p in placements:
-        grid = json.loads(p.grid_data)
-        ship_data = json.loads(p.ship_data or "{}")
+    for owner, board in state.boards.items():
+        grid = board.to_list()
+        ship_data = state.ship_data.get(owner, {})
         
-        if p.owner == game.player.playername:
+        if owner == game.player.playername:
             player_grid = grid
             player_ships = ship_data
             host_name = game.player.playername
-        elif game.opponent and p.owner == game.opponent.playername:
+        elif game.opponent and owner == game.opponent.playername:
             opponent_grid = grid
             opponent_ships = ship_data
             guest_name = game.opponent.playername
-        elif game.ai and p.owner == game.ai.name:
+        elif game.ai and owner == game.ai.name:
             opponent_grid = grid
             opponent_ships = ship_data
             guest_name = game.ai.name
@@ -195,9 +208,15 @@ def join(game_id):
         flash("Có người rồi")
         return redirect(url_for("index"))
     
-    game.opponent_id = current_user.id 
-    game.status = 'active'
+    live_store.evict(game.id)
+    # Compare-and-set: 2 người cùng vào thì chỉ 1 người được nhận
+    db.session.refresh(game)
+    joined = game.opponent_id is None and compare_and_set(
+        game.id, game.version, opponent_id=current_user.id, status="active")
     db.session.commit()
+    if not joined:
+        flash("Có người rồi")
+        return redirect(url_for("index"))
     socketio.emit(
         "player_joined",
         {
@@ -226,45 +245,50 @@ def game_hall(game_id):
     
     if request.method == "POST":
         action = request.form.get("action")
-
-        if action == "start" and start_form.validate():
-            db.session.refresh(game)  # cập nhật trạng thái mới nhất từ DB
-            if game.status != "active":
-                flash("Trận chưa sẵn sàng để bắt đầu!", "warning")
-            else:
-                game.status = "in_progress"
-                db.session.commit()
-                flash("Trận đấu đã bắt đầu!", "success")
+        # Trạng thái trận đổi ngoài kho: compare-and-set qua update_game,
+        # bị ghi chen quá nhiều lần thì báo lỗi và hiện lại phòng chờ
+        try:
+            if action == "start" and start_form.validate():
+                if not update_game(game, lambda g: g.status == "active", status="in_progress"):
+                    flash("Trận chưa sẵn sàng để bắt đầu!", "warning")
+                else:
+                    db.session.commit()
+                    flash("Trận đấu đã bắt đầu!", "success")
                 
                 
-                if game.ai_id :
-                    flash("Bắt đầu trận đấu với AI!", "success")
-                    return redirect(url_for("game_setup", game_id=game.id))
-                else :
-                    socketio.emit(
-                        "game_started",
-                        {"game_id": game.id, "redirect_url": url_for("game_setup", game_id=game.id)},
-                        to=str(game.id)
-                    )
+                    if game.ai_id :
+                        flash("Bắt đầu trận đấu với AI!", "success")
+                        return redirect(url_for("game_setup", game_id=game.id))
+                    else :
+                        socketio.emit(
+                            "game_started",
+                            {"game_id": game.id, "redirect_url": url_for("game_setup", game_id=game.id)},
+                            to=str(game.id)
+                        )
                 
-                flash("Trận đấu bắt đầu chuyển sang giai đoạn đặt tàu!", "success")
-                return redirect(url_for("game_setup", game_id=game.id))
+                    flash("Trận đấu bắt đầu chuyển sang giai đoạn đặt tàu!", "success")
+                    return redirect(url_for("game_setup", game_id=game.id))
 
-        elif action == "cancel" and cancel_form.validate():
+            elif action == "cancel" and cancel_form.validate():
             
-            if current_user.id == game.player_id:
-                game.status = "canceled"
-                db.session.commit()
-                socketio.emit("game_canceled", {"game_id": game.id}, to=str(game.id))
-                return redirect(url_for("index"))
+                if current_user.id == game.player_id:
+                    update_game(game, status="canceled")
+                    db.session.commit()
+                    ai_scheduler.cancel(game.id)
+                    drop_ai_instance(game.id)
+                    socketio.emit("game_canceled", {"game_id": game.id}, to=str(game.id))
+                    return redirect(url_for("index"))
             
             
-            elif current_user.id == game.opponent_id:
-                game.opponent_id = None
-                game.status = "pending"
-                db.session.commit()
-                socketio.emit("opponent_left", {"game_id": game.id}, to=str(game.id))
-                return redirect(url_for("index"))
+                elif current_user.id == game.opponent_id:
+                    if update_game(game, lambda g: g.opponent_id == current_user.id,
+                                   opponent_id=None, status="pending"):
+                        db.session.commit()
+                        socketio.emit("opponent_left", {"game_id": game.id}, to=str(game.id))
+                    return redirect(url_for("index"))
+        except StaleVersion:
+            db.session.rollback()
+            flash("Trận đang được cập nhật, hãy thử lại!", "warning")
     
     invite_link = None
     if game.status == "pending":
@@ -299,10 +323,17 @@ def game_setup(game_id):
     board = logic.get_board(player_name)
     if not board:
         logic.init_board(player_name)
+        live_store.persist(logic.game)
 
     # Nếu là AI đối thủ → tự động sẵn sàng
-    if game.ai and not logic.get_board(game.ai.name):
-        game.ai_ready = True
+    # (dòng game bị sửa ngoài kho: compare-and-set như player_ready)
+    if game.ai and not game.ai_ready and not logic.get_board(game.ai.name):
+        try:
+            update_game(game, lambda g: not g.ai_ready, ai_ready=True)
+        except StaleVersion:
+            db.session.rollback()
+            flash("Trận đang được cập nhật, hãy thử lại!", "warning")
+            return redirect(url_for("game_hall", game_id=game.id))
         db.session.commit()
 
     return render_template(
@@ -319,48 +350,40 @@ def game_battle(game_id):
     game = db.get_or_404(Game, game_id)
     player_name = current_user.playername
     is_host = (game.player.playername == player_name)
-    game.current_turn = game.player.playername
-    db.session.commit()
+    # Lượt đầu được đặt khi trận bắt đầu (player_ready), tải lại trang không đổi trạng thái trận
+    live = live_store.get(game)
 
     # xác định đối thủ
     if game.ai:
         opponent_name = game.ai.name
-        ai = get_ai_instance(game)
-        ai.place_ships()
+        # AI chỉ đặt tàu 1 lần: các nước đi được phát lại trên hạm đội ban đầu
+        if not live.boards.get(opponent_name):
+            ai = get_ai_instance(game)
+            ai.place_ships()
     elif is_host and game.opponent:
         opponent_name = game.opponent.playername
     elif not is_host:
         opponent_name = game.player.playername
 
-    # lấy bảng
-    player_placement = db.session.scalar(
-        db.select(ShipPlacement)
-        .where(ShipPlacement.game_id == game_id)
-        .where(ShipPlacement.owner == player_name)
-    )
-    opponent_placement = db.session.scalar(
-        db.select(ShipPlacement)
-        .where(ShipPlacement.game_id == game_id)
-        .where(ShipPlacement.owner == opponent_name)
-    )
-
-    player_board = json.loads(player_placement.grid_data) if player_placement else None
-    opponent_board = json.loads(opponent_placement.grid_data) if opponent_placement else None
+    # lấy bảng từ kho trận đấu
+    player_board = live.boards.get(player_name)
+    opponent_board = live.boards.get(opponent_name)
+    player_board = player_board.to_list() if player_board else None
+    opponent_board = opponent_board.to_list() if opponent_board else None
+    live_store.persist(live)
 
     return render_template(
         "game_battle.html",
-        game=game,
+        game=live,
         player_name=player_name,
         opponent_name=opponent_name,
         player_board=json.dumps(player_board),
         opponent_board=json.dumps(opponent_board),
         is_host=is_host
     )
-    
-    
-@app.route("/render_matrix", methods=["POST"])
-def render_matrix():
-    data = request.get_json()
-    matrix = data.get("matrix")
-    heatmap = data.get("heatmap", False)
-    return render_template("statistic/_stat_table.html", matrix=matrix, heatmap=heatmap)
\ No newline at end of file
+
+
+@app.route("/metrics")
+def metrics():
+    # Prometheus đọc trực tiếp, không cần đăng nhập
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -1,28 +1,40 @@
-from app import socketio, db, app
+from app import socketio, db
 from flask_socketio import emit, join_room, leave_room
-from flask import request, current_app, url_for
+from flask import request
 from flask_login import current_user
 from app.models import Game
 from app.game_logic.base_logic import GameLogic
 from app.game_logic.place_ships_strat import ShipPlacementStrategy
-from app.ai.factory import get_ai_instance
-from time import sleep
+from app.ai.factory import drop_ai_instance
+from app.game_logic.live_store import live_store, StaleVersion, compare_and_set, update_game
+from app.ai.scheduler import ai_scheduler
+from app.ai.telemetry import ai_telemetry
+from app.socket_helpers import emit_turn_change, sync_payload, reject_stale
 
-import threading
-import time
+import logging
 import json
 
+log = logging.getLogger(__name__)
+
+# Số lần thử lại compare-and-set khi 2 người cùng sẵn sàng
+READY_RETRIES = 3
+
 @socketio.on("join_room")
 def handle_join(data):
     room = str(data.get("room"))
     join_room(room)
-    print(f"{current_user.playername} joined room {room}")
+    log.info("%s vào room %s", current_user.playername, room, extra={"game_id": room})
 
     game = db.session.get(Game, int(room))
-    if game and game.opponent_id is None and current_user.id != game.player_id:
-        game.opponent_id = current_user.id
-        game.status = "active"
+    if game and game.opponent_id is None and game.ai_id is None and current_user.id != game.player_id:
+        live_store.evict(game.id)
+        # Compare-and-set: 2 người cùng vào thì chỉ 1 người được nhận
+        db.session.refresh(game)
+        joined = game.opponent_id is None and compare_and_set(
+            game.id, game.version, opponent_id=current_user.id, status="active")
         db.session.commit()
+        if not joined:
+            return emit("error", {"message": "Phòng đã có người vào!"}, to=request.sid)
         emit("player_joined", {
             "game_id": int(room),
             "opponent_name": current_user.playername
@@ -32,23 +44,29 @@ def handle_join(data):
 def handle_leave(data):
     room = str(data.get("room"))
     leave_room(room)
-    print(f"{current_user.playername} left room {room}")
+    log.info("%s rời room %s", current_user.playername, room, extra={"game_id": room})
 
     game = db.session.get(Game, int(room))
     if not game:
         return
 
-    # Nếu người rời là đối thủ
-    if game.opponent_id == current_user.id:
-        game.opponent_id = None
-        game.status = "pending"
-        db.session.commit()
-        emit("opponent_left", {"game_id": int(room)}, to=room, include_self=False)
-
-    # Nếu người rời là chủ phòng
-    elif game.player_id == current_user.id:
-        game.status = "canceled"
-        db.session.commit()
+    # Trạng thái trận đổi ngoài kho: compare-and-set (điều kiện kiểm tra lại sau mỗi lần đọc)
+    try:
+        # Nếu người rời là đối thủ
+        if update_game(game, lambda g: g.opponent_id == current_user.id,
+                       opponent_id=None, status="pending"):
+            db.session.commit()
+            return emit("opponent_left", {"game_id": int(room)}, to=room, include_self=False)
+
+        # Nếu người rời là chủ phòng
+        canceled = update_game(game, lambda g: g.player_id == current_user.id, status="canceled")
+    except StaleVersion:
+        db.session.rollback()
+        return emit("error", {"message": "Trận đang được cập nhật, hãy thử lại!"}, to=request.sid)
+    db.session.commit()
+    if canceled:
+        ai_scheduler.cancel(game.id)
+        drop_ai_instance(game.id)
         emit("game_canceled", {"game_id": int(room)}, to=room)
         
 
@@ -57,8 +75,14 @@ def handle_cancel(data):
     game_id = int(data.get("game_id"))
     game = db.session.get(Game, game_id)
     if game:
-        game.status = "canceled"
+        try:
+            update_game(game, status="canceled")
+        except StaleVersion:
+            db.session.rollback()
+            return emit("error", {"message": "Trận đang được cập nhật, hãy thử lại!"}, to=request.sid)
         db.session.commit()
+        ai_scheduler.cancel(game.id)
+        drop_ai_instance(game.id)
     emit("game_canceled", {"game_id": game_id}, to=str(game_id))
         
         
@@ -73,7 +97,7 @@ def handle_place_ship(data):
     orientation = data["orientation"]
     owner = data["owner"]
 
-    game = db.session.get(Game, game_id)
+    game = live_store.get(game_id)
     logic = GameLogic(game)
     board = logic.get_board(owner) or logic.init_board(owner)
 
@@ -82,6 +106,7 @@ def handle_place_ship(data):
 
     board = logic.place_ship(board, x, y, logic.ships[ship_name], orientation, ship_name, owner)
     logic.save_board(owner, board)
+    live_store.persist(game)
 
     emit("ship_placed_self", {
         "ship_name": ship_name, 
@@ -99,14 +124,15 @@ def handle_auto_place_ship(data):
     game_id = data["game_id"]
     player = data["player"]
     strategy = data["strategy"]
-    game = db.session.get(Game, game_id)
+    game = live_store.get(game_id)
 
     logic = ShipPlacementStrategy(game)
     board = logic.auto_place_ships_strategy(player, strategy)
-    board = json.dumps(board)
+    live_store.persist(game)
+    board = json.dumps(board.to_list())
 
     socketio.emit("auto_ship_placed_self", {"board": board}, to=request.sid)
-    print(f"[DEBUG] auto_place_ship -> emitted board for {player}")
+    log.debug("auto_place_ship -> đã gửi bảng cho %s", player, extra={"game_id": game_id})
 
 @socketio.on("player_ready")
 def handle_ready(data):
@@ -120,29 +146,45 @@ def handle_ready(data):
 
     # Gắn cờ đã sẵn sàng
     if game.player and game.player.playername == player:
-        game.player_ready = True
+        ready_field = "player_ready"
     elif game.opponent and game.opponent.playername == player:
-        game.opponent_ready = True
+        ready_field = "opponent_ready"
+    else:
+        return
 
+    # Dòng game bị sửa ngoài kho: ghi nốt bản trong RAM rồi compare-and-set trên DB,
+    # 2 người cùng sẵn sàng thì người ghi sau đọc lại rồi thử lại
+    live_store.evict(game.id)
+    for _ in range(READY_RETRIES):
+        db.session.refresh(game)
+        if compare_and_set(game.id, game.version, **{ready_field: True}):
+            break
+        db.session.rollback()
+    else:
+        return emit("error", {"message": "Trận đang được cập nhật, hãy thử lại!"}, to=request.sid)
     db.session.commit()
 
-    # Kiểm tra nếu cả 2 đã sẵn sàng
-    if (game.player_ready and (game.opponent_ready or game.ai_ready)):
-        game.status = "battle"
+    # Kiểm tra nếu cả 2 đã sẵn sàng, chỉ 1 sự kiện được bắt đầu trận
+    db.session.refresh(game)
+    if (game.player_ready and (game.opponent_ready or game.ai_ready)) and game.status not in ("battle", "paused", "finished", "canceled"):
+        started = compare_and_set(game.id, game.version, status="battle")
+        db.session.commit()
+        if not started:
+            return
+        # Trạng thái và lượt do kho trận đấu quản lý
+        live = live_store.get(game)
         
         #dính lỗi này cay quá!!
-        if not game.current_turn:
+        if not live.current_turn:
             try:
-                game.current_turn = game.player.playername
+                live.current_turn = live.player.playername
             except Exception:
                 # fallback: nếu thiếu dữ liệu, lấy opponent
-                game.current_turn = game.opponent.playername if game.opponent else None
-        db.session.commit()
-        socketio.emit("both_ready", {"game_id": game.id}, to=str(game.id))
-        socketio.emit("turn_change", {
-            "current_turn": game.current_turn,
-            "is_ai_turn": (game.ai and game.current_turn == game.ai.name)
-        }, to=str(game.id))
+                live.current_turn = live.opponent.playername if live.opponent else None
+        live_store.mark_dirty(live)
+        live_store.persist(live)
+        socketio.emit("both_ready", {"game_id": live.id}, to=str(live.id))
+        emit_turn_change(live)
 
 
 #Người bắn  
@@ -155,7 +197,7 @@ def handle_fire(data):
     player_name = data["player"]
     x, y = int(data["x"]), int(data["y"])
 
-    game = db.session.get(Game, game_id)
+    game = live_store.get(game_id)
     if not game:
         return emit("error", {"message": "Game không tồn tại"}, to=request.sid)
 
@@ -177,84 +219,72 @@ def handle_fire(data):
     else:
         return emit("error", {"message": "Không xác định được đối thủ"}, to=request.sid)
     
-    print(f"[DEBUG] Đối thủ sẽ bắn là {opponent_name}")
 
-    # Xử lý bắn
+    # Xử lý bắn (version: trạng thái client đang thấy, 2 phát gửi dồn thì phát sau bị từ chối)
     logic = GameLogic(game)
-    result_data = logic.shoot(attacker_name=player_name, target_name=opponent_name, x=x, y=y)
-    db.session.commit()
+    try:
+        result_data = logic.shoot(attacker_name=player_name, target_name=opponent_name, x=x, y=y,
+                                  expected_version=data.get("version"))
+    except StaleVersion as e:
+        return reject_stale(game, e)
 
     game_over = process_shot_result(game, result_data, player_name, opponent_name, x, y)
     if game_over:
         return
 
-#AI bắn
-@socketio.on("ai_make_shot")
-def handle_ai_make_shot(data):
-    from app.models import Game
-    from app.ai.factory import get_ai_instance
-    from app.socket_helpers import process_shot_result
-    from app import db, socketio
-
-    sleep(0.25)
-    game_id = data.get("game_id")
-    game = db.session.get(Game, game_id)
-    if not game or not game.ai:
-        return emit("error", {"message": "Không tìm thấy AI!"}, to=request.sid)
-
-    if game.status == "paused":
-        return
-
-    ai = get_ai_instance(game)
-    print(f"[DEBUG] AI {ai.name} bắt đầu bắn...")
-
-    # Gọi logic AI bắn
-
-    result_data = ai.make_shot(
-        attacker_name=game.ai.name,
-        target_name=game.player.playername
-    )
-    db.session.commit()
-
-    process_shot_result(game, result_data, game.ai.name, game.player.playername)
-
-
 @socketio.on("undo_move")
 def handle_undo_move(data):
     game_id = data.get("game_id")
-    game = db.session.get(Game, game_id)
+    game = live_store.get(game_id)
     if not game:
         return
     
     if game.status != "paused":
         return emit("error", {"message": "Vui lòng tạm dừng game trước khi Undo!"}, to=request.sid)
 
+    ai_scheduler.cancel(game.id)
     logic = GameLogic(game)
-    undo_data = logic.undo_last_move()
+    count = int(data.get("count", 1))
+    version = data.get("version")
+    if count > 1:
+        return _jump(game, logic, logic.move_count() - count, version)
+
+    try:
+        undo_data = logic.undo_last_move(expected_version=version)
+    except StaleVersion as e:
+        return reject_stale(game, e)
+    live_store.persist(game)
     
     if undo_data:
+        delta = undo_data["delta"]
         socketio.emit("board_updated", {
             "game_id": game_id,
-            "owner": undo_data["target"],
-            "board": undo_data["board"]
-        }, to=str(game.id))
-        socketio.emit("turn_change", {
-            "current_turn": game.current_turn,
-            "is_ai_turn": (game.ai and game.current_turn == game.ai.name)
+            "version": delta["version"],
+            "owner": delta["owner"],
+            "cells": delta["cells"]
         }, to=str(game.id))
+        emit_turn_change(game)
 
 @socketio.on("redo_move")
 def handle_redo(data):
     from app.socket_helpers import process_shot_result
     game_id = data.get("game_id")
-    game = db.session.get(Game, game_id)
+    game = live_store.get(game_id)
     if not game: return
 
     if game.status != "paused":
         return emit("error", {"message": "Vui lòng tạm dừng game trước khi Redo!"}, to=request.sid)
 
     logic = GameLogic(game)
-    result_data = logic.redo_last_move()
+    count = int(data.get("count", 1))
+    version = data.get("version")
+    if count > 1:
+        return _jump(game, logic, logic.move_count() + count, version)
+
+    try:
+        result_data = logic.redo_last_move(expected_version=version)
+    except StaleVersion as e:
+        return reject_stale(game, e)
     
     if result_data:
         process_shot_result(
@@ -264,26 +294,82 @@ def handle_redo(data):
             result_data["target"]
         )
 
+@socketio.on("jump_to_move")
+def handle_jump_to_move(data):
+    """Đưa trận về sau n nước đầu tiên (game phải đang tạm dừng)"""
+    game = live_store.get(data.get("game_id"))
+    if not game:
+        return
+
+    if game.status != "paused":
+        return emit("error", {"message": "Vui lòng tạm dừng game trước khi chuyển nước đi!"}, to=request.sid)
+
+    ai_scheduler.cancel(game.id)
+    _jump(game, GameLogic(game), int(data.get("move", 0)), data.get("version"))
+
+def _jump(game, logic, n, expected_version=None):
+    """Nhảy nhiều nước: ghi trong 1 commit và gửi 1 sự kiện sync (các delta + lượt) cho cả phòng"""
+    version = game.version
+    try:
+        jump = logic.jump_to_move(n, expected_version=expected_version)
+    except StaleVersion as e:
+        return reject_stale(game, e)
+    live_store.persist(game)
+    if jump:
+        payload = sync_payload(game, version)
+        payload["moves"] = jump["moves"]
+        socketio.emit("sync", payload, to=str(game.id))
+
+@socketio.on("request_sync")
+def handle_request_sync(data):
+    """Client (mới vào hoặc kết nối lại) gửi version cuối đã có để nhận delta còn thiếu hoặc snapshot"""
+    game = live_store.get(data.get("game_id"))
+    if not game:
+        return emit("error", {"message": "Game không tồn tại"}, to=request.sid)
+
+    try:
+        version = int(data.get("version", -1))
+    except (TypeError, ValueError):
+        version = -1
+    emit("sync", sync_payload(game, version), to=request.sid)
+
+#Chỉ client mở bảng "Hoạt động của AI" mới nhận log của AI
+@socketio.on("subscribe_ai_log")
+def handle_subscribe_ai_log(data):
+    game_id = int(data.get("game_id"))
+    join_room(ai_telemetry.room(game_id))
+    ai_telemetry.subscribe(game_id, request.sid)
+
+@socketio.on("unsubscribe_ai_log")
+def handle_unsubscribe_ai_log(data):
+    game_id = int(data.get("game_id"))
+    leave_room(ai_telemetry.room(game_id))
+    ai_telemetry.unsubscribe(game_id, request.sid)
+
+@socketio.on("disconnect")
+def handle_disconnect(*args):
+    ai_telemetry.drop_sid(request.sid)
+
 @socketio.on("pause_game")
 def handle_pause(data):
     game_id = data.get("game_id")
-    game = db.session.get(Game, game_id)
+    game = live_store.get(game_id)
     if game and game.status == "battle":
         game.status = "paused"
-        db.session.commit()
+        ai_scheduler.cancel(game.id)
+        live_store.mark_dirty(game)
+        live_store.persist(game)
         socketio.emit("game_paused", {"game_id": game.id}, to=str(game.id))
 
 @socketio.on("resume_game")
 def handle_resume(data):
     game_id = data.get("game_id")
-    game = db.session.get(Game, game_id)
+    game = live_store.get(game_id)
     if game and game.status == "paused":
         game.status = "battle"
-        db.session.commit()
+        live_store.mark_dirty(game)
+        live_store.persist(game)
         socketio.emit("game_resumed", {"game_id": game.id}, to=str(game.id))
         
         # Nếu đến lượt ai thì ai bắn tiếp
-        socketio.emit("turn_change", {
-            "current_turn": game.current_turn,
-            "is_ai_turn": (game.ai and game.current_turn == game.ai.name)
-        }, to=str(game.id))
\ No newline at end of file
+        emit_turn_change(game)
\ No newline at end of file
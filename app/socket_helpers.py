@@ -1,11 +1,27 @@
 # app/socket_helpers.py
-from flask import url_for
-from app import socketio, db
+import base64
+
+from flask import request, url_for
+from app import socketio
+from app.game_logic.live_store import live_store, StaleVersion
+from app.game_logic.base_logic import GameLogic
+from app.ai.factory import drop_ai_instance
+from app.ai.scheduler import ai_scheduler
 
 
 #Xử lí kết quả phát bắn
 def process_shot_result(game, result_data, attacker_name, target_name, x = None, y = None):
-    """Phát sự kiện và cập nhật game sau khi có kết quả bắn"""
+    """
+    Phát sự kiện và cập nhật game sau khi có kết quả bắn
+    game là LiveGame trong kho trận đấu
+    Sự kiện chỉ mang các ô vừa đổi (cells) kèm version, client áp dụng theo thứ tự version
+    """
+    delta = result_data.get("delta") or {"version": game.version, "owner": target_name, "cells": []}
+
+    #  Đổi lượt ngay (trước khi gửi sự kiện): phát bắn gửi dồn tới trong lúc chờ gửi sẽ thấy lượt mới
+    if not result_data.get("winner"):
+        game.current_turn = GameLogic.next_turn(result_data["result"], attacker_name, target_name)
+
     #  Gửi kết quả bắn
     socketio.emit("shot_result", {
         "x": x if x is not None else result_data.get("x"),
@@ -13,21 +29,33 @@ def process_shot_result(game, result_data, attacker_name, target_name, x = None,
         "result": result_data["result"],
         "attacker": attacker_name,
         "target": target_name,
+        "version": delta["version"],
+        "owner": delta["owner"],
+        "cells": delta["cells"],
     }, to=str(game.id))
 
-    #  Nếu có tàu bị chìm
+    #  Nếu có tàu bị chìm (các ô chìm đã nằm trong cells của shot_result)
     if result_data["result"] == "sunk":
         socketio.emit("ship_sunked", {
             "owner": result_data["owner"],
             "ship_name": result_data["ship_name"],
-            "comp": result_data["comp"]
+            "version": delta["version"],
         }, to=str(game.id))
 
     #  Nếu có người thắng
     if result_data.get("winner"):
         game.status = "finished"
         game.winner = result_data["winner"]
-        db.session.commit()
+        # Trận kết thúc: ghi ngay xuống DB
+        try:
+            live_store.finish(game)
+        except StaleVersion as e:
+            # Trận đã bị đổi ngoài kho (VD huỷ cùng lúc): phát bắn không được ghi
+            ai_scheduler.cancel(game.id)
+            resync_room(game.id, e)
+            return True  # dừng xử lý tiếp như khi game kết thúc
+        ai_scheduler.cancel(game.id)
+        drop_ai_instance(game.id)
 
         redirect_url = url_for("game_detail", game_id=game.id)
         socketio.emit("game_over", {
@@ -36,18 +64,68 @@ def process_shot_result(game, result_data, attacker_name, target_name, x = None,
         }, to=str(game.id))
         return True  # báo hiệu game kết thúc
 
-    #  Cập nhật lượt
-    if result_data["result"] in ["miss", "out_of_bounds"]:
-        game.current_turn = target_name
-    else:
-        game.current_turn = attacker_name
-
-    db.session.commit()
+    # Cả phát bắn là 1 đơn vị công việc, ghi trong 1 commit
+    live_store.mark_dirty(game)
+    try:
+        live_store.persist(game)
+    except StaleVersion as e:
+        ai_scheduler.cancel(game.id)
+        resync_room(game.id, e)
+        return True
 
     #  Gửi sự kiện đổi lượt
+    emit_turn_change(game)
+
+    return False  # game chưa kết thúc
+
+
+#Báo đổi lượt, nếu đến lượt AI thì server tự lên lịch cho AI bắn
+def emit_turn_change(game):
+    is_ai_turn = bool(game.ai and game.current_turn == game.ai.name)
     socketio.emit("turn_change", {
         "current_turn": game.current_turn,
-        "is_ai_turn": (game.ai and game.current_turn == game.ai.name)
+        "is_ai_turn": is_ai_turn,
+        "version": game.version
     }, to=str(game.id))
 
-    return False  # game chưa kết thúc
+    if is_ai_turn and game.status == "battle":
+        ai_scheduler.schedule(game.id)
+
+
+#Thao tác dựa trên version cũ bị từ chối: báo lỗi và gửi phần còn thiếu cho client đó
+def reject_stale(game, error):
+    socketio.emit("error", {"message": "Trận đã thay đổi, đang đồng bộ lại. Hãy thử lại!"}, to=request.sid)
+    socketio.emit("sync", sync_payload(game, error.expected), to=request.sid)
+
+
+#Ghi của cả phòng bị từ chối (shot_result đã gửi cho cả phòng): gửi lại trạng thái trong DB cho cả phòng
+def resync_room(game_id, error):
+    socketio.emit("error", {"message": "Trận đã thay đổi, đang đồng bộ lại. Hãy thử lại!"}, to=str(game_id))
+    game = live_store.get(game_id)
+    if game is not None:
+        socketio.emit("sync", sync_payload(game, error.expected), to=str(game_id))
+
+
+#Dữ liệu đồng bộ cho client kết nối lại
+def sync_payload(game, version):
+    """
+    Client gửi version cuối đã áp dụng:
+        - log delta còn đủ: trả về các delta còn thiếu
+        - không thì trả về snapshot gọn: mỗi bảng là 4 bitmask (tàu, trúng, trượt, chìm),
+          13 byte/mask little-endian, mã hoá base64 (xem Board.to_bytes)
+    """
+    payload = {
+        "version": game.version,
+        "status": game.status,
+        "current_turn": game.current_turn,
+        "is_ai_turn": bool(game.ai and game.current_turn == game.ai.name),
+    }
+    deltas = game.deltas_since(version)
+    if deltas is not None:
+        payload["deltas"] = deltas
+    else:
+        payload["boards"] = {
+            owner: base64.b64encode(board.to_bytes()).decode("ascii")
+            for owner, board in game.boards.items()
+        }
+    return payload
@@ -0,0 +1,92 @@
+# sql_stats.py
+"""
+Đếm số câu lệnh SQL và số lần commit bằng event của SQLAlchemy.
+
+    with count_statements() as counter:
+        ...
+    counter.statements, counter.commits
+
+Counter chỉ đếm câu lệnh của greenlet (hoặc thread) đã mở nó, các sự kiện
+chạy xen kẽ dưới eventlet không bị đếm lẫn vào nhau.
+"""
+from contextlib import contextmanager
+import sqlalchemy as sa
+from app import app, db
+
+try:
+    from greenlet import getcurrent as _current_task    # eventlet: mỗi greenlet 1 task
+except ImportError:
+    from threading import current_thread as _current_task
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        self.sql = []
+
+    def __repr__(self):
+        return f"<StatementCounter statements={self.statements} commits={self.commits}>"
+
+
+# Các counter đang mở của từng task (có thể lồng nhau)
+_active = {}
+_listening = False
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active.get(_current_task(), ()):
+        counter.statements += 1
+        counter.sql.append(statement)
+
+
+def _on_commit(conn):
+    for counter in _active.get(_current_task(), ()):
+        counter.commits += 1
+
+
+def _listen():
+    global _listening
+    if _listening:
+        return
+    with app.app_context():
+        engine = db.engine
+    sa.event.listen(engine, "before_cursor_execute", _on_execute)
+    sa.event.listen(engine, "commit", _on_commit)
+    _listening = True
+
+
+def start_counting(keep_sql=True):
+    """Mở 1 counter cho task hiện tại (đóng bằng stop_counting), keep_sql=False thì không giữ câu lệnh"""
+    _listen()
+    counter = StatementCounter()
+    if not keep_sql:
+        counter.sql = _Discard()
+    _active.setdefault(_current_task(), []).append(counter)
+    return counter
+
+
+def stop_counting(counter):
+    task = _current_task()
+    counters = _active.get(task, [])
+    if counter in counters:
+        counters.remove(counter)
+    if not counters:
+        _active.pop(task, None)
+    return counter
+
+
+class _Discard:
+    """Thay cho list sql khi chỉ cần đếm"""
+
+    def append(self, item):
+        pass
+
+
+@contextmanager
+def count_statements():
+    counter = start_counting()
+    try:
+        yield counter
+    finally:
+        stop_counting(counter)
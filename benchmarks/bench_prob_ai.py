@@ -0,0 +1,67 @@
+# bench_prob_ai.py
+"""
+Đo thời gian 1 quyết định của ProbAI (tính phổ mật độ + chọn ô) trên bảng 10x10.
+
+    python benchmarks/bench_prob_ai.py [số trận] [số lần lặp mỗi bảng]
+
+Lấy các bảng ở mọi giai đoạn của các trận mô phỏng (ProbAI bắn hạm đội đặt ngẫu nhiên),
+rồi đo lại quyết định trên từng bảng.
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ai.prob_ai import ProbAI, placement_density
+from app.game_logic.simulation import MemoryStore, new_game, FLEET_OWNER
+from app.game_logic.place_ships_strat import ShipPlacementStrategy
+from app.log import quiet
+
+
+def collect_positions(games):
+    """Chạy `games` trận, lưu (bảng, tàu còn lại) trước mỗi phát bắn"""
+    positions = []
+    for seed in range(games):
+        random.seed(seed)
+        store = MemoryStore()
+        live = new_game(seed, "ProbAI", FLEET_OWNER)
+        ShipPlacementStrategy(live, store).auto_place_ships_strategy(FLEET_OWNER, "random")
+        ai = ProbAI(live, name="ProbAI", store=store, emitter=None)
+        while live.status != "finished":
+            board = live.boards[FLEET_OWNER]
+            positions.append((board.copy(), ai.alive_ships(FLEET_OWNER)))
+            ai.make_shot("ProbAI", FLEET_OWNER)
+    return positions
+
+
+def decide(board, alive):
+    density = placement_density(board, alive).reshape(10, 10)
+    return ProbAI.choose_cell(density, board)
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with quiet():
+        positions = collect_positions(games)
+
+    timings = []
+    for board, alive in positions:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decide(board, alive)
+        timings.append((time.perf_counter() - start) / repeat * 1e6)
+
+    timings.sort()
+    print(f"Số bảng: {len(positions)} ({games} trận), lặp {repeat} lần mỗi bảng")
+    print(f"Trung vị: {statistics.median(timings):.1f} µs / quyết định")
+    print(f"p99:      {timings[int(len(timings) * 0.99) - 1]:.1f} µs")
+    print(f"Tối đa:   {timings[-1]:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+# bench_suite.py
+"""
+Bộ micro-benchmark cho game engine, các AI và truy vấn thống kê, chạy trên DB SQLite
+tạm có sẵn 10^2 .. 10^5 trận đã kết thúc. Kết quả ghi ra file JSON để so sánh giữa các lần chạy.
+
+    python benchmarks/bench_suite.py [--sizes 100,1000,10000,100000] [--samples 200]
+                                     [--output bench_results.json] [--compare cũ.json]
+
+Đo (mỗi mẫu là 1 lần gọi, phần chuẩn bị trạng thái không tính giờ):
+    GameLogic.shoot[miss|hit|sunk|win]
+    auto_place_ships_strategy[<chiến lược>]   mọi chiến lược trong ShipPlacementStrategy.strat_map
+    DemoProbAI.make_shot, RandomAI.make_shot  ở các giai đoạn khác nhau của trận
+    RandomAI.load_priors                      đọc phổ chung + phổ đối thủ từ DB
+    overall(), overall_probability_matrix() (có cache và force_update), Player.ship_probability_matrix
+
+DB mẫu lớn dần qua các cỡ (thêm trận rồi dựng lại số liệu tổng hợp như flask rebuild-rollups):
+mỗi trận có 2 hạm đội đặt bằng các chiến lược trên, 1/2 số trận đấu với AI. Không ghi GameMove
+vì các truy vấn được đo không đọc tới.
+
+--compare: so trung vị với file kết quả cũ, chậm hơn quá --threshold lần thì thoát với mã 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# DB tạm phải được chọn trước khi import app
+_db_path = tempfile.mktemp(suffix=".db", prefix="bench_")
+os.environ["DATABASE_URL"] = "sqlite:///" + _db_path
+
+import sqlalchemy as sa
+from app import app, db
+from app.models import Player, AI, Game, ShipPlacement
+from app.ai.factory import get_ai_class
+from app.game_logic import rollups
+from app.game_logic.board import pack_ship_data
+from app.game_logic.place_ships_strat import ShipPlacementStrategy
+from app.game_logic.queries import overall, overall_probability_matrix
+from app.game_logic.simulation import MemoryStore, new_game, FLEET_OWNER
+from app.log import quiet
+
+SHOOTER = "Shooter"
+AI_NAMES = ("DemoProbAI", "RandomAI", "ProbAI")
+GAMES_PER_PLAYER = 20
+FLEET_POOL = 256      # số hạm đội khác nhau mỗi chiến lược dùng để sinh trận mẫu
+SEED_BATCH = 5000
+
+
+# --------------------------- DB mẫu ---------------------------
+
+def fleet_pool(rng_seed):
+    """{chiến lược: [(grid_data, ship_data), ...]} đặt sẵn trong RAM"""
+    pool = {}
+    for strategy in ShipPlacementStrategy.strat_map:
+        random.seed(rng_seed)
+        fleets = []
+        for i in range(FLEET_POOL):
+            live = new_game(i, SHOOTER, FLEET_OWNER)
+            board = ShipPlacementStrategy(live, MemoryStore()).auto_place_ships_strategy(FLEET_OWNER, strategy)
+            fleets.append((board.to_bytes(), pack_ship_data(live.ship_data[FLEET_OWNER])))
+        pool[strategy] = fleets
+    return pool
+
+
+def seed_games(target, pool, rng):
+    """Thêm trận đã kết thúc tới khi DB có target trận, rồi dựng lại số liệu tổng hợp"""
+    have = db.session.scalar(sa.select(sa.func.count(Game.id)))
+    if not db.session.scalar(sa.select(sa.func.count(AI.id))):
+        db.session.execute(sa.insert(AI), [{"name": name} for name in AI_NAMES])
+    ais = dict(db.session.execute(sa.select(AI.name, AI.id)).all())
+
+    wanted = max(2, target // GAMES_PER_PLAYER)
+    players = db.session.scalar(sa.select(sa.func.count(Player.id)))
+    if players < wanted:
+        db.session.execute(sa.insert(Player), [{"playername": f"player{i}"} for i in range(players, wanted)])
+    players = dict(db.session.execute(sa.select(Player.playername, Player.id)).all())
+    names = sorted(players)
+    fleets = [fleet for strategy in pool.values() for fleet in strategy]
+
+    while have < target:
+        count = min(SEED_BATCH, target - have)
+        sides, rows = [], []
+        for _ in range(count):
+            host = rng.choice(names)
+            if rng.random() < 0.5:
+                second = rng.choice(AI_NAMES)
+                ai_id, guest_id = ais[second], None
+            else:
+                second = host
+                while second == host:
+                    second = rng.choice(names)
+                ai_id, guest_id = None, players[second]
+            winner = rng.choice((host, second))
+            sides.append((host, second))
+            rows.append({
+                "timestamp": datetime.now(timezone.utc),
+                "winner": winner,
+                "player_shots": rng.randint(17, 100),
+                "opponent_shots": rng.randint(17, 100),
+                "status": "finished",
+                "current_turn": winner,
+                "player_ready": True,
+                "opponent_ready": ai_id is None,
+                "ai_ready": ai_id is not None,
+                "player_id": players[host],
+                "opponent_id": guest_id,
+                "ai_id": ai_id,
+            })
+        game_ids = db.session.scalars(
+            sa.insert(Game).returning(Game.id, sort_by_parameter_order=True), rows).all()
+        placements = []
+        for game_id, (host, second) in zip(game_ids, sides):
+            for owner in (host, second):
+                grid_data, ship_data = rng.choice(fleets)
+                placements.append({"game_id": game_id, "owner": owner,
+                                   "grid_data": grid_data, "ship_data": ship_data})
+        db.session.execute(sa.insert(ShipPlacement), placements)
+        have += count
+
+    rollups.rebuild_player_heatmaps()
+    rollups.rebuild_stats()
+    db.session.commit()
+    rollups.finished_committed()
+
+
+# --------------------------- Đo ---------------------------
+
+def measure(fn, setup=None, samples=200):
+    """Thời gian (giây) của từng lần gọi fn(*setup(i)), setup không tính giờ"""
+    timings = []
+    for i in range(samples):
+        args = setup(i) if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    us = [t * 1e6 for t in timings]
+    return {
+        "samples": len(us),
+        "median_us": round(statistics.median(us), 2),
+        "mean_us": round(statistics.fmean(us), 2),
+        "p95_us": round(us[max(0, int(len(us) * 0.95) - 1)], 2),
+        "min_us": round(us[0], 2),
+        "max_us": round(us[-1], 2),
+    }
+
+
+def _fleet_game(i, strategy="random"):
+    """Trận mới trong RAM, hạm đội của FLEET_OWNER đặt bằng strategy (seed i)"""
+    random.seed(i)
+    live = new_game(i, SHOOTER, FLEET_OWNER)
+    logic = ShipPlacementStrategy(live, MemoryStore())
+    logic.auto_place_ships_strategy(FLEET_OWNER, strategy)
+    return live, logic
+
+
+def _shoot_setup(case):
+    def setup(i):
+        live, logic = _fleet_game(i)
+        ships = live.ship_data[FLEET_OWNER]
+        cells = [tuple(p) for ship in ships.values() for p in ship["positions"]]
+        if case == "miss":
+            before = []
+            target = random.choice([(x, y) for x in range(10) for y in range(10) if (x, y) not in cells])
+        elif case == "hit":
+            before, target = [], tuple(ships["Carrier"]["positions"][0])
+        elif case == "sunk":
+            *before, target = [tuple(p) for p in ships["Destroyer"]["positions"]]
+        else:   # win: bắn chìm mọi ô tàu trừ ô cuối
+            *before, target = cells
+        for x, y in before:
+            logic.shoot(SHOOTER, FLEET_OWNER, x, y)
+        return logic, target
+    return setup
+
+
+def _shoot(logic, target):
+    logic.shoot(SHOOTER, FLEET_OWNER, *target)
+
+
+def _placement_setup(i):
+    random.seed(i)
+    return (ShipPlacementStrategy(new_game(i, SHOOTER, FLEET_OWNER), MemoryStore()),)
+
+
+def _expired(obj):
+    """Bỏ các cột đã nạp của obj, lần đọc trong phần tính giờ phải SELECT lại từ DB"""
+    def setup(i):
+        db.session.expire(obj)
+        return (obj,)
+    return setup
+
+
+def _ai_setup(ai_name, target_name):
+    """AI đã bắn i % 60 phát vào 1 hạm đội ngẫu nhiên của target_name"""
+    def setup(i):
+        random.seed(i)
+        live = new_game(i, ai_name, target_name)
+        store = MemoryStore()
+        ShipPlacementStrategy(live, store).auto_place_ships_strategy(target_name, "random")
+        ai = get_ai_class(ai_name)(live, name=ai_name, store=store, emitter=None)
+        ai.prepare(target_name)
+        for _ in range(i % 60):
+            if live.status == "finished":
+                break
+            ai.make_shot(ai_name, target_name)
+        return ai, target_name
+    return setup
+
+
+def _make_shot(ai, target_name):
+    ai.make_shot(ai.name, target_name)
+
+
+def benchmarks(top_player):
+    """[(tên, fn, setup)] cho 1 cỡ DB, top_player là Player có nhiều trận nhất"""
+    cases = [(f"GameLogic.shoot[{case}]", _shoot, _shoot_setup(case))
+             for case in ("miss", "hit", "sunk", "win")]
+    cases += [(f"auto_place_ships_strategy[{strategy}]",
+               lambda logic, strategy=strategy: logic.auto_place_ships_strategy(FLEET_OWNER, strategy),
+               _placement_setup)
+              for strategy in ShipPlacementStrategy.strat_map]
+    cases += [
+        ("DemoProbAI.make_shot", _make_shot, _ai_setup("DemoProbAI", top_player.playername)),
+        ("RandomAI.make_shot", _make_shot, _ai_setup("RandomAI", top_player.playername)),
+        ("RandomAI.load_priors",
+         lambda ai: ai.load_priors(top_player.playername),
+         lambda i: (get_ai_class("RandomAI")(new_game(i, "RandomAI", top_player.playername),
+                                             name="RandomAI", store=MemoryStore(), emitter=None),)),
+        ("overall()", overall, None),
+        ("overall_probability_matrix()", overall_probability_matrix, None),
+        ("overall_probability_matrix(force_update=True)",
+         lambda: overall_probability_matrix(force_update=True), None),
+        ("Player.ship_probability_matrix",
+         lambda player: player.ship_probability_matrix, _expired(top_player)),
+    ]
+    return cases
+
+
+def run(sizes, samples, seed):
+    results = []
+    rng = random.Random(seed)
+    with app.app_context(), quiet():
+        db.create_all()
+        pool = fleet_pool(seed)
+        for size in sizes:
+            start = time.perf_counter()
+            seed_games(size, pool, rng)
+            print(f"DB mẫu {size} trận ({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+            top_player = db.session.scalar(
+                sa.select(Player).order_by(Player.placement_games.desc()).limit(1))
+            for name, fn, setup in benchmarks(top_player):
+                stats = summarize(measure(fn, setup, samples))
+                results.append({"benchmark": name, "games": size, **stats})
+                print(f"  {name:<50} trung vị {stats['median_us']:>10.1f} µs  "
+                      f"p95 {stats['p95_us']:>10.1f} µs", file=sys.stderr)
+            db.session.remove()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """In tỉ lệ trung vị mới / cũ, trả về danh sách benchmark chậm hơn threshold lần"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["benchmark"], r["games"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["benchmark"], r["games"]))
+        if not old or not old["median_us"]:
+            continue
+        ratio = r["median_us"] / old["median_us"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append((r["benchmark"], r["games"], ratio))
+            flag = "  <-- chậm hơn"
+        print(f"{r['benchmark']:<50} {r['games']:>7} trận  x{ratio:.2f}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark game engine, AI và truy vấn thống kê")
+    parser.add_argument("--sizes", default="100,1000,10000,100000",
+                        help="Số trận đã kết thúc trong DB mẫu, tăng dần (phân cách bằng dấu phẩy)")
+    parser.add_argument("--samples", type=int, default=200, help="Số mẫu mỗi benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json", help="File JSON kết quả")
+    parser.add_argument("--compare", default=None, help="File JSON kết quả cũ để so sánh")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Chậm hơn bao nhiêu lần so với kết quả cũ thì coi là regression")
+    args = parser.parse_args()
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+
+    try:
+        results = run(sizes, args.samples, args.seed)
+    finally:
+        if os.path.exists(_db_path):
+            os.remove(_db_path)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi {len(results)} kết quả vào {args.output}", file=sys.stderr)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark chậm hơn {args.threshold} lần so với {args.compare}",
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
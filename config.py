@@ -5,4 +5,39 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
-        'sqlite:///' + os.path.join(basedir, 'app.db')
\ No newline at end of file
+        'sqlite:///' + os.path.join(basedir, 'app.db')
+
+    # Mức log (app/log.py): mức chung và mức riêng từng module, VD LOG_LEVELS="app.ai=DEBUG"
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    LOG_LEVELS = os.environ.get('LOG_LEVELS') or ''
+
+    # Kho trạng thái trận đang chơi (app/game_logic/live_store.py)
+    # False: ghi xuống DB ngay sau mỗi sự kiện (1 commit/phát bắn) thay vì ghi theo lô
+    LIVE_STORE_WRITE_BEHIND = (os.environ.get('LIVE_STORE_WRITE_BEHIND') or 'true').lower() != 'false'
+    LIVE_STORE_FLUSH_INTERVAL = float(os.environ.get('LIVE_STORE_FLUSH_INTERVAL') or 2.0)   # giây
+    LIVE_STORE_MAX_GAMES = int(os.environ.get('LIVE_STORE_MAX_GAMES') or 1000)
+    LIVE_STORE_TTL = int(os.environ.get('LIVE_STORE_TTL') or 1800)   # giây
+    # Số delta gần nhất giữ cho mỗi trận để client kết nối lại bắt kịp (cũ hơn thì gửi snapshot)
+    SYNC_DELTA_LOG_SIZE = int(os.environ.get('SYNC_DELTA_LOG_SIZE') or 256)
+    # Chụp bảng sau mỗi N nước để nhảy tới nước bất kỳ (undo/redo nhiều bước) không phải phát lại từ đầu
+    MOVE_SNAPSHOT_INTERVAL = int(os.environ.get('MOVE_SNAPSHOT_INTERVAL') or 10)
+    # Số trận mỗi trang lịch sử đấu (trang player)
+    MATCHES_PER_PAGE = int(os.environ.get('MATCHES_PER_PAGE') or 20)
+
+    # Lượt của AI được server lên lịch (app/ai/scheduler.py)
+    AI_TURN_DELAY = float(os.environ.get('AI_TURN_DELAY') or 0.25)         # giây chờ trước khi AI bắn
+    AI_SCHEDULER_TICK = float(os.environ.get('AI_SCHEDULER_TICK') or 0.05) # chu kỳ kiểm tra tối đa
+
+    # Khoảng cách tối thiểu giữa 2 lần gửi phổ xác suất của AI cho client (app/ai/telemetry.py)
+    AI_TELEMETRY_INTERVAL = float(os.environ.get('AI_TELEMETRY_INTERVAL') or 0.2)   # giây
+
+    # Số trận tối đa giữ instance AI (app/ai/factory.py)
+    AI_CACHE_MAX_GAMES = int(os.environ.get('AI_CACHE_MAX_GAMES') or 1000)
+
+    # Tên file .npy gốc cho cache bảng vị trí đặt tàu, mở bằng memory-map (app/game_logic/placements.py), để trống thì tính lúc import
+    PLACEMENT_CACHE = os.environ.get('PLACEMENT_CACHE')
+
+    # MonteCarloAI (app/ai/monte_carlo_ai.py)
+    MONTE_CARLO_SAMPLES = int(os.environ.get('MONTE_CARLO_SAMPLES') or 2000)       # số mẫu mỗi lượt
+    MONTE_CARLO_DEADLINE = float(os.environ.get('MONTE_CARLO_DEADLINE') or 0.5)    # giây mỗi lượt
+    MONTE_CARLO_WORKERS = int(os.environ.get('MONTE_CARLO_WORKERS') or 0)          # 0: không dùng process pool
@@ -1,4 +1,7 @@
 from app import app, socketio
+from app.game_logic.queries import warm_caches
 
 if __name__ == "__main__":
+    with app.app_context():
+        warm_caches()
     socketio.run(app, debug=True)
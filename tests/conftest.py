@@ -0,0 +1,43 @@
+# conftest.py
+"""
+App dùng DB SQLite tạm cho cả phiên test.
+
+app chọn DB lúc import (config.py đọc DATABASE_URL), nên các test lấy app, db và
+các module của app qua fixture / import trong hàm, không import app ở đầu file.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    path = tmp_path_factory.mktemp("db") / "test.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from app import app, db
+
+    # app đã bị import trước đó thì đang nối vào DB khác (có thể là app.db thật)
+    assert app.config["SQLALCHEMY_DATABASE_URI"] == os.environ["DATABASE_URL"], \
+        "app đã được import trước fixture, không import app ở đầu file test"
+    app.config["LIVE_STORE_FLUSH_INTERVAL"] = 0    # không chạy background flusher
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    path.unlink(missing_ok=True)
+
+
+@pytest.fixture
+def db(app):
+    """DB trống (tạo lại mọi bảng) trong app context, dọn kho trận đang chơi sau test"""
+    from app import db
+    from app.game_logic.live_store import live_store
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        live_store.clear()
+        db.session.remove()
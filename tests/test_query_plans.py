@@ -0,0 +1,101 @@
+# test_query_plans.py
+"""
+Kế hoạch truy vấn (EXPLAIN QUERY PLAN của SQLite) của các truy vấn nóng: chạy mỗi lần
+nạp trận, xem trang người chơi, xuất replay... Test lỗi nếu truy vấn phải quét toàn
+bảng, hoặc phải sắp xếp bằng B-tree tạm các dòng đọc từ bảng (truy vấn có ORDER BY /
+phân trang thì phải lấy thứ tự từ index).
+
+    python -m pytest -q tests
+"""
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+# Tên -> hàm dựng truy vấn từ module app.models (app chỉ được import qua fixture)
+HOT_QUERIES = {
+    "nạp hạm đội": lambda m: sa.select(m.ShipPlacement).where(m.ShipPlacement.game_id == 1),
+    "hạm đội 1 bên": lambda m: sa.select(m.ShipPlacement.id)
+        .where(m.ShipPlacement.game_id == 1, m.ShipPlacement.owner == "alice"),
+    "nạp nước đi": lambda m: sa.select(m.GameMove)
+        .where(m.GameMove.game_id == 1).order_by(m.GameMove.id.asc()),
+    "nước đi đang áp dụng": lambda m: sa.select(m.GameMove.id)
+        .where(m.GameMove.game_id == 1, m.GameMove.is_reverted.is_(False))
+        .order_by(m.GameMove.id.desc()),
+    "nạp snapshot": lambda m: sa.select(m.GameSnapshot.move_count, m.GameSnapshot.data)
+        .where(m.GameSnapshot.game_id == 1, m.GameSnapshot.move_count <= 40),
+    "xoá snapshot": lambda m: sa.delete(m.GameSnapshot)
+        .where(m.GameSnapshot.game_id == 1, m.GameSnapshot.move_count > 20),
+    "trận của người chơi": lambda m: m.Player.matches_query(1, limit=21),
+    "trận của người chơi, trang sau": lambda m: m.Player.matches_query(1, before=100, limit=21),
+    "trận với AI": lambda m: sa.select(m.Game.id)
+        .where(m.Game.ai_id == 1, m.Game.status == "finished"),
+    "trận đã kết thúc": lambda m: sa.select(m.Game.id)
+        .where(m.Game.status == "finished").order_by(m.Game.id.desc()).limit(20),
+    "xuất replay": lambda m: _replay_query(m),
+    "nước đi của lô trận": lambda m: sa.select(m.GameMove.game_id, m.GameMove.x, m.GameMove.y)
+        .where(m.GameMove.game_id.in_([1, 2, 3]), m.GameMove.is_reverted.is_(False))
+        .order_by(m.GameMove.game_id, m.GameMove.id),
+}
+
+
+def _replay_query(m):
+    Opponent = so.aliased(m.Player)
+    return (
+        sa.select(m.Game.id, m.Player.playername, Opponent.playername)
+        .join(m.Player, m.Game.player_id == m.Player.id)
+        .outerjoin(Opponent, m.Game.opponent_id == Opponent.id)
+        .where(m.Game.status == "finished", m.Game.id > 0)
+        .order_by(m.Game.id).limit(500)
+    )
+
+
+def query_plan(db, query):
+    """Các bước (id, parent, mô tả) của EXPLAIN QUERY PLAN"""
+    sql = str(query.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    return [(row[0], row[1], row[-1]) for row in db.session.execute(sa.text("EXPLAIN QUERY PLAN " + sql))]
+
+
+def slow_steps(plan):
+    """
+    Các bước chậm: "SCAN <bảng>" không kèm index, và "USE TEMP B-TREE FOR ORDER BY" khi
+    cùng cấp có bước đọc bảng không phải tra theo khoá chính. Sắp xếp lại kết quả của truy
+    vấn con (VD gộp 2 vế có LIMIT của trang trận) thì chỉ tra từng dòng theo khoá chính
+    nên được chấp nhận.
+    """
+    # Tên truy vấn con (SCAN truy vấn con không phải quét bảng)
+    subqueries = {detail.split()[-1] for _, _, detail in plan
+                  if detail.startswith(("MATERIALIZE ", "CO-ROUTINE "))}
+
+    def reads_table(detail):
+        words = detail.replace(" TABLE ", " ").split()
+        return words[0] in ("SCAN", "SEARCH") and words[1] not in subqueries
+
+    slow = []
+    for _, parent, detail in plan:
+        if reads_table(detail) and detail.startswith("SCAN ") and " USING " not in detail:
+            slow.append(detail)
+        elif detail.startswith("USE TEMP B-TREE FOR ORDER BY"):
+            if any("PRIMARY KEY" not in d for d in same_level(plan, parent) if reads_table(d)):
+                slow.append(detail)
+    return slow
+
+
+def same_level(plan, parent):
+    """Các bước thuộc cùng truy vấn với parent (kể cả lồng trong MULTI-INDEX OR...), trừ truy vấn con"""
+    steps = []
+    for step_id, step_parent, detail in plan:
+        if step_parent == parent:
+            steps.append(detail)
+            if not detail.startswith(("MATERIALIZE ", "CO-ROUTINE ", "COMPOUND QUERY")):
+                steps += same_level(plan, step_id)
+    return steps
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_index(db, name):
+    from app import models
+
+    if db.engine.dialect.name != "sqlite":
+        pytest.skip("EXPLAIN QUERY PLAN chỉ kiểm tra trên SQLite")
+    plan = query_plan(db, HOT_QUERIES[name](models))
+    assert not slow_steps(plan), "\n".join(detail for _, _, detail in plan)
@@ -0,0 +1,116 @@
+# test_statement_budget.py
+"""
+Ghi 1 phát bắn xuống DB: đúng 1 commit, không quá SHOT_STATEMENT_BUDGET câu lệnh
+(+ rollups.FINISH_STATEMENT_BUDGET ở phát bắn kết thúc trận).
+
+    python -m pytest -q tests
+"""
+import pytest
+
+PLAYER = "alice"
+AI_NAME = "TestAI"
+
+
+@pytest.fixture
+def live(db):
+    """Trận alice đấu TestAI đã đặt tàu, đang đánh và đã ghi xuống DB"""
+    from app.models import Player, AI, Game
+    from app.game_logic.live_store import live_store
+    from app.game_logic.place_ships_strat import ShipPlacementStrategy
+
+    player, ai = Player(playername=PLAYER), AI(name=AI_NAME)
+    db.session.add_all([player, ai])
+    db.session.flush()
+    game = Game(player_id=player.id, ai_id=ai.id, status="battle",
+                current_turn=PLAYER, winner="")
+    db.session.add(game)
+    db.session.commit()
+
+    live = live_store.get(game.id)
+    placement = ShipPlacementStrategy(live)
+    placement.auto_place_ships_strategy(PLAYER)
+    placement.auto_place_ships_strategy(AI_NAME)
+    live_store.flush(live)
+    return live
+
+
+def ship_cells(live):
+    from app.game_logic.board import cells_of, cell_coords
+
+    return [cell_coords(c) for c in cells_of(live.boards[AI_NAME].ship_cells_mask)]
+
+
+def logic_of(live):
+    from app.game_logic.base_logic import GameLogic
+
+    return GameLogic(live)
+
+
+def flush(live):
+    from app.game_logic.live_store import live_store
+
+    live_store.flush(live)
+
+
+def flush_counted(live):
+    from app.sql_stats import count_statements
+
+    with count_statements() as counter:
+        flush(live)
+    return counter
+
+
+def assert_within(counter, extra=0):
+    from app.game_logic.live_store import SHOT_STATEMENT_BUDGET
+
+    assert counter.commits == 1, counter.sql
+    assert counter.statements <= SHOT_STATEMENT_BUDGET + extra, counter.sql
+
+
+def test_single_shot(live):
+    x, y = ship_cells(live)[0]
+    logic_of(live).shoot(PLAYER, AI_NAME, x, y)
+    assert_within(flush_counted(live))
+
+
+def test_shot_with_snapshot(app, live):
+    logic = logic_of(live)
+    cells = ship_cells(live)
+    interval = app.config["MOVE_SNAPSHOT_INTERVAL"]
+    for x, y in cells[:interval - 1]:
+        logic.shoot(PLAYER, AI_NAME, x, y)
+    flush(live)
+
+    x, y = cells[interval - 1]
+    logic.shoot(PLAYER, AI_NAME, x, y)
+    assert interval in live.snapshots
+    assert_within(flush_counted(live))
+
+
+def test_shot_after_undo(live):
+    logic = logic_of(live)
+    cells = ship_cells(live)
+    for x, y in cells[:2]:
+        logic.shoot(PLAYER, AI_NAME, x, y)
+    logic.undo_last_move()
+    flush(live)
+
+    x, y = cells[2]
+    logic.shoot(PLAYER, AI_NAME, x, y)
+    assert live.deleted_moves
+    assert_within(flush_counted(live))
+
+
+def test_winning_shot(live):
+    from app.game_logic import rollups
+
+    logic = logic_of(live)
+    cells = ship_cells(live)
+    for x, y in cells[:-1]:
+        logic.shoot(PLAYER, AI_NAME, x, y)
+    flush(live)
+
+    x, y = cells[-1]
+    logic.shoot(PLAYER, AI_NAME, x, y)
+    assert live.status == "finished"
+    assert_within(flush_counted(live), rollups.FINISH_STATEMENT_BUDGET)